@@ -5,6 +5,7 @@ from django.contrib.auth.models import (
 	Permission
 )
 from django.db import models
+from django.db.models import Count
 from places.utils.helpers import (
 	generate_staff_id,
 	slugify,
@@ -173,6 +174,19 @@ class Customer(UserProfile):
 	def joined(self):
 		return self.user.date_joined
 
+	def get_follows(self):
+		""" The restaurants the customer is listed by """
+		return self.restaurant_set.all()
+
+	def get_liked_tags(self):
+		""" Tags of the food the customer ordered, `likes` counts the order items """
+		from places.models import Tag
+		return (
+			Tag.objects.filter(fooditem__orderitem__order__customer=self)
+			.annotate(likes=Count('fooditem__orderitem'))
+			.order_by('-likes')
+		)
+
 
 class UserNotification(DbModel):
 	user = models.ForeignKey("Customer", on_delete=models.CASCADE)
@@ -0,0 +1,156 @@
+"""
+	Merchant search across a restaurant's customers, orders, staff and menu.
+
+	Every entity type is looked up on its own, through what can serve it:
+
+	- orders: a range on the unique `order_id` index (ids are upper case
+	  hex), or the invoice, among the restaurant's orders
+	- customers: prefixes of the name, email or phone of every word of the
+	  query, among the restaurant's customers
+	- staff: prefixes of the name, email or staff id, among the staff
+	- menu items: the full-text index of `places.search`, ranked
+
+	The lookups run at the same time on a shared thread pool and are
+	given `BUDGET_MS` in all, at most `LIMITS[type]` matches each. Types
+	not done by then are left out of the response and listed as timed out,
+	their SQLite statements are interrupted. Types whose lookup raised are
+	logged, left out and listed as failed, the other types are still
+	returned. Workers only read, and close their database connection after
+	each lookup.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from accounts.models import RestaurantStaff
+from places import search
+from places.api.prefetch import optimize_queryset
+from places.api.serializers import CustomerSerializer, FoodSerializer, OrderSerializer, StaffSerializer
+from places.models import FoodItem, Order
+
+
+logger = logging.getLogger(__name__)
+
+_options = getattr(settings, 'DASHBOARD_SEARCH', {})
+BUDGET = _options.get('BUDGET_MS', 300) / 1000
+LIMITS = {'customers': 5, 'orders': 5, 'staff': 5, 'menu': 10, **_options.get('LIMITS', {})}
+
+executor = ThreadPoolExecutor(max_workers=_options.get('WORKERS', 4), thread_name_prefix='dashboard-search')
+
+
+def prefixes(terms, *fields):
+	""" Every term must start one of `fields` """
+	matches = Q()
+	for term in terms:
+		term_matches = Q()
+		for field in fields:
+			term_matches |= Q(**{f'{field}__istartswith': term})
+		matches &= term_matches
+	return matches
+
+
+def find_orders(place, query, terms, limit):
+	order_id = query.upper()
+	orders = Order.objects.filter(
+		Q(order_id__gte=order_id, order_id__lt=order_id + '\uffff') | Q(invoice__iexact=query),
+		place_id=place,
+	)
+	orders = optimize_queryset(orders, OrderSerializer).order_by('-pk')[:limit]
+	return OrderSerializer(orders, many=True).data
+
+
+def find_customers(place, query, terms, limit):
+	customers = place.customers.filter(
+		prefixes(terms, 'user__first_name', 'user__last_name', 'user__email', 'phone')
+	)
+	customers = optimize_queryset(customers, CustomerSerializer).order_by('user__first_name', 'user__last_name', 'pk')
+	return CustomerSerializer(customers[:limit], many=True).data
+
+
+def find_staff(place, query, terms, limit):
+	staff = RestaurantStaff.objects.filter(
+		prefixes(terms, 'user__first_name', 'user__last_name', 'user__email', 'staff_id'),
+		place=place,
+	)
+	staff = optimize_queryset(staff, StaffSerializer).order_by('user__first_name', 'user__last_name', 'pk')
+	return StaffSerializer(staff[:limit], many=True).data
+
+
+def find_menu_items(place, query, terms, limit):
+	pks = search.ranked(query, place.menu.all(), limit)
+	items = optimize_queryset(FoodItem.objects.filter(pk__in=pks), FoodSerializer).in_bulk()
+	return FoodSerializer([items[pk] for pk in pks if pk in items], many=True).data
+
+
+# type: (key, label, lookup), the keys are the ones the dashboard already reads
+ENTITIES = {
+	'customers': ('Customers', 'Customers', find_customers),
+	'orders': ('Orders', 'Orders', find_orders),
+	'staff': ('Staff', 'Staff', find_staff),
+	'menu': ('Menu Items', 'Menu items', find_menu_items),
+}
+
+
+class Lookup:
+	""" One entity type searched on a worker thread, interruptible while it runs """
+
+	def __init__(self, find, place, query, limit):
+		self.find = find
+		self.args = (place, query, query.split(), limit)
+		self.cancelled = False
+		self._raw = None
+		self._lock = threading.Lock()
+
+	def __call__(self):
+		try:
+			connection.ensure_connection()
+			with self._lock:
+				if self.cancelled:
+					return None
+				self._raw = connection.connection
+			return self.find(*self.args)
+		finally:
+			with self._lock:
+				self._raw = None
+			connection.close()
+
+	def cancel(self):
+		with self._lock:
+			self.cancelled = True
+			# sqlite3 connections can be interrupted from another thread
+			if self._raw is not None and hasattr(self._raw, 'interrupt'):
+				self._raw.interrupt()
+
+
+def find(place, query, types=None):
+	"""
+		`({type: (key, label, matches)}, [timed out types], [failed types])`
+		of the searched `types`, all of them by default
+	"""
+	query = query.strip()
+	if not query:
+		# no terms would match every row
+		return {}, [], []
+	lookups = {
+		kind: Lookup(ENTITIES[kind][2], place, query, LIMITS[kind])
+		for kind in ENTITIES if types is None or kind in types
+	}
+	futures = {executor.submit(lookup): kind for kind, lookup in lookups.items()}
+	done, pending = wait(futures, timeout=BUDGET)
+	for future in pending:
+		future.cancel()
+		lookups[futures[future]].cancel()
+	results, failed = {}, []
+	for future in done:
+		kind = futures[future]
+		try:
+			matches = future.result()
+		except Exception:
+			logger.exception('Dashboard search of %s failed', kind)
+			failed.append(kind)
+		else:
+			key, label, _ = ENTITIES[kind]
+			results[kind] = (key, label, matches)
+	return results, sorted(futures[future] for future in pending), sorted(failed)
@@ -1,3 +1,96 @@
-from django.test import TestCase
+import threading
+from unittest import mock
+from django.test import RequestFactory, TransactionTestCase
+from rest_framework.test import force_authenticate
+from places import menus
+from places.tests import ServedQueriesTestCase, create_place
+from . import search
+from .views import DashboardView, ListFoodItemView, ListOrdersView, search_view
 
-# Create your tests here.
+
+class DashboardViewTestCase(ServedQueriesTestCase):
+	def test_queries_do_not_grow_with_recent_orders(self):
+		small, large = self.assertConstantQueries(DashboardView.as_view())
+		self.assertEqual(len(small.data['recent_orders']), 2)
+		self.assertEqual(len(large.data['recent_orders']), 10)
+
+
+class ListFoodItemViewTestCase(ServedQueriesTestCase):
+	def test_queries_do_not_grow_with_menu_size(self):
+		small, large = self.assertConstantQueries(ListFoodItemView.as_view())
+		self.assertEqual(len(small.data['data']), 2)
+		self.assertEqual(len(large.data['data']), 10)
+
+
+class ListOrdersViewTestCase(ServedQueriesTestCase):
+	def test_queries_do_not_grow_with_page_size(self):
+		small, large = self.assertConstantQueries(ListOrdersView.as_view())
+		self.assertEqual(len(small.data['orders']), 2)
+		self.assertEqual(len(large.data['orders']), 10)
+
+
+class SearchViewTestCase(TransactionTestCase):
+	""" The lookups run on worker threads with their own connections, which only see committed rows """
+
+	factory = RequestFactory()
+
+	def setUp(self):
+		menus.loaded.clear()
+		self.place = create_place('finder', 4)
+
+	def search(self, **params):
+		request = self.factory.get('/', {'place': self.place.slug, **params})
+		request.place = self.place
+		request.branch = None
+		force_authenticate(request, self.place.owner.user)
+		response = search_view(request)
+		self.assertEqual(response.status_code, 200, response.data)
+		return response.data
+
+	def patch_lookup(self, kind, find):
+		key, label, _ = search.ENTITIES[kind]
+		return mock.patch.dict(search.ENTITIES, {kind: (key, label, find)})
+
+	def test_every_type_is_searched(self):
+		data = self.search(query='finder')
+		self.assertEqual(
+			{kind: (match['key'], match['label']) for kind, match in data['matches'].items()},
+			{
+				'customers': ('Customers', 'Customers'),
+				'orders': ('Orders', 'Orders'),
+				'staff': ('Staff', 'Staff'),
+				'menu': ('Menu Items', 'Menu items'),
+			},
+		)
+		self.assertEqual(len(data['matches']['menu']['match']), 4)
+		self.assertEqual((data['timed_out'], data['failed']), ([], []))
+
+	def test_matches_are_limited_per_type(self):
+		with mock.patch.dict(search.LIMITS, menu=3):
+			data = self.search(query='finder burger')
+		self.assertEqual(
+			[item['name'] for item in data['matches']['menu']['match']],
+			['finder burger 0', 'finder burger 1', 'finder burger 2'],
+		)
+
+	def test_filters_select_the_types(self):
+		data = self.search(query='finder', filters=' menu, staff,')
+		self.assertEqual(set(data['matches']), {'menu', 'staff'})
+
+	def test_slow_types_time_out(self):
+		release = threading.Event()
+		self.addCleanup(release.set)
+		with self.patch_lookup('staff', lambda *args: release.wait(5)), mock.patch.object(search, 'BUDGET', 0.5):
+			data = self.search(query='finder')
+		self.assertEqual(data['timed_out'], ['staff'])
+		self.assertEqual(set(data['matches']), {'customers', 'orders', 'menu'})
+
+	def test_failed_types_are_reported(self):
+		def fail(*args):
+			raise ValueError('lookup failed')
+
+		with self.patch_lookup('orders', fail), self.assertLogs('dashboard.search', 'ERROR'):
+			data = self.search(query='finder')
+		self.assertEqual(data['failed'], ['orders'])
+		self.assertEqual(set(data['matches']), {'customers', 'staff', 'menu'})
+		self.assertEqual(len(data['matches']['menu']['match']), 4)
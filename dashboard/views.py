@@ -29,6 +29,9 @@ from places.api.serializers import (
 	StaffSerializer,
 	BranchSerializer
 )
+from places.api.prefetch import optimize_queryset
+from places.api.pagination import KeysetPagination
+from . import search
 from django.contrib.auth import authenticate
 from places.models import *
 from accounts.models import (
@@ -112,47 +115,45 @@ def login_view(request):
 		return Response({'error': True, 'message': str(e)}, status=404)
 
 
+# `required_params` wraps view methods, the params are checked below
 @api_view(["GET"])
-@required_params('place', 'query')
 def search_view(request):
 	params = request.GET
-	place = Restaurant.objects.get(slug=params.get('place'))
-	query = params.get('query', None)
+	place = request.place
+	query = params.get('query', '').strip()
 	filters = params.get('filters', None)
 	sort = params.get('sort-by', None)
 	results = {}
 
+	if place is None:
+		return Response({'error': True, 'message': 'place missing from search params'}, status=400)
 	if not query:
 		return Response({'error': True, 'message': 'query missing from search params'}, status=400)
-	else:
-		results['customers'] = {
-			'key': 'Customers',
-			'label': 'Customers',
-			'match': CustomerSerializer(place.customers.all(), many=True).data
-		}
-
-		# results['results'] = [
-		# 	{
-		# 		'key': 'Menu Items',
-		# 		'match': FoodSerializer(place.menu.all(), many=True).data
-		# 	},
-		# 	{
-		# 		'key': 'Staff',
-		# 		'match': StaffSerializer(place.staff.all(), many=True).data
-		# 	},
-		# 	{
-		# 		'key': 'Orders',
-		# 		'match': OrderSerializer(place.orders.all(), many=True).data
-		# 	},
-		# ]
 	if filters:
-		filters = filters.split(',')
+		# the entity types to search, e.g. `customers,orders`
+		filters = [kind.strip() for kind in filters.split(',') if kind.strip()]
+		unknown = [kind for kind in filters if kind not in search.ENTITIES]
+		if unknown:
+			return Response({
+				'error': True,
+				'message': f'unknown filters {", ".join(unknown)}, expected some of {", ".join(search.ENTITIES)}',
+			}, status=400)
 	if sort:
 		pass
 
+	matches, timed_out, failed = search.find(place, query, filters or None)
+	for kind, (key, label, match) in matches.items():
+		results[kind] = {
+			'key': key,
+			'label': label,
+			'match': match,
+		}
+
 	response = {
 		'error': False,
-		'matches': results
+		'matches': results,
+		'timed_out': timed_out,
+		'failed': failed,
 	}
 	return Response(response)
 
@@ -173,7 +174,7 @@ def resource_view(request):
 	if not target and not org:
 		return Response(status=400, data={'error': True, 'message': 'Please specify an org and a target.'})
 	res = None
-	place = Restaurant.objects.get(slug=org)
+	place = request.place
 	if target == 'Categories':
 		res = CategorySerializer(place.categories.all(), many=True).data
 	elif target == 'Customers':
@@ -186,8 +187,9 @@ def resource_view(request):
 class DashboardView(APIView):
 	def get(self, request):
 		try:
-			place = Restaurant.objects.get(slug=request.GET.get('place'))
-			recent_orders = OrderSerializer(place.orders.all().order_by('-id')[:10], many=True, context={'request': request}).data
+			place = request.place
+			orders = optimize_queryset(place.orders.all(), OrderSerializer)
+			recent_orders = OrderSerializer(orders.order_by('-id')[:10], many=True, context={'request': request}).data
 			data = {
 				'help': None,
 				'recent_orders': recent_orders
@@ -202,8 +204,7 @@ class ManageCategoriesView(APIView):
 	allowed_methods = ["GET", "POST", "HEAD", "OPTIONS", "DELETE"]
 	@required_params("place")
 	def get(self, request, **kwargs):
-		org = request.GET.get('place')
-		place = Restaurant.objects.get(slug=org)
+		place = request.place
 		cats = place.categories.all()
 		data = CategorySerializer(cats, many=True).data
 		return Response({ 'data': data, 'error': False})
@@ -307,20 +308,20 @@ class EditFoodItemView(RetrieveUpdateDestroyAPIView):
 	lookup_field = 'slug'
 
 	def get_queryset(self, **kwargs):
-		place = Restaurant.objects.get(slug=self.request.GET.get('place'))
+		place = self.request.place
 		qs = place.menu.all()
 		return qs
 
 	def delete(self, request, **kwargs):
 		print("KWARGS:", kwargs)
-		place = Restaurant.objects.get(slug=self.request.GET.get('place'))
+		place = self.request.place
 		food_item = place.menu.get(slug=kwargs['slug'])
 		food_item.delete()
 		return Response({'error': False, 'message': "Successfully deleted food item"})
 
 	@required_params('place')
 	def post(self, request, **kwargs):
-		place = Restaurant.objects.get(slug=self.request.GET.get('place'))
+		place = self.request.place
 		food_item: FoodItem = place.menu.get(slug=kwargs['slug'])
 		action = request.data.get('action', None)
 		data = FoodSerializer(food_item, context={'request': request}).data
@@ -412,12 +413,12 @@ class ListFoodItemView(ListAPIView):
 
 	def get_place(self, request):
 		if not self.place:
-			self.place = Restaurant.objects.get(slug=request.GET.get('place'))
+			self.place = request.place
 		return self.place
 
 	def get_queryset(self):
 		queryset = self.model.objects.all().filter(place=self.place)
-		return queryset
+		return optimize_queryset(queryset, self.serializer_class)
 
 	def get(self, request):
 		self.get_place(request)
@@ -432,7 +433,7 @@ class ListFoodItemView(ListAPIView):
 		return Response(data)
 
 	def delete(self, request, slug):
-		place = Restaurant.objects.get(slug=request.GET.get('place'))
+		place = request.place
 		for item in request.data.get('items', None):
 			food = place.menu.get(slug=item)
 			food.delete()
@@ -444,11 +445,16 @@ class CreateOrderView(CreateAPIView):
 
 	@required_params('place')
 	def get(self, request):
-		place = Restaurant.objects.get(slug=request.GET.get('place'))
+		place = request.place
 		data = {
 			'error': None,
-			'products': FoodSerializer(place.menu.all(), many=True, context={'request': request}).data,
-			'customers': CustomerSerializer(place.customers.all(), many=True).data,
+			'products': FoodSerializer(
+				optimize_queryset(place.menu.all(), FoodSerializer),
+				many=True, context={'request': request}
+			).data,
+			'customers': CustomerSerializer(
+				optimize_queryset(place.customers.all(), CustomerSerializer), many=True
+			).data,
 		}
 		return Response(data, status=200)
 
@@ -558,7 +564,7 @@ class ListOrdersView(ListAPIView):
 	
 	@required_params('place')
 	def delete(self, request):
-		place = Restaurant.objects.get(slug=request.GET.get('place'))
+		place = request.place
 		for item in request.data['items']:
 			order = place.orders.get(id=item)
 			order.delete()
@@ -566,12 +572,17 @@ class ListOrdersView(ListAPIView):
 	
 	@required_params('place')
 	def get(self, request):
-		place = Restaurant.objects.get(slug=request.GET.get('place'))
-		all_orders = place.orders.all().order_by('-id')
-		orders = OrderSerializer(all_orders, many=True, context={'request': request}).data
+		place = request.place
+		all_orders = optimize_queryset(place.orders.all(), OrderSerializer)
+		paginator = KeysetPagination(page_size=50, ordering='-pk')
+		page = paginator.paginate_queryset(all_orders, request)
+		orders = OrderSerializer(page, many=True, context={'request': request}).data
 		data = {
 			'error': None,
-			'orders': orders
+			'orders': orders,
+			'next': paginator.get_next_link(),
+			'previous': paginator.get_previous_link(),
+			'count': paginator.count,
 		}
 		return Response(data)
 
@@ -583,15 +594,21 @@ class ListCustomersView(ListAPIView):
 	model = Customer
 
 	def get_queryset(self, request, **kwargs):
-		place = Restaurant.objects.get(slug=request.GET.get('place'))
-		return place.customers.all()
+		place = request.place
+		return optimize_queryset(place.customers.all(), self.serializer_class)
 
 	def get(self, request, **kwargs):
 		try:
-			customers = self.get_queryset(request)
+			paginator = KeysetPagination(page_size=50, ordering='pk')
+			customers = paginator.paginate_queryset(self.get_queryset(request), request)
 			data = self.serializer_class(customers, many=True).data
-			print("DATA:", data)
-			return Response({ 'error': False, 'data': data})
+			return Response({
+				'error': False,
+				'data': data,
+				'next': paginator.get_next_link(),
+				'previous': paginator.get_previous_link(),
+				'count': paginator.count,
+			})
 		except Exception as e:
 			return Response({ 'error' : True, 'message': str(e)})
 
@@ -668,7 +685,7 @@ class CreateStaffView(APIView):
 
 	def post(self, request):
 		try:
-			place = Restaurant.objects.get(slug=request.GET.get('place'))
+			place = request.place
 			staff_id = generate_staff_id()
 			user = User(
 					email=request.data['email'],
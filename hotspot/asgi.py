@@ -1,7 +1,7 @@
 import os
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
-from django.core.asgi import get_asgi_application
+from hotspot.handlers import get_asgi_application
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
@@ -0,0 +1,93 @@
+"""
+	Request handlers that pick a middleware chain per URL prefix.
+
+	`settings.MIDDLEWARE_PROFILES` is a list of `(prefix, middleware)` pairs,
+	every profile gets its own middleware chain when the handler starts and a
+	request is routed through the chain of the longest matching prefix. Paths
+	that don't match any prefix use the regular `settings.MIDDLEWARE` stack.
+
+	Both kinds of handlers also wrap the view of a traced request in a span,
+	see `metrics.tracing`.
+"""
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+
+class TracedViewMixin:
+	def make_view_atomic(self, view):
+		# the last step before the view is called. Imported here as this
+		# module is loaded before settings are configured
+		from metrics.tracing import traced_view
+		return traced_view(super().make_view_atomic(view))
+
+
+class ProfileHandler(TracedViewMixin, BaseHandler):
+	""" A handler whose middleware chain is built from `middleware` """
+
+	def __init__(self, middleware):
+		super().__init__()
+		self.middleware = list(middleware)
+
+	def load_middleware(self, is_async=False):
+		# BaseHandler only reads `settings.MIDDLEWARE`, swap it while the
+		# chain is built (this only ever runs once, at start up)
+		default = settings.MIDDLEWARE
+		settings.MIDDLEWARE = self.middleware
+		try:
+			super().load_middleware(is_async=is_async)
+		finally:
+			settings.MIDDLEWARE = default
+
+
+class RoutedHandlerMixin(TracedViewMixin):
+	routes = ()
+
+	def load_middleware(self, is_async=False):
+		super().load_middleware(is_async=is_async)
+		routes = []
+		for prefix, middleware in getattr(settings, 'MIDDLEWARE_PROFILES', ()):
+			handler = ProfileHandler(middleware)
+			handler.load_middleware(is_async=is_async)
+			routes.append((prefix, handler))
+		self.routes = sorted(routes, key=lambda route: len(route[0]), reverse=True)
+
+	def get_profile_handler(self, request):
+		path = request.path_info
+		for prefix, handler in self.routes:
+			if path.startswith(prefix):
+				return handler
+		return None
+
+	def get_response(self, request):
+		handler = self.get_profile_handler(request)
+		if handler is None:
+			return super().get_response(request)
+		return handler.get_response(request)
+
+	async def get_response_async(self, request):
+		handler = self.get_profile_handler(request)
+		if handler is None:
+			return await super().get_response_async(request)
+		return await handler.get_response_async(request)
+
+
+class RoutedWSGIHandler(RoutedHandlerMixin, WSGIHandler):
+	pass
+
+
+class RoutedASGIHandler(RoutedHandlerMixin, ASGIHandler):
+	pass
+
+
+def get_wsgi_application():
+	import django
+	django.setup(set_prefix=False)
+	return RoutedWSGIHandler()
+
+
+def get_asgi_application():
+	import django
+	django.setup(set_prefix=False)
+	return RoutedASGIHandler()
@@ -36,21 +36,220 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
 ]
 
-MIDDLEWARE = [
+# Request instrumentation, shared by every middleware profile below
+INSTRUMENTATION_MIDDLEWARE = [
+    'metrics.middleware.MetricsMiddleware',
+    'metrics.tracing.TracingMiddleware',
+    'metrics.profiling.ProfilingMiddleware',
+    'metrics.middleware.QueryMiddleware',
+    'metrics.middleware.AccessLogMiddleware',
+]
+
+MIDDLEWARE = INSTRUMENTATION_MIDDLEWARE + [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'places.middleware.PlacesMiddleware',
-    'places.middleware.VerboseLogMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Slimmer middleware chains for the JSON APIs, see `hotspot.handlers`.
+# The public API keeps sessions and auth because `login_view` logs the
+# customer in, the dashboard is token authenticated only. CSRF, messages
+# and clickjacking protection only matter for the admin site.
+PUBLIC_API_MIDDLEWARE = INSTRUMENTATION_MIDDLEWARE + [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'places.middleware.PlacesMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+]
+
+DASHBOARD_API_MIDDLEWARE = INSTRUMENTATION_MIDDLEWARE + [
+    'django.middleware.security.SecurityMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'places.middleware.PlacesMiddleware',
+]
+
+# (url prefix, middleware), the longest matching prefix wins
+MIDDLEWARE_PROFILES = [
+    ('/api/admin/', DASHBOARD_API_MIDDLEWARE),
+    ('/api/places/', PUBLIC_API_MIDDLEWARE),
+    ('/api/', PUBLIC_API_MIDDLEWARE),
+    ('/superuser/', MIDDLEWARE),
+]
+
 ROOT_URLCONF = 'hotspot.urls'
 
+# Structured access log written by `metrics.middleware.AccessLogMiddleware`,
+# records are buffered in memory and written to rotating JSONL files in
+# `DIR` by a background thread, overflowing records are dropped
+ACCESS_LOG = {
+    'ENABLED': True,
+    'DIR': os.path.join(BASE_DIR, 'logs'),
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0, # seconds
+}
+
+# Per request query counting by `metrics.middleware.QueryMiddleware`, a
+# `SAMPLE_RATE` share of requests is also checked for statements repeated
+# `REPEAT_THRESHOLD` times or more (N+1 queries) which end up in the access log
+SQL_INSTRUMENTATION = {
+    'ENABLED': True,
+    'HEADERS': True, # X-DB-Queries / X-DB-Time
+    'SAMPLE_RATE': 0.05,
+    'REPEAT_THRESHOLD': 5,
+}
+
+# Statements slower than `THRESHOLD_MS`, caught by the same middleware even
+# with SQL_INSTRUMENTATION disabled, are logged with the view and code that
+# ran them. The query plan of each statement shape is captured once per
+# worker (SQLite only)
+SLOW_QUERY_LOG = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 100,
+    'EXPLAIN': True,
+    'DIR': os.path.join(BASE_DIR, 'logs'),
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+}
+
+# Request metrics exposed at /metrics/ by `metrics.views.metrics_view`. Set
+# `MULTIPROCESS_DIR` when running several workers (e.g. gunicorn) so that
+# every worker's numbers are added up, empty it whenever the server starts
+PROMETHEUS = {
+    'ENABLED': True,
+    'TOKEN': os.environ.get('PROMETHEUS_TOKEN'),
+    'MULTIPROCESS_DIR': os.environ.get('PROMETHEUS_MULTIPROC_DIR'),
+}
+
+# On demand profiling by `metrics.profiling.ProfilingMiddleware`, requests
+# sending `X-Profile: <TOKEN>` and one in every `SAMPLE_ONE_IN` requests
+# (0 turns sampling off) are profiled into `DIR`, see `manage.py profiles`
+PROFILING = {
+    'TOKEN': os.environ.get('PROFILING_TOKEN'),
+    'SAMPLE_ONE_IN': 0,
+    'INTERVAL': 0.005, # seconds between stack samples
+    'DIR': os.path.join(BASE_DIR, 'profiles'),
+}
+
+# Heap snapshots with tracemalloc, see `metrics.memory`. Tracing slows
+# allocations down, it can also be started on a single worker through
+# `/metrics/memory/` instead of enabling it here
+TRACEMALLOC = {
+    'ENABLED': os.environ.get('TRACEMALLOC') == '1',
+    'FRAMES': 15, # frames kept per allocation, to find the view or serializer
+    'DIR': os.path.join(BASE_DIR, 'snapshots'),
+}
+
+# Request traces by `metrics.tracing.TracingMiddleware`, spans for the
+# middleware, view, serializers and SQL of a sampled request are written
+# to `traces-<pid>.jsonl` in OTLP/JSON
+TRACING = {
+    'ENABLED': True,
+    'SERVICE_NAME': 'hotspot',
+    'SAMPLE_RATE': 0.01, # unless the caller sends a `traceparent` header
+    'MAX_SPANS': 500, # per trace, further spans are counted but dropped
+    'DIR': os.path.join(BASE_DIR, 'logs'),
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+}
+
+# In-process cache used by `places.middleware.PlacesMiddleware` to resolve
+# the restaurant from the request host or the `place` and `branch` params
+# without hitting the database
+TENANT_CACHE = {
+    'MAX_SIZE': 512,
+    'TTL': 300, # seconds
+    'HOST_MAP_TTL': 60, # seconds
+}
+
+# Precomputed menus served by `menu_view`, see `places.menus`. Snapshots are
+# rebuilt after the response to the request that changed the menu, parsed
+# snapshots are kept in memory per worker. `menu_view` shows a sample of
+# `FEATURED_COUNT` featured items which changes every `FEATURED_ROTATION`
+MENU_SNAPSHOTS = {
+    'CACHE_SIZE': 128,
+    'CACHE_TTL': 3600, # seconds
+    'FEATURED_COUNT': 10,
+    'FEATURED_ROTATION': 300, # seconds
+}
+
+# Related items shown by `item_detail_view`, see `places.related`. The
+# `COUNT` best matches of every menu item are stored, rescored `BATCH_SIZE`
+# items at a time
+RELATED_ITEMS = {
+    'COUNT': 10,
+    'BATCH_SIZE': 256,
+}
+
+# Scoring of the customer feed, see `places.recommendations`. The weights
+# are added up per item, at most `FEED_SIZE` items are recommended
+RECOMMENDATIONS = {
+    'TAG_WEIGHT': 1.0,
+    'PLACE_TAG_WEIGHT': 0.5,
+    'FOLLOW_BOOST': 1.0,
+    'FEATURED_BOOST': 0.5,
+    'POPULARITY_WEIGHT': 0.5,
+    'FEED_SIZE': 200,
+}
+
+# In-memory autocomplete indexes, see `places.autocomplete`. One index of
+# at most `MAX_TERMS` names per menu and worker, about 320 bytes a name,
+# `CACHE_SIZE` of them. The menu version is checked every `REFRESH` seconds
+AUTOCOMPLETE = {
+    'CACHE_SIZE': 128,
+    'CACHE_TTL': 3600, # seconds
+    'REFRESH': 5, # seconds
+    'LIMIT': 8,
+    'MAX_TERMS': 20000,
+}
+
+# Searches counted in `SearchMetric` rows by `metrics.search`. Repeated
+# searches are added up in memory and written after a response once the
+# buffer is `FLUSH_INTERVAL` seconds old or holds `FLUSH_SIZE` entries,
+# searches are dropped while it holds `MAX_KEYS`
+SEARCH_METRICS = {
+    'ENABLED': True,
+    'MAX_KEYS': 10000,
+    'MAX_RESULTS': 20,
+    'FLUSH_INTERVAL': 30, # seconds
+    'FLUSH_SIZE': 1000,
+}
+
+# Merchant dashboard search, see dashboard.search. Every type gets at most
+# LIMITS[type] matches, types not found within BUDGET_MS are left out
+DASHBOARD_SEARCH = {
+    'BUDGET_MS': 300,
+    'WORKERS': 4,
+    'LIMITS': {'customers': 5, 'orders': 5, 'staff': 5, 'menu': 10},
+}
+
+# Cursor pagination of the menu, search, orders and customers lists, see
+# `places.api.pagination`. Counts asked for with `?count=1` are cached for
+# `COUNT_TTL` seconds
+KEYSET_PAGINATION = {
+    'COUNT_CACHE_SIZE': 256,
+    'COUNT_TTL': 60, # seconds
+}
+
+# Validators and cache policy of `place_view`, `menu_view` and
+# `item_detail_view`, see `places.api.conditional`. Responses may be kept
+# by shared caches for `MAX_AGE` seconds and revalidated afterwards
+CONDITIONAL_GET = {
+    'MAX_AGE': 60, # seconds
+    'VARY': ('Accept',),
+}
+
 AUTH_USER_MODEL = 'accounts.Account'
 
 TEMPLATES = [
@@ -81,6 +280,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # the migrations lag behind the models, test databases are
+        # created from the models directly
+        'TEST': {'MIGRATE': False},
     }
 }
 
@@ -141,13 +343,26 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'places.api.renderers.FastJSONRenderer',
+        'places.api.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'places.api.parsers.FastJSONParser',
+        'places.api.parsers.MessagePackParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser'
     ]
 }
 
+# JSON encoding of the API and the menu snapshots, see `places.api.fastjson`.
+# orjson is used when installed, set `BACKEND` to 'json' to use the standard
+# library instead, `manage.py benchcodec` compares them
+JSON_CODEC = {
+    'BACKEND': 'orjson',
+}
+
 # FOREST = {
 #    'FOREST_URL': 'https://api.forestadmin.com',
 #    'FOREST_ENV_SECRET': '45afbc785747953f28705f619d98ba726dfacd869d2343e6589d28d0c62d444f',
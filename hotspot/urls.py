@@ -9,6 +9,7 @@ urlpatterns = [
     path('', include('places.urls', namespace='core')),
     path('api/', include('api.urls', namespace='api')),
     path('superuser/', admin.site.urls),
+    path('metrics/', include('metrics.urls', namespace='metrics')),
     path('webhook/', webhooks.successful_payment_webhook, name="checkout-hook"),
     # path('forest', include('django_forest.urls')),
 ]
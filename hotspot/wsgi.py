@@ -9,7 +9,7 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
-from django.core.wsgi import get_wsgi_application
+from hotspot.handlers import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotspot.settings')
 
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class MetricsConfig(AppConfig):
     name = 'metrics'
+
+    def ready(self):
+        from django.conf import settings
+        if getattr(settings, 'TRACEMALLOC', {}).get('ENABLED'):
+            from . import memory
+            memory.start()
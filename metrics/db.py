@@ -0,0 +1,174 @@
+import os
+import re
+import sys
+import time
+from django.conf import settings
+from .logs import slow_query_log
+from .utils import view_name
+
+
+_IN_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+	""" Reduce a statement to its shape, so `id = 1` and `id = 2` match """
+	sql = _STRING.sub('?', sql)
+	sql = _NUMBER.sub('?', sql)
+	sql = _IN_LIST.sub('(...)', sql)
+	return _SPACES.sub(' ', sql).strip()
+
+
+def serializer_field(depth=60):
+	"""
+		The `Serializer.field` whose value is being computed on this thread, found
+		by walking up the stack to the innermost `Serializer.to_representation`
+	"""
+	from rest_framework.serializers import Serializer
+
+	frame = sys._getframe(1)
+	while frame is not None and depth:
+		if frame.f_code.co_name == 'to_representation':
+			owner = frame.f_locals.get('self')
+			field = frame.f_locals.get('field')
+			if isinstance(owner, Serializer) and field is not None:
+				return f'{type(owner).__name__}.{field.field_name}'
+		frame = frame.f_back
+		depth -= 1
+	return None
+
+
+def app_frame(depth=80):
+	""" `file:line in function` of the innermost frame of this project's code """
+	frame = sys._getframe(1)
+	base = str(settings.BASE_DIR)
+	own = os.path.dirname(__file__)
+	while frame is not None and depth:
+		filename = frame.f_code.co_filename
+		if filename.startswith(base) and not filename.startswith(own):
+			return f'{os.path.relpath(filename, base)}:{frame.f_lineno} in {frame.f_code.co_name}'
+		frame = frame.f_back
+		depth -= 1
+	return None
+
+
+class SlowQueryLog:
+	"""
+		Writes statements slower than `threshold` seconds to a JSON lines log.
+		The first time a statement shape is seen its `EXPLAIN QUERY PLAN` is
+		captured too (SQLite only), later entries refer to it by fingerprint.
+	"""
+	def __init__(self, writer, threshold=0.1, explain=True, max_plans=1000):
+		self.writer = writer
+		self.threshold = threshold
+		self.explain = explain
+		self.max_plans = max_plans
+		self.explained = set()
+
+	def record(self, sql, params, elapsed, connection, view=None):
+		key = fingerprint(sql)
+		entry = {
+			'time': time.time(),
+			'duration_ms': round(elapsed * 1000, 3),
+			'fingerprint': key,
+			'sql': sql,
+			'view': view,
+			'frame': app_frame(),
+			'serializer_field': serializer_field(),
+		}
+		if self.explain and key not in self.explained:
+			if len(self.explained) >= self.max_plans:
+				self.explained.clear()
+			self.explained.add(key)
+			entry['plan'] = self.query_plan(sql, params, connection)
+		self.writer.write(entry)
+
+	def query_plan(self, sql, params, connection):
+		if connection.vendor != 'sqlite':
+			return None
+		# a bare cursor skips the execute wrappers, this query is not
+		# recorded itself
+		cursor = connection.create_cursor()
+		try:
+			cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+			# rows are (id, parent, notused, detail)
+			return [row[3] for row in cursor.fetchall()]
+		except Exception as error:
+			return [f'EXPLAIN failed: {error}']
+		finally:
+			cursor.close()
+
+
+def slow_log_from_settings():
+	""" A `SlowQueryLog` configured by `SLOW_QUERY_LOG`, None when it is disabled """
+	options = getattr(settings, 'SLOW_QUERY_LOG', {})
+	if not options.get('ENABLED', True):
+		return None
+	return SlowQueryLog(
+		slow_query_log,
+		threshold=options.get('THRESHOLD_MS', 100) / 1000,
+		explain=options.get('EXPLAIN', True),
+	)
+
+
+# one per worker, plans are explained once per statement shape whatever
+# middleware chain (see `hotspot.handlers`) ran the statement
+slow_log = slow_log_from_settings()
+
+
+class QueryRecorder:
+	"""
+		A database execute wrapper that counts queries and the time spent in
+		them. With `inspect` on it also groups statements by shape and notes
+		the serializer field that first ran each shape, which is what gives
+		N+1 patterns away. Statements slower than `slow_log.threshold` are
+		handed to `slow_log`, with the view of `request`.
+	"""
+	def __init__(self, inspect=False, threshold=5, slow_log=None, request=None):
+		self.inspect = inspect
+		self.threshold = threshold
+		self.slow_log = slow_log
+		self.request = request
+		self.count = 0
+		self.duration = 0.0
+		self.shapes = {}
+
+	def __call__(self, execute, sql, params, many, context):
+		start = time.perf_counter()
+		try:
+			return execute(sql, params, many, context)
+		finally:
+			elapsed = time.perf_counter() - start
+			self.count += 1
+			self.duration += elapsed
+			if self.inspect:
+				self.record(sql, elapsed)
+			if self.slow_log is not None and not many and elapsed >= self.slow_log.threshold:
+				self.slow_log.record(
+					sql, params, elapsed, context['connection'],
+					view=view_name(self.request) if self.request else None
+				)
+
+	def record(self, sql, elapsed):
+		key = fingerprint(sql)
+		shape = self.shapes.get(key)
+		if shape is None:
+			shape = self.shapes[key] = [0, 0.0, serializer_field()]
+		shape[0] += 1
+		shape[1] += elapsed
+
+	def repeated(self):
+		""" Statement shapes run at least `threshold` times, worst first """
+		found = [
+			{
+				'sql': sql,
+				'count': count,
+				'time_ms': round(duration * 1000, 3),
+				'source': source,
+			}
+			for sql, (count, duration, source) in self.shapes.items()
+			if count >= self.threshold
+		]
+		return sorted(found, key=lambda shape: shape['count'], reverse=True)
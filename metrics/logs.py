@@ -0,0 +1,134 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from django.conf import settings
+
+
+class JsonLinesWriter:
+	"""
+		Writes JSON records to rotating `<name>-<pid>.jsonl` files.
+
+		`write()` never blocks the caller: records are put on a bounded queue
+		and a background thread writes them in batches. When the queue is
+		full the record is dropped and counted in `dropped` instead.
+	"""
+	def __init__(
+			self, name, directory, max_bytes=10 * 1024 * 1024, backup_count=5,
+			queue_size=10000, batch_size=500, flush_interval=1.0):
+		self.name = name
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.backup_count = backup_count
+		self.queue_size = queue_size
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.written = 0
+		self.dropped = 0
+		self._pid = None
+		self._file = None
+		self._lock = threading.Lock()
+		atexit.register(self.close)
+
+	@property
+	def path(self):
+		return os.path.join(self.directory, f'{self.name}-{self._pid}.jsonl')
+
+	def write(self, record):
+		if self._pid != os.getpid():
+			self._start()
+		try:
+			self._queue.put_nowait(record)
+		except queue.Full:
+			with self._lock:
+				self.dropped += 1
+
+	def _start(self):
+		# (re)started lazily so that every forked worker gets its own
+		# queue, thread and file
+		with self._lock:
+			if self._pid == os.getpid():
+				return
+			self._pid = os.getpid()
+			self._file = None
+			self._queue = queue.Queue(maxsize=self.queue_size)
+			self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+			self._thread.start()
+
+	def _run(self):
+		running = True
+		while running:
+			batch = []
+			record = self._queue.get()
+			deadline = time.monotonic() + self.flush_interval
+			while record is not None:
+				batch.append(record)
+				if len(batch) >= self.batch_size:
+					break
+				try:
+					record = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+				except queue.Empty:
+					break
+			if record is None:
+				running = False
+			if batch:
+				self._flush(batch)
+
+	def _flush(self, batch):
+		lines = ''.join(json.dumps(record, default=str) + '\n' for record in batch)
+		try:
+			if self._file is None:
+				os.makedirs(self.directory, exist_ok=True)
+				self._file = open(self.path, 'a')
+			if self._file.tell() + len(lines) > self.max_bytes:
+				self._rotate()
+			self._file.write(lines)
+			self._file.flush()
+			self.written += len(batch)
+		except OSError:
+			self.dropped += len(batch)
+
+	def _rotate(self):
+		self._file.close()
+		for index in range(self.backup_count - 1, 0, -1):
+			source = f'{self.path}.{index}'
+			if os.path.exists(source):
+				os.replace(source, f'{self.path}.{index + 1}')
+		if self.backup_count:
+			os.replace(self.path, f'{self.path}.1')
+		else:
+			os.remove(self.path)
+		self._file = open(self.path, 'a')
+
+	def close(self, timeout=5):
+		""" Flush whatever is queued, called on interpreter shutdown """
+		if self._pid != os.getpid():
+			return
+		try:
+			self._queue.put(None, timeout=timeout)
+		except queue.Full:
+			return
+		self._thread.join(timeout)
+		if self._file:
+			self._file.close()
+		self._pid = None
+
+
+def writer_from_settings(name, setting):
+	""" Build a writer from one of the `*_LOG` dicts in settings """
+	options = getattr(settings, setting, {})
+	return JsonLinesWriter(
+		name,
+		directory=options.get('DIR', os.path.join(settings.BASE_DIR, 'logs')),
+		max_bytes=options.get('MAX_BYTES', 10 * 1024 * 1024),
+		backup_count=options.get('BACKUP_COUNT', 5),
+		queue_size=options.get('QUEUE_SIZE', 10000),
+		batch_size=options.get('BATCH_SIZE', 500),
+		flush_interval=options.get('FLUSH_INTERVAL', 1.0),
+	)
+
+
+access_log = writer_from_settings('access', 'ACCESS_LOG')
+slow_query_log = writer_from_settings('slow-queries', 'SLOW_QUERY_LOG')
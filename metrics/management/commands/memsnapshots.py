@@ -0,0 +1,53 @@
+import os
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from metrics import memory
+
+
+class Command(BaseCommand):
+	help = "List the heap snapshots dumped by workers or compare the snapshots of one worker"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--pid', type=int, help="Compare the latest snapshot of this worker with its first one")
+		parser.add_argument('--previous', action='store_true', help="Compare with the snapshot before the latest instead")
+		parser.add_argument('--top', type=int, default=20, help="Number of allocation sites to show")
+
+	def handle(self, *args, **options):
+		directory = os.path.dirname(memory.snapshot_dir())
+		if not os.path.isdir(directory):
+			raise CommandError(f'No snapshots saved in {directory}')
+		if options['pid']:
+			self.compare(options)
+		else:
+			self.list(directory)
+
+	def list(self, directory):
+		self.stdout.write(f'{"pid":>8} {"snapshots":>9}  {"first":<19}  latest')
+		for pid in sorted(os.listdir(directory)):
+			paths = memory.list_snapshots(pid)
+			if not paths:
+				continue
+			first, latest = (datetime.fromtimestamp(os.path.getmtime(path)) for path in (paths[0], paths[-1]))
+			self.stdout.write(f'{pid:>8} {len(paths):>9}  {first:%Y-%m-%d %H:%M:%S}  {latest:%Y-%m-%d %H:%M:%S}')
+
+	def compare(self, options):
+		paths = memory.list_snapshots(options['pid'])
+		if not paths:
+			raise CommandError(f'No snapshots saved for worker {options["pid"]}')
+		latest = memory.load_snapshot(paths[-1])
+		if len(paths) == 1:
+			self.stdout.write(f'Only one snapshot, top allocations in {os.path.basename(paths[0])}')
+			self.show(memory.top_allocations(latest, limit=options['top']))
+			return
+		base = paths[-2] if options['previous'] else paths[0]
+		self.stdout.write(f'Growth from {os.path.basename(base)} to {os.path.basename(paths[-1])}')
+		self.show(memory.top_allocations(latest, memory.load_snapshot(base), limit=options['top']))
+
+	def show(self, stats):
+		for stat in stats:
+			size = f'{stat["size_kb"]:>10.1f} KiB'
+			if 'size_diff_kb' in stat:
+				size += f' {stat["size_diff_kb"]:>+10.1f} KiB'
+			self.stdout.write(f'{size}  {stat["site"]}')
+			if stat['origin'] and not stat['site'].endswith(stat['origin']):
+				self.stdout.write(f'{"":>14}  from {stat["origin"]}')
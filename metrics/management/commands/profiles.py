@@ -0,0 +1,66 @@
+import os
+from collections import Counter
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from metrics.profiling import read_collapsed
+
+
+class Command(BaseCommand):
+	help = "List the saved request profiles or merge the profiles of a view"
+
+	def add_arguments(self, parser):
+		parser.add_argument('--view', help="Merge every profile saved for this view")
+		parser.add_argument('--output', help="Write the merged collapsed stacks to a file")
+		parser.add_argument('--top', type=int, default=15, help="Number of hottest functions to show")
+
+	def handle(self, *args, **options):
+		directory = getattr(settings, 'PROFILING', {}).get('DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+		if not os.path.isdir(directory):
+			raise CommandError(f'No profiles saved in {directory}')
+		if options['view']:
+			self.merge(os.path.join(directory, options['view']), options)
+		else:
+			self.list(directory)
+
+	def list(self, directory):
+		self.stdout.write(f'{"view":<32} {"profiles":>8} {"samples":>8}  latest')
+		for view in sorted(os.listdir(directory)):
+			paths = self.profile_paths(os.path.join(directory, view))
+			if not paths:
+				continue
+			samples = sum(sum(read_collapsed(path).values()) for path in paths)
+			latest = datetime.fromtimestamp(max(os.path.getmtime(path) for path in paths))
+			self.stdout.write(f'{view:<32} {len(paths):>8} {samples:>8}  {latest:%Y-%m-%d %H:%M:%S}')
+
+	def merge(self, directory, options):
+		paths = self.profile_paths(directory)
+		if not paths:
+			raise CommandError(f'No profiles saved in {directory}')
+		stacks = Counter()
+		for path in paths:
+			stacks.update(read_collapsed(path))
+
+		if options['output']:
+			with open(options['output'], 'w') as handle:
+				for stack, count in stacks.most_common():
+					handle.write(f'{stack} {count}\n')
+			self.stdout.write(f'Merged {len(paths)} profiles into {options["output"]}')
+
+		# time spent in each function itself (the innermost frame of a sample)
+		total = sum(stacks.values())
+		leaves = Counter()
+		for stack, count in stacks.items():
+			leaves[stack.rsplit(';', 1)[-1]] += count
+		self.stdout.write(f'{len(paths)} profiles, {total} samples')
+		for label, count in leaves.most_common(options['top']):
+			self.stdout.write(f'{count / total:7.1%}  {label}')
+
+	def profile_paths(self, directory):
+		if not os.path.isdir(directory):
+			return []
+		return [
+			os.path.join(directory, name)
+			for name in os.listdir(directory)
+			if name.endswith('.folded')
+		]
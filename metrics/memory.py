@@ -0,0 +1,110 @@
+"""
+	Heap snapshots of a worker process with `tracemalloc`.
+
+	Tracing is off unless `settings.TRACEMALLOC['ENABLED']` is set or it is
+	started through `/metrics/memory/`. Snapshots are dumped to
+	`<DIR>/<pid>/<timestamp>.snapshot` so that they can be compared later
+	with `manage.py memsnapshots`, even after the worker is gone.
+"""
+import os
+import resource
+import time
+import tracemalloc
+from django.conf import settings
+
+
+def options():
+	return getattr(settings, 'TRACEMALLOC', {})
+
+
+def snapshot_dir(pid=None):
+	directory = options().get('DIR', os.path.join(settings.BASE_DIR, 'snapshots'))
+	return os.path.join(directory, str(pid or os.getpid()))
+
+
+def start():
+	if not tracemalloc.is_tracing():
+		tracemalloc.start(options().get('FRAMES', 15))
+
+
+def stop():
+	tracemalloc.stop()
+
+
+def status():
+	current, peak = tracemalloc.get_traced_memory()
+	return {
+		'pid': os.getpid(),
+		'tracing': tracemalloc.is_tracing(),
+		'traced_kb': current // 1024,
+		'traced_peak_kb': peak // 1024,
+		# kilobytes on linux
+		'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+		'snapshots': list_snapshots(),
+	}
+
+
+def list_snapshots(pid=None):
+	directory = snapshot_dir(pid)
+	if not os.path.isdir(directory):
+		return []
+	names = sorted(name for name in os.listdir(directory) if name.endswith('.snapshot'))
+	return [os.path.join(directory, name) for name in names]
+
+
+def take_snapshot():
+	""" Dump a snapshot of the traced heap, returns its path """
+	snapshot = tracemalloc.take_snapshot().filter_traces((
+		tracemalloc.Filter(False, tracemalloc.__file__),
+		tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+		tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+	))
+	directory = snapshot_dir()
+	os.makedirs(directory, exist_ok=True)
+	path = os.path.join(directory, f'{int(time.time() * 1000)}.snapshot')
+	snapshot.dump(path)
+	return path
+
+
+def load_snapshot(path):
+	return tracemalloc.Snapshot.load(path)
+
+
+def origin(traceback):
+	""" The innermost frame inside this project, e.g. the serializer or view """
+	for frame in reversed(traceback):
+		if frame.filename.startswith(settings.BASE_DIR):
+			return f'{os.path.relpath(frame.filename, settings.BASE_DIR)}:{frame.lineno}'
+	return None
+
+
+def top_allocations(snapshot, previous=None, limit=20):
+	"""
+		The biggest allocation sites by file and line, or the ones that grew
+		the most since `previous` when given
+	"""
+	if previous is None:
+		stats = snapshot.statistics('lineno')
+	else:
+		stats = snapshot.compare_to(previous, 'lineno')
+	# the per line statistics only keep the allocating frame, look the
+	# full traceback up to find where in this project it came from.
+	# Tracebacks run from the oldest frame to the allocating one.
+	origins = {}
+	for trace in snapshot.traces:
+		origins.setdefault(trace.traceback[-1], trace.traceback)
+
+	results = []
+	for stat in stats[:limit]:
+		frame = stat.traceback[0]
+		entry = {
+			'site': f'{frame.filename}:{frame.lineno}',
+			'origin': origin(origins.get(frame, stat.traceback)),
+			'size_kb': round(stat.size / 1024, 1),
+			'count': stat.count,
+		}
+		if previous is not None:
+			entry['size_diff_kb'] = round(stat.size_diff / 1024, 1)
+			entry['count_diff'] = stat.count_diff
+		results.append(entry)
+	return results
@@ -0,0 +1,117 @@
+import random
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from .db import QueryRecorder, slow_log
+from .logs import access_log
+from .registry import Counter, Gauge, Histogram
+from .utils import view_name, route_name, tenant_slug, tenant_class
+
+
+REQUESTS = Counter(
+	'http_requests', 'Requests served',
+	('view', 'tenant_class', 'method', 'status'),
+)
+LATENCY = Histogram(
+	'http_request_duration_seconds', 'Time taken to serve a request',
+	('view', 'tenant_class'),
+)
+IN_PROGRESS = Gauge('http_requests_in_progress', 'Requests being served right now')
+
+
+class QueryMiddleware:
+	"""
+		Counts the queries and database time of every request into
+		`request.queries` and reports them as `X-DB-Queries` and `X-DB-Time`
+		(milliseconds). A `SAMPLE_RATE` share of requests is also inspected
+		for repeated statement shapes (N+1 queries). Statements slower than
+		`SLOW_QUERY_LOG['THRESHOLD_MS']` go to the slow query log, which is
+		enabled on its own.
+	"""
+	def __init__(self, get_response):
+		options = getattr(settings, 'SQL_INSTRUMENTATION', {})
+		self.counting = options.get('ENABLED', True)
+		if not self.counting and slow_log is None:
+			raise MiddlewareNotUsed
+		self.get_response = get_response
+		self.headers = self.counting and options.get('HEADERS', True)
+		self.sample_rate = options.get('SAMPLE_RATE', 0.05) if self.counting else 0
+		self.threshold = options.get('REPEAT_THRESHOLD', 5)
+
+	def __call__(self, request):
+		inspect = random.random() < self.sample_rate
+		queries = QueryRecorder(
+			inspect=inspect, threshold=self.threshold,
+			slow_log=slow_log, request=request
+		)
+		if self.counting:
+			request.queries = queries
+		with connection.execute_wrapper(queries):
+			response = self.get_response(request)
+		if self.headers:
+			response['X-DB-Queries'] = queries.count
+			response['X-DB-Time'] = f'{queries.duration * 1000:.3f}'
+		return response
+
+
+class AccessLogMiddleware:
+	"""
+		Structured access log, one JSON record per request. Records are
+		handed to `metrics.logs.access_log` which writes them off the
+		request thread.
+	"""
+	def __init__(self, get_response):
+		if not getattr(settings, 'ACCESS_LOG', {}).get('ENABLED', True):
+			raise MiddlewareNotUsed
+		self.get_response = get_response
+
+	def __call__(self, request):
+		start = time.perf_counter()
+		response = self.get_response(request)
+		latency = time.perf_counter() - start
+
+		record = {
+			'time': time.time(),
+			'method': request.method,
+			'path': request.path,
+			'route': route_name(request),
+			'view': view_name(request),
+			'tenant': tenant_slug(request),
+			'status': response.status_code,
+			'latency_ms': round(latency * 1000, 3),
+			'bytes': None if response.streaming else len(response.content),
+		}
+		queries = getattr(request, 'queries', None)
+		if queries is not None:
+			record['db_queries'] = queries.count
+			record['db_time_ms'] = round(queries.duration * 1000, 3)
+			if queries.inspect:
+				record['db_repeated'] = queries.repeated()
+		access_log.write(record)
+		return response
+
+
+class MetricsMiddleware:
+	""" Request counts, latency histograms and concurrency for `/metrics/` """
+	def __init__(self, get_response):
+		if not getattr(settings, 'PROMETHEUS', {}).get('ENABLED', True):
+			raise MiddlewareNotUsed
+		self.get_response = get_response
+
+	def __call__(self, request):
+		IN_PROGRESS.inc()
+		start = time.perf_counter()
+		try:
+			response = self.get_response(request)
+		finally:
+			IN_PROGRESS.dec()
+		latency = time.perf_counter() - start
+
+		# unresolved urls are bundled up so that scanners can't blow up
+		# the number of series
+		view = view_name(request) or 'unresolved'
+		tenant = tenant_class(request)
+		REQUESTS.labels(view, tenant, request.method, response.status_code).inc()
+		LATENCY.labels(view, tenant).observe(latency)
+		return response
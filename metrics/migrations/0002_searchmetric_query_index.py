@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='searchmetric',
+            index=models.Index(fields=['query'], name='metrics_sea_query_49e28d_idx'),
+        ),
+    ]
@@ -22,6 +22,10 @@ class SearchMetric(models.Model):
 	results = models.ManyToManyField("places.FoodItem", blank=True)
 	incidents = models.IntegerField(default=0)
 
+	class Meta:
+		# rows are looked up by query when buffered searches are written, see `metrics.search`
+		indexes = [models.Index(fields=['query'])]
+
 	def __str__(self):
 		return self.query
 
@@ -0,0 +1,113 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from .utils import view_name
+
+
+def frame_label(code):
+	filename = code.co_filename
+	if filename.startswith(settings.BASE_DIR):
+		filename = os.path.relpath(filename, settings.BASE_DIR)
+	else:
+		filename = os.path.basename(filename)
+	return f'{filename}:{code.co_name}'
+
+
+class StackSampler:
+	"""
+		Samples the stack of one thread every `interval` seconds from a helper
+		thread and counts identical stacks, which gives the "collapsed stacks"
+		format flamegraph tools read: `outer;inner;innermost <count>`.
+	"""
+	def __init__(self, thread_id, root=None, interval=0.005):
+		self.thread_id = thread_id
+		self.root = root
+		self.interval = interval
+		self.stacks = Counter()
+		self._stopped = threading.Event()
+		self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+	def start(self):
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._stopped.set()
+		self._thread.join()
+
+	def _run(self):
+		while not self._stopped.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)
+			if frame is None:
+				break
+			stack = []
+			# frames above `root` belong to the server, not the request
+			while frame is not None and frame is not self.root:
+				stack.append(frame_label(frame.f_code))
+				frame = frame.f_back
+			self.stacks[';'.join(reversed(stack))] += 1
+
+	def collapsed(self):
+		return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def read_collapsed(path):
+	stacks = Counter()
+	with open(path) as handle:
+		for line in handle:
+			stack, _, count = line.rstrip('\n').rpartition(' ')
+			if stack:
+				stacks[stack] += int(count)
+	return stacks
+
+
+class ProfilingMiddleware:
+	"""
+		Profiles requests sent with `X-Profile: <PROFILING['TOKEN']>` plus one
+		in every `PROFILING['SAMPLE_ONE_IN']` requests. Each profile is saved
+		as `<DIR>/<view>/<timestamp>-<pid>.folded`, see `manage.py profiles`.
+	"""
+	def __init__(self, get_response):
+		options = getattr(settings, 'PROFILING', {})
+		self.get_response = get_response
+		self.token = options.get('TOKEN')
+		self.one_in = options.get('SAMPLE_ONE_IN', 0)
+		if not self.token and not self.one_in:
+			raise MiddlewareNotUsed
+		self.interval = options.get('INTERVAL', 0.005)
+		self.directory = options.get('DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+	def should_profile(self, request):
+		header = request.META.get('HTTP_X_PROFILE')
+		if header and self.token:
+			return hmac.compare_digest(header.encode(), self.token.encode())
+		return bool(self.one_in) and random.randrange(self.one_in) == 0
+
+	def __call__(self, request):
+		if not self.should_profile(request):
+			return self.get_response(request)
+
+		sampler = StackSampler(
+			threading.get_ident(),
+			root=sys._getframe(),
+			interval=self.interval
+		).start()
+		try:
+			response = self.get_response(request)
+		finally:
+			sampler.stop()
+
+		view = view_name(request) or 'unresolved'
+		directory = os.path.join(self.directory, view)
+		os.makedirs(directory, exist_ok=True)
+		name = f'{int(time.time() * 1000)}-{os.getpid()}.folded'
+		with open(os.path.join(directory, name), 'w') as handle:
+			handle.write(sampler.collapsed())
+		response['X-Profile-Id'] = f'{view}/{name}'
+		return response
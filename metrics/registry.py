@@ -0,0 +1,308 @@
+"""
+	A small Prometheus style metrics registry.
+
+	Counters, gauges and fixed bucket histograms are kept per process. When
+	`settings.PROMETHEUS['MULTIPROCESS_DIR']` is set (e.g. under gunicorn)
+	every worker writes its values to its own memory mapped file in that
+	directory and a scrape from any worker adds them all up. The directory
+	should be emptied whenever the server is (re)started.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from django.conf import settings
+
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+def _read_entries(data):
+	""" Yield `(key, value, offset)` for every value stored in a mmap file """
+	used = struct.unpack_from('<i', data, 0)[0]
+	pos = 8
+	while pos < used:
+		length = struct.unpack_from('<i', data, pos)[0]
+		key = bytes(data[pos + 4:pos + 4 + length]).decode('utf-8')
+		pos += 4 + length + (8 - (4 + length) % 8) % 8
+		yield key, struct.unpack_from('<d', data, pos)[0], pos
+		pos += 8
+
+
+class MmapedValues:
+	"""
+		Float values keyed by string, stored in a file so that other processes
+		can read them. The file starts with the number of bytes in use, then
+		holds `[key length][key][padding][8 byte double]` entries.
+	"""
+	initial_size = 1 << 16
+
+	def __init__(self, path):
+		self._file = open(path, 'a+b')
+		capacity = os.fstat(self._file.fileno()).st_size
+		if capacity == 0:
+			capacity = self.initial_size
+			self._file.truncate(capacity)
+		self._capacity = capacity
+		self._map = mmap.mmap(self._file.fileno(), capacity)
+		self._used = struct.unpack_from('<i', self._map, 0)[0]
+		if self._used == 0:
+			self._used = 8
+			struct.pack_into('<i', self._map, 0, self._used)
+		self._positions = {key: pos for key, _, pos in _read_entries(self._map)}
+
+	def _add(self, key):
+		encoded = key.encode('utf-8')
+		padding = (8 - (4 + len(encoded)) % 8) % 8
+		entry = struct.pack(f'<i{len(encoded)}s{padding}xd', len(encoded), encoded, 0.0)
+		while self._used + len(entry) > self._capacity:
+			self._capacity *= 2
+			self._file.truncate(self._capacity)
+			self._map.close()
+			self._map = mmap.mmap(self._file.fileno(), self._capacity)
+		self._map[self._used:self._used + len(entry)] = entry
+		self._positions[key] = self._used + len(entry) - 8
+		self._used += len(entry)
+		# the entry is complete before readers can see it
+		struct.pack_into('<i', self._map, 0, self._used)
+
+	def get(self, key):
+		pos = self._positions.get(key)
+		if pos is None:
+			return 0.0
+		return struct.unpack_from('<d', self._map, pos)[0]
+
+	def set(self, key, value):
+		if key not in self._positions:
+			self._add(key)
+		struct.pack_into('<d', self._map, self._positions[key], value)
+
+	def inc(self, key, amount):
+		self.set(key, self.get(key) + amount)
+
+	def items(self):
+		return [(key, self.get(key)) for key in self._positions]
+
+
+class DictValues(dict):
+	""" In memory stand-in for `MmapedValues` in single process mode """
+	def set(self, key, value):
+		self[key] = value
+
+	def inc(self, key, amount):
+		self[key] = self.get(key, 0.0) + amount
+
+
+class Registry:
+	def __init__(self, directory=None):
+		self.directory = directory
+		self.metrics = {}
+		self._stores = {}
+		self._pid = None
+		self._lock = threading.Lock()
+
+	def register(self, metric):
+		self.metrics[metric.name] = metric
+		return metric
+
+	def store(self, kind):
+		# stores are per process, a forked worker must not share its
+		# parent's files
+		if self._pid != os.getpid():
+			self._pid = os.getpid()
+			self._stores = {}
+		store = self._stores.get(kind)
+		if store is None:
+			if self.directory:
+				os.makedirs(self.directory, exist_ok=True)
+				path = os.path.join(self.directory, f'{kind}_{self._pid}.db')
+				store = MmapedValues(path)
+			else:
+				store = DictValues()
+			self._stores[kind] = store
+		return store
+
+	def collect(self):
+		""" `{(kind, key): value}` added up over every process """
+		if not self.directory:
+			return {
+				(kind, key): value
+				for kind, store in self._stores.items()
+				for key, value in store.items()
+			}
+		totals = defaultdict(float)
+		for path in glob.glob(os.path.join(self.directory, '*_*.db')):
+			kind, pid = os.path.basename(path)[:-3].rsplit('_', 1)
+			if kind == 'gauge' and not _is_alive(int(pid)):
+				continue
+			with open(path, 'rb') as handle:
+				data = handle.read()
+			if len(data) < 8:
+				continue
+			for key, value, _ in _read_entries(data):
+				totals[(kind, key)] += value
+		return totals
+
+	def render(self):
+		""" The registry in the Prometheus text exposition format """
+		samples = defaultdict(list)
+		for (kind, key), value in self.collect().items():
+			name, suffix, labels = json.loads(key)
+			samples[name].append((suffix, labels, value))
+
+		lines = []
+		for name, metric in self.metrics.items():
+			# counter samples all end in `_total`, their family is named after them
+			family = f'{name}_total' if metric.kind == 'counter' else name
+			lines.append(f'# HELP {family} {metric.documentation}')
+			lines.append(f'# TYPE {family} {metric.kind}')
+			for suffix, labels, value in sorted(samples.get(name, ()), key=_sample_order):
+				lines.append(f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+		return '\n'.join(lines) + '\n'
+
+
+def _is_alive(pid):
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		pass
+	return True
+
+
+def _sample_order(sample):
+	suffix, labels, _ = sample
+	bound = labels.get('le')
+	ordered = [(key, value) for key, value in labels.items() if key != 'le']
+	return ordered, suffix, float(bound) if bound else 0.0
+
+
+def _escape(value):
+	return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+	if not labels:
+		return ''
+	pairs = (f'{key}="{_escape(value)}"' for key, value in labels.items())
+	return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+	if value == float('inf'):
+		return '+Inf'
+	if value == int(value):
+		return str(int(value))
+	return repr(value)
+
+
+class Metric:
+	kind = None
+
+	def __init__(self, name, documentation, labelnames=(), registry=None):
+		self.name = name
+		self.documentation = documentation
+		self.labelnames = tuple(labelnames)
+		self.registry = registry or default_registry
+		self.registry.register(self)
+
+	def key(self, suffix, labelvalues, **extra):
+		labels = dict(zip(self.labelnames, labelvalues), **extra)
+		return json.dumps([self.name, suffix, labels])
+
+	def labels(self, *labelvalues, **labelkwargs):
+		if labelkwargs:
+			labelvalues = tuple(labelkwargs[name] for name in self.labelnames)
+		return _Child(self, tuple(str(value) for value in labelvalues))
+
+	def _update(self, key, amount=None, value=None):
+		registry = self.registry
+		with registry._lock:
+			store = registry.store(self.kind)
+			if value is None:
+				store.inc(key, amount)
+			else:
+				store.set(key, value)
+
+
+class _Child:
+	def __init__(self, metric, labelvalues):
+		self.metric = metric
+		self.labelvalues = labelvalues
+
+	def inc(self, amount=1):
+		self.metric.inc(amount, labelvalues=self.labelvalues)
+
+	def dec(self, amount=1):
+		self.metric.dec(amount, labelvalues=self.labelvalues)
+
+	def set(self, value):
+		self.metric.set(value, labelvalues=self.labelvalues)
+
+	def observe(self, value):
+		self.metric.observe(value, labelvalues=self.labelvalues)
+
+
+class Counter(Metric):
+	kind = 'counter'
+
+	def inc(self, amount=1, labelvalues=()):
+		self._update(self.key('_total', labelvalues), amount=amount)
+
+
+class Gauge(Metric):
+	""" Gauges of workers that have exited are left out of a scrape """
+	kind = 'gauge'
+
+	def inc(self, amount=1, labelvalues=()):
+		self._update(self.key('', labelvalues), amount=amount)
+
+	def dec(self, amount=1, labelvalues=()):
+		self.inc(-amount, labelvalues=labelvalues)
+
+	def set(self, value, labelvalues=()):
+		self._update(self.key('', labelvalues), value=value)
+
+
+class Histogram(Metric):
+	kind = 'histogram'
+
+	def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+		super().__init__(name, documentation, labelnames, registry)
+		self.buckets = tuple(sorted(buckets))
+		if self.buckets[-1] != float('inf'):
+			self.buckets += (float('inf'),)
+		self._keys = {}
+
+	def keys(self, labelvalues):
+		keys = self._keys.get(labelvalues)
+		if keys is None:
+			buckets = tuple(
+				(bound, self.key('_bucket', labelvalues, le=_format_value(bound)))
+				for bound in self.buckets
+			)
+			keys = self._keys[labelvalues] = (
+				buckets, self.key('_sum', labelvalues), self.key('_count', labelvalues)
+			)
+		return keys
+
+	def observe(self, value, labelvalues=()):
+		buckets, sum_key, count_key = self.keys(labelvalues)
+		registry = self.registry
+		with registry._lock:
+			store = registry.store(self.kind)
+			# buckets are stored cumulative, as they are exposed
+			for bound, key in buckets:
+				store.inc(key, 1 if value <= bound else 0)
+			store.inc(sum_key, value)
+			store.inc(count_key, 1)
+
+
+_options = getattr(settings, 'PROMETHEUS', {})
+default_registry = Registry(
+	directory=_options.get('MULTIPROCESS_DIR') or os.environ.get('PROMETHEUS_MULTIPROC_DIR'),
+)
@@ -0,0 +1,167 @@
+"""
+	Buffered `SearchMetric` ingestion.
+
+	`record()` only adds a search to an in-memory buffer, searches of the
+	same (query, restaurant, user) are counted in one entry. The buffer is
+	written out after the response of the request that finds it older than
+	`FLUSH_INTERVAL` seconds or fuller than `FLUSH_SIZE` entries (see
+	`places.utils.background`), and when the process exits. One transaction
+	writes the buffer:
+
+	- `incidents` of the existing rows go up through one `UPDATE` per
+	  distinct increment, with an F() expression
+	- rows are bulk created for the new entries
+	- the result items are added with one bulk `INSERT OR IGNORE`, leaving
+	  out the ones deleted since the search
+
+	At most `MAX_KEYS` entries are kept, searches of new entries are dropped
+	and counted in `dropped` while the buffer is full. Rows created for the
+	same entry at the same time by two workers are both kept.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from places.api.projections import chunks
+from places.utils.background import defer
+
+
+logger = logging.getLogger(__name__)
+
+_options = getattr(settings, 'SEARCH_METRICS', {})
+ENABLED = _options.get('ENABLED', True)
+MAX_KEYS = _options.get('MAX_KEYS', 10000)
+MAX_RESULTS = _options.get('MAX_RESULTS', 20)
+FLUSH_INTERVAL = _options.get('FLUSH_INTERVAL', 30)
+FLUSH_SIZE = _options.get('FLUSH_SIZE', 1000)
+
+QUERY_LENGTH = 250
+
+
+def normalize(query):
+	return ' '.join(query.casefold().split())[:QUERY_LENGTH]
+
+
+class SearchBuffer:
+	def __init__(self, max_keys=MAX_KEYS, max_results=MAX_RESULTS):
+		self.max_keys = max_keys
+		self.max_results = max_results
+		self.dropped = 0
+		self._entries = {}
+		self._started = time.monotonic()
+		self._lock = threading.Lock()
+
+	def add(self, query, place_pk, user_pk, results=()):
+		""" Count a search, returns whether the buffer is due to be flushed """
+		key = (normalize(query), place_pk, user_pk)
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				if len(self._entries) >= self.max_keys:
+					self.dropped += 1
+					return True
+				entry = self._entries[key] = [0, set()]
+			entry[0] += 1
+			room = self.max_results - len(entry[1])
+			if room > 0:
+				entry[1].update(list(results)[:room])
+			return len(self._entries) >= FLUSH_SIZE or time.monotonic() - self._started >= FLUSH_INTERVAL
+
+	def take(self):
+		""" The buffered entries, the buffer starts over empty """
+		with self._lock:
+			entries, self._entries = self._entries, {}
+			self._started = time.monotonic()
+			return entries
+
+	def __len__(self):
+		return len(self._entries)
+
+
+def write(entries):
+	""" Add `{(query, place pk, user pk): [searches, result pks]}` to the `SearchMetric` rows """
+	from accounts.models import Customer
+	from places.models import FoodItem
+	from .models import SearchMetric
+
+	if not entries:
+		return
+	with transaction.atomic():
+		users = {user for _, _, user in entries if user is not None}
+		customers = dict(Customer.objects.filter(user__in=users).values_list('user', 'pk')) if users else {}
+		counts = defaultdict(lambda: [0, set()])
+		for (query, place, user), (searches, results) in entries.items():
+			entry = counts[(query, place, customers.get(user))]
+			entry[0] += searches
+			entry[1] |= results
+
+		queries = list({query for query, _, _ in counts})
+
+		def existing():
+			rows = {}
+			for chunk in chunks(queries):
+				found = SearchMetric.objects.filter(query__in=chunk).order_by('pk')
+				for pk, query, place, person in found.values_list('pk', 'query', 'place_id', 'person'):
+					rows[query, place, person] = pk
+			return rows
+
+		metrics = existing()
+		increments = defaultdict(list)
+		for key, (searches, _) in counts.items():
+			if key in metrics:
+				increments[searches].append(metrics[key])
+		for searches, pks in increments.items():
+			for chunk in chunks(pks):
+				SearchMetric.objects.filter(pk__in=chunk).update(incidents=F('incidents') + searches)
+
+		new = [key for key in counts if key not in metrics]
+		if new:
+			SearchMetric.objects.bulk_create(
+				SearchMetric(query=query, place_id_id=place, person_id=person, incidents=counts[query, place, person][0])
+				for query, place, person in new
+			)
+			# bulk_create() leaves the primary keys unset on SQLite, rows are read back
+			metrics = existing()
+
+		found = set().union(*(results for _, results in counts.values()))
+		items = set()
+		for chunk in chunks(list(found)):
+			items.update(FoodItem.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+
+		Results = SearchMetric.results.through
+		Results.objects.bulk_create(
+			[
+				Results(searchmetric_id=metrics[key], fooditem_id=item)
+				for key, (_, results) in counts.items() if key in metrics
+				for item in results if item in items
+			],
+			ignore_conflicts=True,
+		)
+
+
+buffer = SearchBuffer()
+
+
+def flush():
+	entries = buffer.take()
+	try:
+		write(entries)
+	except DatabaseError:
+		logger.exception('Lost %d search metrics', len(entries))
+
+
+def record(query, place=None, user=None, results=()):
+	""" Count a search of `query` by `user`, finding the food item pks `results` """
+	if not ENABLED or not query:
+		return
+	user_pk = user.pk if user is not None and user.is_authenticated else None
+	place_pk = place.pk if place is not None else None
+	if buffer.add(query, place_pk, user_pk, results):
+		defer('search-metrics', flush)
+
+
+atexit.register(flush)
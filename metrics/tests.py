@@ -1,3 +1,112 @@
-from django.test import TestCase
+from unittest import mock
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from accounts.models import Account
+from places.tests import create_place
+from . import db, search
+from .search import SearchBuffer
+from .middleware import QueryMiddleware
+from .models import SearchMetric
+from .registry import Counter, Gauge, Histogram, Registry
 
-# Create your tests here.
+
+class RenderTestCase(SimpleTestCase):
+	def test_families_are_named_after_their_samples(self):
+		registry = Registry()
+		Counter('http_requests', 'Requests served', ['method'], registry=registry).labels('GET').inc(2)
+		Gauge('in_flight', 'Requests being served', registry=registry).set(1)
+		Histogram('latency_seconds', 'Latency', buckets=(0.1,), registry=registry).observe(0.05)
+		lines = registry.render().splitlines()
+		self.assertEqual(lines[:3], [
+			'# HELP http_requests_total Requests served',
+			'# TYPE http_requests_total counter',
+			'http_requests_total{method="GET"} 2',
+		])
+		self.assertIn('# TYPE in_flight gauge', lines)
+		self.assertIn('# TYPE latency_seconds histogram', lines)
+		self.assertIn('latency_seconds_count 1', lines)
+
+
+@override_settings(PROMETHEUS={'TOKEN': 'scraper-token'})
+class MemoryViewTestCase(TestCase):
+	def setUp(self):
+		self.client = Client(enforce_csrf_checks=True)
+		self.admin = Account.objects.create_superuser(email='admin@example.com', password='pw')
+
+	def test_session_posts_need_a_csrf_token(self):
+		self.client.force_login(self.admin)
+		self.assertEqual(self.client.post('/metrics/memory/', {'action': 'stop'}).status_code, 403)
+		self.client.cookies['csrftoken'] = 'a' * 32
+		response = self.client.post('/metrics/memory/', {'action': 'stop'}, HTTP_X_CSRFTOKEN='a' * 32)
+		self.assertEqual(response.status_code, 200)
+
+	def test_token_posts_skip_the_csrf_check(self):
+		response = self.client.post('/metrics/memory/', {'action': 'stop'}, HTTP_AUTHORIZATION='Bearer scraper-token')
+		self.assertEqual(response.status_code, 200)
+		response = self.client.post('/metrics/memory/', {'action': 'stop'}, HTTP_AUTHORIZATION='Bearer wrong')
+		self.assertEqual(response.status_code, 403)
+
+
+
+def select_one(request):
+	with connection.cursor() as cursor:
+		cursor.execute('SELECT 1')
+	return HttpResponse()
+
+
+class QueryMiddlewareTestCase(TestCase):
+	def setUp(self):
+		patches = (
+			mock.patch.object(db.slow_log, 'threshold', 0),
+			mock.patch.object(db.slow_log, 'explained', set()),
+			mock.patch.object(db.slow_log, 'writer'),
+		)
+		for patch in patches:
+			patch.start()
+			self.addCleanup(patch.stop)
+
+	def logged(self):
+		return [call.args[0] for call in db.slow_log.writer.write.call_args_list if call.args[0]['sql'] == 'SELECT 1']
+
+	def test_plans_are_explained_once_across_chains(self):
+		for middleware in (QueryMiddleware(select_one), QueryMiddleware(select_one)):
+			middleware(RequestFactory().get('/'))
+		entries = self.logged()
+		self.assertEqual(len(entries), 2)
+		self.assertEqual(['plan' in entry for entry in entries], [True, False])
+
+	@override_settings(SQL_INSTRUMENTATION={'ENABLED': False})
+	def test_slow_queries_are_logged_without_counting(self):
+		request = RequestFactory().get('/')
+		response = QueryMiddleware(select_one)(request)
+		self.assertEqual(len(self.logged()), 1)
+		self.assertFalse(hasattr(request, 'queries'))
+		self.assertNotIn('X-DB-Queries', response)
+
+
+class SearchMetricsTestCase(TestCase):
+	def setUp(self):
+		self.place = create_place('metrics', 3)
+		self.items = list(self.place.menu.order_by('pk'))
+		self.buffer = SearchBuffer()
+
+	def flush(self):
+		with mock.patch.object(search, 'buffer', self.buffer):
+			search.flush()
+		connection.check_constraints()
+
+	def test_deleted_results_are_left_out(self):
+		self.buffer.add('Burger', self.place.pk, None, [item.pk for item in self.items])
+		self.flush()
+		self.buffer.add('burger', self.place.pk, None, [item.pk for item in self.items])
+		self.buffer.add('fries', self.place.pk, None, [self.items[0].pk])
+		self.items.pop(0).delete()
+		self.flush()
+
+		burger = SearchMetric.objects.get(query='burger')
+		self.assertEqual(burger.incidents, 2)
+		self.assertEqual(set(burger.results.all()), set(self.items))
+		fries = SearchMetric.objects.get(query='fries')
+		self.assertEqual(fries.incidents, 1)
+		self.assertEqual(list(fries.results.all()), [])
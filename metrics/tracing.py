@@ -0,0 +1,225 @@
+"""
+	Lightweight request tracing.
+
+	`TracingMiddleware` starts a trace for a sampled share of requests (or
+	when the caller's `traceparent` header says so) and every `span()`
+	opened while serving it becomes a child of the span around it. Finished
+	traces are written to `traces-<pid>.jsonl`, one OTLP/JSON
+	`ExportTraceServiceRequest` per line, which an OpenTelemetry collector
+	can read with its file receiver.
+
+	Outside of a sampled request `span()` returns a shared no-op context
+	manager, so instrumented code costs next to nothing.
+"""
+import contextlib
+import functools
+import os
+import random
+import re
+import time
+from asyncio import iscoroutinefunction
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from .logs import writer_from_settings
+from .utils import route_name, tenant_slug
+
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_NOOP = contextlib.nullcontext()
+_current = ContextVar('span', default=None)
+
+
+class Trace:
+	def __init__(self, trace_id=None, max_spans=500):
+		self.trace_id = trace_id or os.urandom(16).hex()
+		self.max_spans = max_spans
+		self.spans = []
+		self.dropped = 0
+
+
+class Span:
+	__slots__ = (
+		'trace', 'span_id', 'parent_id', 'name', 'kind', 'attributes',
+		'start', 'end', 'error', '_token',
+	)
+
+	def __init__(self, trace, name, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+		self.trace = trace
+		self.span_id = os.urandom(8).hex()
+		self.parent_id = parent_id
+		self.name = name
+		self.kind = kind
+		self.attributes = attributes or {}
+		self.start = self.end = None
+		self.error = None
+		trace.spans.append(self)
+
+	def __enter__(self):
+		self.start = time.time_ns()
+		self._token = _current.set(self)
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.end = time.time_ns()
+		_current.reset(self._token)
+		if exc is not None:
+			self.error = f'{exc_type.__name__}: {exc}'
+		return False
+
+	def to_otlp(self):
+		data = {
+			'traceId': self.trace.trace_id,
+			'spanId': self.span_id,
+			'name': self.name,
+			'kind': self.kind,
+			'startTimeUnixNano': str(self.start),
+			'endTimeUnixNano': str(self.end or self.start),
+			'attributes': [
+				{'key': key, 'value': _otlp_value(value)}
+				for key, value in self.attributes.items()
+			],
+		}
+		if self.parent_id:
+			data['parentSpanId'] = self.parent_id
+		if self.error:
+			data['status'] = {'code': STATUS_ERROR, 'message': self.error}
+		return data
+
+
+def _otlp_value(value):
+	if isinstance(value, bool):
+		return {'boolValue': value}
+	if isinstance(value, int):
+		return {'intValue': str(value)}
+	if isinstance(value, float):
+		return {'doubleValue': value}
+	return {'stringValue': str(value)}
+
+
+def current_span():
+	return _current.get()
+
+
+def span(name, attributes=None, kind=SPAN_KIND_INTERNAL):
+	""" A child span of the current one, to be used as a context manager """
+	parent = _current.get()
+	if parent is None:
+		return _NOOP
+	trace = parent.trace
+	if len(trace.spans) >= trace.max_spans:
+		trace.dropped += 1
+		return _NOOP
+	return Span(trace, name, parent.span_id, kind, attributes)
+
+
+def traced_view(view):
+	""" Wrap a view callback in a span while a trace is running """
+	if _current.get() is None:
+		return view
+	name = f'view {getattr(view, "__name__", type(view).__name__)}'
+
+	if iscoroutinefunction(view):
+		@functools.wraps(view)
+		async def wrapper(*args, **kwargs):
+			with span(name):
+				return await view(*args, **kwargs)
+	else:
+		@functools.wraps(view)
+		def wrapper(*args, **kwargs):
+			with span(name):
+				return view(*args, **kwargs)
+	return wrapper
+
+
+def sql_span(execute, sql, params, many, context):
+	""" Database execute wrapper, one span per statement """
+	attributes = {'db.system': context['connection'].vendor, 'db.statement': sql}
+	with span('db.query', attributes, SPAN_KIND_CLIENT):
+		return execute(sql, params, many, context)
+
+
+class TraceExporter:
+	""" Writes finished traces as OTLP/JSON through a `JsonLinesWriter` """
+	def __init__(self, writer, service_name):
+		self.writer = writer
+		self.resource = {
+			'attributes': [
+				{'key': 'service.name', 'value': {'stringValue': service_name}},
+				{'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+			],
+		}
+
+	def export(self, trace):
+		self.writer.write({
+			'resourceSpans': [{
+				'resource': self.resource,
+				'scopeSpans': [{
+					'scope': {'name': 'metrics.tracing'},
+					'spans': [span.to_otlp() for span in trace.spans],
+				}],
+			}],
+		})
+
+
+_options = getattr(settings, 'TRACING', {})
+exporter = TraceExporter(
+	writer_from_settings('traces', 'TRACING'),
+	service_name=_options.get('SERVICE_NAME', 'hotspot'),
+)
+
+
+class TracingMiddleware:
+	"""
+		Starts a trace for `TRACING['SAMPLE_RATE']` of requests, or as told by
+		a W3C `traceparent` header, and adds a span for every SQL statement.
+		Sampled responses carry the trace id in `X-Trace-Id`.
+	"""
+	def __init__(self, get_response):
+		if not _options.get('ENABLED', True):
+			raise MiddlewareNotUsed
+		self.get_response = get_response
+		self.sample_rate = _options.get('SAMPLE_RATE', 0.01)
+		self.max_spans = _options.get('MAX_SPANS', 500)
+
+	def __call__(self, request):
+		trace_id = parent_id = None
+		match = _TRACEPARENT.match(request.META.get('HTTP_TRACEPARENT', ''))
+		if match:
+			trace_id, parent_id, flags = match.groups()
+			sampled = bool(int(flags, 16) & 1)
+		else:
+			sampled = random.random() < self.sample_rate
+		if not sampled:
+			return self.get_response(request)
+
+		trace = Trace(trace_id, self.max_spans)
+		root = Span(trace, request.method, parent_id, SPAN_KIND_SERVER, {
+			'http.method': request.method,
+			'http.target': request.path,
+		})
+		response = None
+		try:
+			with root, connection.execute_wrapper(sql_span):
+				response = self.get_response(request)
+		finally:
+			route = route_name(request)
+			root.name = f'{request.method} {route or "unresolved"}'
+			if route:
+				root.attributes['http.route'] = route
+			if getattr(request, 'place', None):
+				root.attributes['tenant'] = tenant_slug(request)
+			if response is not None:
+				root.attributes['http.status_code'] = response.status_code
+			if trace.dropped:
+				root.attributes['spans.dropped'] = trace.dropped
+			exporter.export(trace)
+		response['X-Trace-Id'] = trace.trace_id
+		return response
@@ -0,0 +1,12 @@
+from django.urls import path
+from .views import (
+	metrics_view,
+	memory_view,
+)
+
+app_name = 'metrics'
+
+urlpatterns = [
+	path('', metrics_view),
+	path('memory/', memory_view),
+]
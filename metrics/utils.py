@@ -0,0 +1,25 @@
+def view_name(request):
+	""" A short, low cardinality name of the view that served `request` """
+	match = getattr(request, 'resolver_match', None)
+	if match is None:
+		return None
+	# class based views and DRF's `api_view` both keep the original name
+	return match.url_name or match.func.__name__
+
+
+def route_name(request):
+	match = getattr(request, 'resolver_match', None)
+	if match is None:
+		return None
+	return '/' + match.route
+
+
+def tenant_slug(request):
+	place = getattr(request, 'place', None)
+	return place.slug if place else None
+
+
+def tenant_class(request):
+	""" The billing plan of the requested place, a bounded set unlike slugs """
+	place = getattr(request, 'place', None)
+	return place.billing_plan if place else 'none'
@@ -1,3 +1,86 @@
-from django.shortcuts import render
+import hmac
+import os
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from . import memory
+from .registry import default_registry
 
-# Create your views here.
+
+def has_token(request):
+	""" Whether the request sends `Authorization: Bearer <PROMETHEUS['TOKEN']>` """
+	token = getattr(settings, 'PROMETHEUS', {}).get('TOKEN')
+	header = request.META.get('HTTP_AUTHORIZATION', '')
+	if token and header.startswith('Bearer '):
+		return hmac.compare_digest(header[7:].encode(), token.encode())
+	return False
+
+
+def is_authorized(request):
+	""" Superusers, or scrapers sending the token """
+	user = getattr(request, 'user', None)
+	if user is not None and user.is_superuser:
+		return True
+	return has_token(request)
+
+
+def metrics_view(request):
+	if not is_authorized(request):
+		return HttpResponse(status=403)
+	return HttpResponse(
+		default_registry.render(),
+		content_type='text/plain; version=0.0.4; charset=utf-8'
+	)
+
+
+@csrf_exempt
+def memory_view(request):
+	"""
+		Heap introspection of the worker that serves the request. `GET` shows
+		the tracing status, `POST` with `action` one of `start`, `stop` or
+		`snapshot` acts on it. A snapshot reports the top allocation sites and
+		what grew since the previous snapshot of the same worker.
+	"""
+	if not is_authorized(request):
+		return HttpResponse(status=403)
+	if request.method == 'POST' and not has_token(request):
+		# a browser sends the session cookie cross-site, but never the token
+		rejected = CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+		if rejected is not None:
+			return rejected
+	if request.method == 'GET':
+		return JsonResponse(memory.status())
+	if request.method != 'POST':
+		return HttpResponse(status=405)
+
+	action = request.POST.get('action')
+	if action == 'start':
+		memory.start()
+	elif action == 'stop':
+		memory.stop()
+	elif action == 'snapshot':
+		try:
+			limit = int(request.POST.get('limit', 20))
+		except ValueError:
+			limit = 0
+		if limit < 1:
+			return JsonResponse({'detail': 'limit must be a positive number'}, status=400)
+		if not memory.tracemalloc.is_tracing():
+			return JsonResponse({'detail': 'tracemalloc is not started'}, status=409)
+		previous = memory.list_snapshots()[-1:]
+		path = memory.take_snapshot()
+		snapshot = memory.load_snapshot(path)
+		data = {
+			'snapshot': os.path.basename(path),
+			'top': memory.top_allocations(snapshot, limit=limit),
+		}
+		if previous:
+			data['since'] = os.path.basename(previous[0])
+			data['growth'] = memory.top_allocations(
+				snapshot, memory.load_snapshot(previous[0]), limit=limit
+			)
+		return JsonResponse(data)
+	else:
+		return JsonResponse({'detail': 'action must be start, stop or snapshot'}, status=400)
+	return JsonResponse(memory.status())
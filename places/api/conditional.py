@@ -0,0 +1,105 @@
+"""
+	Conditional GET for the public read endpoints.
+
+	`conditional_view()` computes a validator before the view runs and
+	answers `304 Not Modified` without calling the view (and serializing)
+	when the client's `If-None-Match` / `If-Modified-Since` still matches.
+
+	The menu endpoints are validated by the version of the menu snapshot
+	(see `places.menus`), and `menu_view` by the rotation of its featured
+	items too. The restaurant itself by its `date_created`, the
+	model's auto_now field, which `places.signals` also touches when the
+	branches, owner or relations shown by `place_view` change.
+"""
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+from ..models import Restaurant
+from .. import menus
+
+
+_options = getattr(settings, 'CONDITIONAL_GET', {})
+CACHE_CONTROL = {'public': True, 'max_age': _options.get('MAX_AGE', 60)}
+VARY = _options.get('VARY', ('Accept',))
+
+
+def make_etag(request, *parts):
+	""" Strong ETag of `parts`, one per representation the client can negotiate """
+	value = repr(parts + (request.META.get('HTTP_ACCEPT', ''),))
+	return '"%s"' % hashlib.sha1(value.encode()).hexdigest()
+
+
+def touch_places(places):
+	""" Mark restaurants as modified without sending their save signals """
+	places.update(date_created=timezone.now())
+
+
+# Validators
+
+def place_modified(request, *args, **kwargs):
+	if request.place is None:
+		return None
+	return Restaurant.objects.filter(pk=request.place.pk).values_list('date_created', flat=True).first()
+
+
+def place_etag(request, *args, **kwargs):
+	modified = place_modified(request)
+	if modified is None:
+		return None
+	return make_etag(request, 'place', request.place.pk, modified.isoformat())
+
+
+def menu_version(request):
+	if request.place is None:
+		return None
+	# the snapshot is looked up once for both validators
+	if not hasattr(request, '_menu_version'):
+		request._menu_version = menus.get_version(request.place, request.branch)
+	return request._menu_version
+
+
+def menu_modified(request, *args, **kwargs):
+	version = menu_version(request)
+	return version[1] if version else None
+
+
+def menu_etag(request, *args, **kwargs):
+	version = menu_version(request)
+	if version is None:
+		return None
+	branch = menus.menu_branch(request.branch)
+	return make_etag(request, 'menu', request.place.pk, branch.pk if branch else None, version[0])
+
+
+def featured_menu_modified(request, *args, **kwargs):
+	modified = menu_modified(request)
+	return modified and max(modified, menus.featured_window()[1])
+
+
+def featured_menu_etag(request, *args, **kwargs):
+	etag = menu_etag(request)
+	return etag and make_etag(request, etag, menus.featured_window()[0])
+
+
+def conditional_view(etag_func, last_modified_func=None):
+	""" `condition()` plus the shared cache policy, for successful responses only """
+	def decorator(view):
+		conditional = condition(etag_func, last_modified_func)(view)
+
+		@wraps(view)
+		def inner(request, *args, **kwargs):
+			response = conditional(request, *args, **kwargs)
+			if response.status_code in (200, 304):
+				patch_cache_control(response, **CACHE_CONTROL)
+				patch_vary_headers(response, VARY)
+			else:
+				# errors must not be revalidated against the resource
+				for header in ('ETag', 'Last-Modified'):
+					if response.has_header(header):
+						del response[header]
+			return response
+		return inner
+	return decorator
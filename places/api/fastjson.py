@@ -0,0 +1,56 @@
+"""
+	JSON encoding shared by the API renderer and parser and the menu snapshots.
+
+	orjson is used when it is installed (and `JSON_CODEC['BACKEND']` is not
+	set to 'json'), the standard library otherwise. Both give the same bytes
+	as DRF's `JSONRenderer` with its default settings: compact, unescaped
+	unicode, datetimes ending in 'Z' when in UTC, and whatever else DRF's
+	`JSONEncoder` knows about (Decimal, timedelta, lazy strings, querysets).
+"""
+import json
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.json import strict_constant
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+
+_options = getattr(settings, 'JSON_CODEC', {})
+BACKEND = 'orjson' if orjson is not None and _options.get('BACKEND', 'orjson') == 'orjson' else 'json'
+
+encoder = JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+if orjson is not None:
+	ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def escape_separators(content):
+	# like DRF, U+2028 and U+2029 are escaped to keep the output valid javascript
+	if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+		content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+	return content
+
+
+def dumps(data):
+	""" Compact JSON of `data` as UTF-8 bytes """
+	if BACKEND == 'orjson':
+		try:
+			return escape_separators(orjson.dumps(data, default=encoder.default, option=ORJSON_OPTIONS))
+		except orjson.JSONEncodeError:
+			# integers over 64 bits and other values only the standard library takes
+			pass
+	return escape_separators(encoder.encode(data).encode())
+
+
+def loads(content):
+	""" Parse JSON `content`, bytes or str, NaN and Infinity are rejected """
+	if BACKEND == 'orjson':
+		try:
+			return orjson.loads(content)
+		except orjson.JSONDecodeError:
+			# integers over 64 bits, or invalid, in which case the
+			# standard library raises with its usual messages
+			pass
+	return json.loads(content, parse_constant=strict_constant)
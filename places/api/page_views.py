@@ -22,6 +22,7 @@ from .serializers import (
 	TagSerializer,
 )
 from django.contrib.auth import login, logout
+from .. import menus, recommendations
 from ..models import *
 from accounts.models import (
 	Customer,
@@ -34,50 +35,13 @@ from rest_framework.decorators import api_view
 
 
 
-def get_featured_items():
-	featured_items = FoodItem.objects.filter(featured=True)
-	featured_items.order_by('?')[10]
-	return
+def get_featured_items(place, branch=None):
+	return menus.featured_items(menus.get_menu(place, branch))
 
 
-def generate_feed(food_items, liked_tags, follows):
-	# no duplicates
-	other_matches = set()
-	recommendations = set()
-	followed_matches = set()
-
-	for tag in liked_tags:
-		# find places that user follows matching this tag 
-		for place in follows.filter(tags__icontains=tag.name):
-			followed_matches.add(place) 
-			# find products that match the tag in this place
-			for match in place.menu.filter(tags__icontains=tag):
-				recommendations.add(match)
-			# find featured items in this place
-			for featured in place.menu.filter(featured=True)[:2]:
-				recommendations.add(featured)
-
-		# find other places not followed by user that match
-		for place in Restaurant.objects.filter(tags__icontains=tag):
-			other_matches.add(place)
-			for match in place.menu.filter(tags__icontains=tag):
-				recommendations.add(match)
-			# find featured items in this place
-			for featured in place.menu.filter(featured=True)[:2]:
-				recommendations.add(featured)
-
-		# find general products that match tag
-		for match in food_items.filter(tags__icontains=tag):
-			recommendations.add(match)
-
-	# @Todo
-	# 1. Create a queryset from recommendations and filter by reviews,
-	# order by 'id', 'price' 'popularity'
-	# 
-	# 2. Refine the recommendations with follows first, and 
-	# others last
-	# 
-	return recommendations
+def generate_feed(customer):
+	# ranked, see `places.recommendations`
+	return recommendations.feed(customer)
 
 
 
@@ -190,15 +154,10 @@ def menu_feed_view(request):
 	place = request.GET.get('place', None)
 	user = request.user
 	customer_profile = Customer.objects.get_or_create(user=user)[0]
-	food_items = FoodItem.objects.all()
-
-	# building recommendations
-	follows = customer_profile.get_follows()
-	liked_tags = customer_profile.get_liked_tags()
-	featured_items = get_featured_items()
+	featured_items = get_featured_items(request.place, request.branch)
 	
 	# feed and pagination
-	feed = generate_feed(food_items=food_items, tags=liked_tags, follows=follows)
+	feed = generate_feed(customer_profile)
 	results = paginate_items(feed, request)
 
 	try:
@@ -206,9 +165,9 @@ def menu_feed_view(request):
 		data = {
 			'error': False,
 			'data': {
-				'products': FoodSerializer(page['results'], many=True).data,
-				'categories': CategorySerializer(category.objects.all(), many=True).data,
-				'featured_items': FoodSerializer(featured_items, many=True).data
+				'products': menus.with_absolute_urls(page['results'], request),
+				'categories': CategorySerializer(Category.objects.all(), many=True).data,
+				'featured_items': menus.with_absolute_urls(featured_items, request),
 			},
 			'next_url': page['next'],
 			'previous_url': page['previous'],
@@ -0,0 +1,138 @@
+"""
+	Keyset (cursor) pagination.
+
+	Pages are found by filtering on the ordering column past the position
+	stored in an opaque cursor instead of an OFFSET, and no COUNT(*) is run
+	unless the client asks for `?count=1`, so a deep page costs the same as
+	the first one. Querysets go through DRF's `CursorPagination`, lists
+	already sorted on their key (the menu snapshots) are bisected.
+
+	Requested counts of querysets are approximate: each count is kept for
+	`KEYSET_PAGINATION['COUNT_TTL']` seconds per worker.
+"""
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from ..tenants import TenantCache
+
+
+_options = getattr(settings, 'KEYSET_PAGINATION', {})
+counts = TenantCache(max_size=_options.get('COUNT_CACHE_SIZE', 256), ttl=_options.get('COUNT_TTL', 60))
+
+
+def approximate_count(queryset):
+	sql, params = queryset.order_by().query.sql_with_params()
+	key = (queryset.db, sql, params)
+	count = counts.get(key)
+	if count is None:
+		count = queryset.count()
+		counts.set(key, count)
+	return count
+
+
+class KeysetPagination(CursorPagination):
+	page_size = 20
+	page_size_query_param = 'page_size'
+	max_page_size = 100
+	ordering = 'pk'
+	# `?ordering=` values clients may pick from, the first is the default
+	orderings = None
+	count_query_param = 'count'
+
+	def __init__(self, page_size=None, ordering=None, orderings=None):
+		if page_size is not None:
+			self.page_size = page_size
+		if ordering is not None:
+			self.ordering = ordering
+		if orderings is not None:
+			self.orderings = orderings
+
+	def get_ordering(self, request, queryset, view):
+		if self.orderings:
+			name = request.query_params.get('ordering')
+			ordering = self.orderings.get(name, next(iter(self.orderings.values())))
+			return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+		return super().get_ordering(request, queryset, view)
+
+	def paginate_queryset(self, queryset, request, view=None):
+		self.count = None
+		if isinstance(queryset, list):
+			return self.paginate_list(queryset, request, view)
+		if request.query_params.get(self.count_query_param) in ('1', 'true'):
+			self.count = approximate_count(queryset)
+		return super().paginate_queryset(queryset, request, view)
+
+	def paginate_list(self, items, request, view=None):
+		""" `items` must be sorted on the (ascending, unique) ordering key """
+		self.count = len(items)
+		self.page_size = self.get_page_size(request)
+		self.base_url = request.build_absolute_uri()
+		self.ordering = self.get_ordering(request, items, view)
+		key = self.ordering[0]
+		assert not key.startswith('-'), 'Lists can only be paginated in ascending order'
+
+		self.cursor = self.decode_cursor(request)
+		offset, reverse, position = self.cursor or (0, False, None)
+		keys = [item[key] for item in items]
+		value = position
+		if position is not None and keys:
+			try:
+				value = type(keys[0])(position)
+			except (TypeError, ValueError):
+				raise NotFound(self.invalid_cursor_message)
+
+		if reverse:
+			end = len(items) if position is None else bisect_left(keys, value)
+			end = max(end - offset, 0)
+			results = items[max(end - self.page_size - 1, 0):end][::-1]
+		else:
+			start = 0 if position is None else bisect_right(keys, value)
+			start += offset
+			results = items[start:start + self.page_size + 1]
+		return self.set_page(results, offset, reverse, position)
+
+	def set_page(self, results, offset, reverse, current_position):
+		# the end of `CursorPagination.paginate_queryset()`, for lists
+		self.page = list(results[:self.page_size])
+		if len(results) > len(self.page):
+			has_following_position = True
+			following_position = self._get_position_from_instance(results[-1], self.ordering)
+		else:
+			has_following_position = False
+			following_position = None
+
+		if reverse:
+			self.page = list(reversed(self.page))
+			self.has_next = (current_position is not None) or (offset > 0)
+			self.has_previous = has_following_position
+			if self.has_next:
+				self.next_position = current_position
+			if self.has_previous:
+				self.previous_position = following_position
+		else:
+			self.has_next = has_following_position
+			self.has_previous = (current_position is not None) or (offset > 0)
+			if self.has_next:
+				self.next_position = following_position
+			if self.has_previous:
+				self.previous_position = current_position
+
+		if (self.has_previous or self.has_next) and self.template is not None:
+			self.display_page_controls = True
+		return self.page
+
+	def _get_position_from_instance(self, instance, ordering):
+		if isinstance(instance, dict):
+			return str(instance[ordering[0].lstrip('-')])
+		return super()._get_position_from_instance(instance, ordering)
+
+	def get_paginated_response(self, data):
+		return Response(OrderedDict([
+			('count', self.count),
+			('next', self.get_next_link()),
+			('previous', self.get_previous_link()),
+			('results', data),
+		]))
@@ -0,0 +1,36 @@
+import msgpack
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+from . import fastjson
+from .renderers import FastJSONRenderer, MessagePackRenderer
+
+
+class FastJSONParser(parsers.JSONParser):
+	""" `JSONParser` decoding with orjson, DRF parses without it """
+	renderer_class = FastJSONRenderer
+
+	def parse(self, stream, media_type=None, parser_context=None):
+		if fastjson.BACKEND != 'orjson':
+			return super().parse(stream, media_type, parser_context)
+		parser_context = parser_context or {}
+		encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+		try:
+			content = stream.read()
+			if encoding.lower().replace('-', '') != 'utf8':
+				content = content.decode(encoding)
+			return fastjson.loads(content)
+		except ValueError as exc:
+			raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(parsers.BaseParser):
+	""" Request bodies sent as `Content-Type: application/msgpack` """
+	media_type = 'application/msgpack'
+	renderer_class = MessagePackRenderer
+
+	def parse(self, stream, media_type=None, parser_context=None):
+		try:
+			return msgpack.unpackb(stream.read(), raw=False)
+		except (ValueError, msgpack.UnpackException) as exc:
+			raise ParseError('MessagePack parse error - %s' % (str(exc) or type(exc).__name__))
@@ -0,0 +1,112 @@
+"""
+	Derive `select_related` / `prefetch_related` from a serializer.
+
+	The fields of a serializer are walked down to the nested serializers and
+	every field backed by a relation adds to the plan: single valued
+	relations are joined, many valued ones are prefetched with a `Prefetch`
+	whose queryset carries the plan of the nested serializer. Model methods
+	and properties can't be followed, a serializer declares what they use in
+	its Meta:
+
+		class Meta:
+			select_related = ('owner__user',)    # used by __str__
+			prefetch_related = ('reviews',)      # used by rating()
+"""
+import functools
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+class Plan:
+	def __init__(self):
+		self.select = []
+		# path -> (related model, plan of the prefetched objects)
+		self.prefetch = {}
+		self.hints = []
+
+	def add(self, path, field, plan):
+		if field.many_to_many or field.one_to_many:
+			self.prefetch[path] = (field.related_model, plan)
+			return
+		self.select.append(path)
+		self.select += [f'{path}__{lookup}' for lookup in plan.select]
+		for lookup, value in plan.prefetch.items():
+			self.prefetch[f'{path}__{lookup}'] = value
+		self.hints += [f'{path}__{lookup}' for lookup in plan.hints]
+
+	def apply(self, queryset):
+		lookups = [
+			Prefetch(path, queryset=plan.apply(model._default_manager.all()))
+			for path, (model, plan) in self.prefetch.items()
+		]
+		# after the `Prefetch` objects, they may go through them
+		lookups += [lookup for lookup in self.hints if lookup not in self.prefetch]
+		if self.select:
+			queryset = queryset.select_related(*self.select)
+		if lookups:
+			queryset = queryset.prefetch_related(*lookups)
+		return queryset
+
+
+def get_relation(model, name):
+	try:
+		field = model._meta.get_field(name)
+	except FieldDoesNotExist:
+		# reverse relations are reached through their accessor name
+		for field in model._meta.related_objects:
+			if field.get_accessor_name() == name:
+				return field
+		return None
+	return field if field.is_relation else None
+
+
+def build_plan(serializer, model):
+	plan = Plan()
+	for field in serializer.fields.values():
+		if field.write_only:
+			continue
+		if field.source == '*':
+			if isinstance(field, BaseSerializer):
+				nested = build_plan(field, model)
+				plan.select += nested.select
+				plan.prefetch.update(nested.prefetch)
+				plan.hints += nested.hints
+			continue
+		if len(field.source_attrs) != 1:
+			continue
+		relation = get_relation(model, field.source_attrs[0])
+		if relation is None:
+			continue
+
+		child = field
+		if isinstance(field, ListSerializer):
+			child = field.child
+		elif isinstance(field, ManyRelatedField):
+			child = field.child_relation
+
+		if isinstance(child, BaseSerializer):
+			nested = build_plan(child, relation.related_model)
+		elif (isinstance(child, RelatedField) and child.use_pk_only_optimization()
+				and not (relation.many_to_many or relation.one_to_many)):
+			# the primary key is read off the foreign key column
+			continue
+		else:
+			nested = Plan()
+		plan.add(field.source, relation, nested)
+
+	meta = getattr(serializer, 'Meta', None)
+	plan.select += getattr(meta, 'select_related', ())
+	plan.hints += getattr(meta, 'prefetch_related', ())
+	return plan
+
+
+@functools.lru_cache(maxsize=None)
+def get_plan(serializer_class):
+	return build_plan(serializer_class(), serializer_class.Meta.model)
+
+
+def optimize_queryset(queryset, serializer_class):
+	""" `queryset` with the relations `serializer_class` reads loaded up front """
+	return get_plan(serializer_class).apply(queryset)
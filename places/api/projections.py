@@ -0,0 +1,110 @@
+"""
+	Read path for food item lists that skips the model serializers.
+
+	`food_items()` fetches the columns `FoodSerializer` shows with
+	`values_list()`, plus one grouped query per relation (images, tags,
+	options and their choices), and assembles the same dicts the serializer
+	gives, in the same order, without instantiating any model.
+
+	Values are formatted by the serializer's own fields, so keep
+	`FOOD_COLUMNS` and `food_item()` in line with `FoodSerializer`.
+"""
+from collections import defaultdict
+from django.db import connection
+from metrics.tracing import span
+from ..models import CustomOptionChoice, FoodImage, OrderOption, Tag
+from ..utils.helpers import format_rating
+from .serializers import CustomOptionChoiceSerializer, FoodSerializer
+
+
+FOOD_COLUMNS = (
+	'pk', 'name', 'about', 'slug', 'price',
+	'category__name', 'rating_sum', 'rating_count',
+)
+
+price_field = FoodSerializer().fields['price']
+choice_price_field = CustomOptionChoiceSerializer().fields['price']
+image_storage = FoodImage._meta.get_field('image').storage
+
+
+def chunks(pks):
+	size = connection.features.max_query_params or len(pks) or 1
+	for start in range(0, len(pks), size):
+		yield pks[start:start + size]
+
+
+def grouped(queryset, lookup, pks, *fields):
+	""" `{pk: [row, ...]}` of `fields`, filtered and grouped by the relation `lookup` """
+	groups = defaultdict(list)
+	for chunk in chunks(pks):
+		for key, *row in queryset.filter(**{f'{lookup}__in': chunk}).values_list(lookup, *fields):
+			groups[key].append(row)
+	return groups
+
+
+def decimal(field, value):
+	return None if value is None else field.to_representation(value)
+
+
+def image_url(name, request=None):
+	url = image_storage.url(name)
+	return request.build_absolute_uri(url) if request else url
+
+
+def choice(name, price):
+	return {'name': name, 'price': decimal(choice_price_field, price)}
+
+
+def options_of(pks):
+	""" `{food item pk: [option, ...]}` like `OrderOptionSerializer` gives """
+	options = grouped(
+		OrderOption.objects.all(), 'customizations', pks,
+		'pk', 'name', 'required', 'default_choice__name', 'default_choice__price', 'default_choice',
+	)
+	option_pks = list({row[0] for rows in options.values() for row in rows})
+	choices = grouped(CustomOptionChoice.objects.all(), 'choices', option_pks, 'name', 'price')
+	return {
+		item: [
+			{
+				'id': pk,
+				'name': name,
+				'choices': [choice(*row) for row in choices.get(pk, ())],
+				'required': required,
+				'default_choice': choice(default_name, default_price) if default_pk is not None else None,
+			}
+			for pk, name, required, default_name, default_price, default_pk in rows
+		]
+		for item, rows in options.items()
+	}
+
+
+def food_items(queryset, request=None):
+	""" What `FoodSerializer(queryset, many=True)` gives, as plain dicts """
+	with span('projections.food_items'):
+		rows = list(queryset.values_list(*FOOD_COLUMNS))
+		pks = [row[0] for row in rows]
+		images = grouped(FoodImage.objects.all(), 'images', pks, 'pk', 'image')
+		tags = grouped(Tag.objects.all(), 'fooditem', pks, 'pk')
+		options = options_of(pks)
+		return [
+			food_item(row, images.get(row[0], ()), tags.get(row[0], ()), options.get(row[0], []), request)
+			for row in rows
+		]
+
+
+def food_item(row, images, tags, options, request=None):
+	pk, name, about, slug, price, category, rating_sum, rating_count = row
+	images = [{'url': image_url(image, request), 'id': image_pk} for image_pk, image in images]
+	return {
+		'id': pk,
+		'name': name,
+		'about': about,
+		'slug': slug,
+		'price': decimal(price_field, price),
+		'image': images[0] if images else None,
+		'tags': [tag for tag, in tags],
+		'images': images,
+		'category': category,
+		'custom_choices': options,
+		'rating': format_rating(rating_sum, rating_count),
+	}
@@ -0,0 +1,41 @@
+import msgpack
+from decimal import Decimal
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+from . import fastjson
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+	""" `JSONRenderer` encoding with orjson, DRF renders without it and pretty prints """
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if data is None:
+			return b''
+		indent = self.get_indent(accepted_media_type, renderer_context or {})
+		if fastjson.BACKEND != 'orjson' or indent is not None or self.ensure_ascii or not self.compact:
+			return super().render(data, accepted_media_type, renderer_context)
+		return fastjson.dumps(data)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+	"""
+		MessagePack for clients sending `Accept: application/msgpack`.
+
+		The values DRF turns into JSON strings (datetimes, UUIDs...) are the
+		same strings here, Decimals are strings too so that prices stay exact.
+	"""
+	media_type = 'application/msgpack'
+	format = 'msgpack'
+	charset = None
+	render_style = 'binary'
+	encoder = JSONEncoder()
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if data is None:
+			return b''
+		return msgpack.packb(data, default=self.default, datetime=False)
+
+	def default(self, obj):
+		if isinstance(obj, Decimal):
+			return str(obj)
+		return self.encoder.default(obj)
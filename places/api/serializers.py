@@ -1,5 +1,5 @@
+from rest_framework import serializers
 from rest_framework.serializers import (
-	ModelSerializer,
 	StringRelatedField,
 	HyperlinkedRelatedField,
 	SerializerMethodField,
@@ -13,6 +13,14 @@ from accounts.models import(
 	Merchant,
 	RestaurantStaffRole
 )
+from metrics.tracing import span
+
+
+class ModelSerializer(serializers.ModelSerializer):
+	""" Every serializer here gets a tracing span per serialized instance """
+	def to_representation(self, instance):
+		with span(f'{type(self).__name__}.to_representation'):
+			return super().to_representation(instance)
 
 
 class CurrencySerializer(ModelSerializer):
@@ -84,6 +92,9 @@ class FoodImageSerializer(ModelSerializer):
 
 	def get_url(self, obj):
 		req = self.context.get('request')
+		if req is None:
+			# menu snapshots are built without a request, see places.menus
+			return obj.image.url
 		url = req.build_absolute_uri(obj.image.url)
 		return url
 
@@ -123,6 +134,7 @@ class OrderItemSerializer(ModelSerializer):
 	class Meta:
 		fields = ('item', 'id', 'quantity', 'total')
 		model = OrderItem
+		prefetch_related = ('customizations__choice',)
 
 
 class CartSerializer(ModelSerializer):
@@ -133,6 +145,8 @@ class CartSerializer(ModelSerializer):
     class Meta:
         model = BuyerCart
         fields = '__all__'
+        # read by the owner's __str__
+        select_related = ('owner__user',)
 
 
 
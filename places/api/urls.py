@@ -4,9 +4,11 @@ from .views import (
 	login_view,
 	place_view,
 	menu_view,
+	feed_view,
 	item_detail_view,
 	cart_view,
 	search_view,
+	autocomplete_view,
 	checkout_view,
 	notifications_view,
 	leave_a_review,
@@ -24,7 +26,9 @@ urlpatterns = [
 
 	# customer
 	path('find/', search_view),
+	path('autocomplete/', autocomplete_view),
 	path('menu/', menu_view),
+	path('feed/', feed_view),
 	path('menu/item/', item_detail_view),
 	path('review/', leave_a_review),
 	
@@ -1,7 +1,5 @@
 import os, json
 from utils import *
-from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q
 from rest_framework.response import Response
 from .serializers import (
 	FoodSerializer,
@@ -11,11 +9,22 @@ from .serializers import (
 	ReviewSerializer,
 	OrderItemSerializer,
 	NotificationSerializer,
-	CategorySerializer,
 	TagSerializer,
 	RestaurantSerializer,
 	CartSerializer,
 )
+from .prefetch import optimize_queryset
+from .pagination import KeysetPagination
+from .conditional import (
+	conditional_view,
+	featured_menu_etag,
+	featured_menu_modified,
+	menu_etag,
+	menu_modified,
+	place_etag,
+	place_modified,
+)
+from .. import autocomplete, menus, recommendations, related, search
 from django.contrib.auth import login, logout
 from ..models import *
 from accounts.models import (
@@ -27,6 +36,7 @@ from metrics.models import (
 )
 from rest_framework.decorators import api_view
 from dashboard.views import required_params
+from metrics import search as search_metrics
 
 
 #  Helpers
@@ -57,17 +67,12 @@ def useParams(req):
 
 
 def get_related_items(place, food):
-	items = place.menu.filter(
-		Q(name__icontains=food.name)|
-		Q(category__name__iexact=food.category.name)
-	).exclude(name__iexact=food.name, id__iexact=food.id)
-	return items
+	menu = menus.get_menu(place)
+	return [menu.by_id[pk] for pk in related.related_ids(place, food) if pk in menu.by_id]
 
 
-def get_featured_items():
-	featured_items = FoodItem.objects.filter(featured=True)
-	featured_items.order_by('?')
-	return
+def get_featured_items(menu):
+	return menus.featured_items(menu)
 
 
 def get_cart(person, place):
@@ -82,9 +87,8 @@ def get_cart(person, place):
 
 
 def paginate_items(items, request, num_per_page=10):
-	paginator = PageNumberPagination()
-	paginator.page_size = num_per_page
-	page_size_query_param = 'page_size'
+	# `items` are menu snapshot products, sorted by id
+	paginator = KeysetPagination(page_size=num_per_page, ordering='id')
 	paginated_data = paginator.paginate_queryset(items, request)
 	data = paginator.get_paginated_response(paginated_data).data
 	return data
@@ -164,26 +168,56 @@ def login_view(request):
 
 # ========== Restaurant View ==============
 
+# `?ordering=` of search results, by relevance (`rank`) when not given
+SEARCH_ORDERINGS = {
+	'id': 'pk',
+	'price': ('price', 'pk'),
+	'-price': ('-price', '-pk'),
+}
+# results ranked by relevance that can be paged through
+SEARCH_LIMIT = 1000
+
+
 @api_view(["GET"])
 def search_view(request):
-	query = useParams(request).get('query', None)
-	_filter = useParams(request).get('filter', None)
+	params = useParams(request)
+	query = params.get('query', None)
+	_filter = params.get('filter', None)
 
 	if query:
-		items = FoodItem.objects.filter(title__icontains=query)
+		items = FoodItem.objects.all()
+		if request.place is not None:
+			items = items.filter(food_items=request.place)
 		if _filter:
 			items = items.filter(category__name__iexact=_filter)
-		paginator = PageNumberPagination()
-		paginator.page_size = 20
-		page = dict(paginator.get_paginated_response(
-				paginator.paginate_queryset(items, request)
-			).data)
-		results = FoodSerializer(page['results'], many=True).data
+
+		if params.get('ordering', 'rank') in SEARCH_ORDERINGS:
+			items = optimize_queryset(search.matching(items, query), FoodSerializer)
+			paginator = KeysetPagination(page_size=20, orderings=SEARCH_ORDERINGS)
+			page = dict(paginator.get_paginated_response(
+					paginator.paginate_queryset(items, request)
+				).data)
+			found = page['results']
+		else:
+			# positions in the ranking are the keys of the cursor
+			ranking = [{'rank': n, 'id': pk} for n, pk in enumerate(search.ranked(query, items, SEARCH_LIMIT))]
+			paginator = KeysetPagination(page_size=20, ordering='rank')
+			page = dict(paginator.get_paginated_response(
+					paginator.paginate_queryset(ranking, request)
+				).data)
+			pks = [row['id'] for row in page['results']]
+			by_pk = optimize_queryset(FoodItem.objects.filter(pk__in=pks), FoodSerializer).in_bulk()
+			found = [by_pk[pk] for pk in pks if pk in by_pk]
+		results = FoodSerializer(found, many=True).data
+		if paginator.cursor_query_param not in request.GET:
+			# counted once per search, not per page
+			search_metrics.record(query, request.place, request.user, [item.pk for item in found])
 		res = {
 			'error': None,
 			"results": results,
 			'next': page['next'],
 			'previous': page['previous'],
+			'count': page['count'],
 		}
 	else:
 		res = {
@@ -194,7 +228,50 @@ def search_view(request):
 
 
 
+# recommended products in a page of `feed_view`
+FEED_PAGE_SIZE = 20
+
+
+@api_view(["GET"])
+def feed_view(request):
+	""" Products of every restaurant ranked for the customer, see `places.recommendations` """
+	customer = None
+	if request.user.is_authenticated:
+		customer = Customer.objects.filter(user=request.user).first()
+	# positions in the ranking are the keys of the cursor
+	ranking = [{'rank': n, 'item': item} for n, item in enumerate(recommendations.feed(customer))]
+	paginator = KeysetPagination(page_size=FEED_PAGE_SIZE, ordering='rank')
+	page = dict(paginator.get_paginated_response(
+			paginator.paginate_queryset(ranking, request)
+		).data)
+	data = {
+		'error': False,
+		'data': {
+			'products': menus.with_absolute_urls([row['item'] for row in page['results']], request),
+		},
+		'next_url': page['next'],
+		'previous_url': page['previous'],
+		'count': page['count'],
+	}
+	return Response(data)
+
+
+@api_view(["GET"])
+def autocomplete_view(request):
+	params = useParams(request)
+	if request.place is None:
+		return Response({'error': True, 'error_text': "Place param is missing"}, status=400)
+	try:
+		limit = int(params.get('limit', autocomplete.LIMIT))
+	except ValueError:
+		limit = autocomplete.LIMIT
+	suggestions = autocomplete.suggest(request.place, request.branch, params.get('query', ''), limit)
+	return Response({'error': False, 'suggestions': suggestions})
+
+
+
 # @required_params('place')
+@conditional_view(place_etag, place_modified)
 @api_view(['GET'])
 def place_view(request):
 	place = request.place
@@ -203,19 +280,21 @@ def place_view(request):
 
 
 # @required_params('place')
+@conditional_view(featured_menu_etag, featured_menu_modified)
 @api_view(["GET"])
 def menu_view(request):
 	params = useParams(request)
-	org  = params.get('place')
 	category = params.get('cat')
-	place = Restaurant.objects.get(slug=org)
-	menu = place.menu.all()
+	place = request.place
+	menu = menus.get_menu(place, request.branch)
+	products = menu.products
 
 	if category:
-		menu = menu.filter(category__name__iexact=category)
+		category = category.casefold()
+		products = [item for item in products if (item['category'] or '').casefold() == category]
 
-	featured_items = get_featured_items()
-	results = paginate_items(menu, request)
+	featured_items = get_featured_items(menu)
+	results = paginate_items(products, request)
 
 	if request.user.is_authenticated:
 		user = request.user
@@ -226,9 +305,9 @@ def menu_view(request):
 		data = {
 			'error': False,
 			'data': {
-				'products': FoodSerializer(page['results'], many=True, context={'request': request}).data,
-				'categories': CategorySerializer(place.categories.all(), many=True).data,
-				'featured_items': FoodSerializer(featured_items, many=True, context={'request': request}).data
+				'products': menus.with_absolute_urls(page['results'], request),
+				'categories': menu.categories,
+				'featured_items': menus.with_absolute_urls(featured_items, request),
 			},
 			'next_url': page['next'],
 			'previous_url': page['previous'],
@@ -240,18 +319,19 @@ def menu_view(request):
 
 
 # @required_params('place', 'itemId')
+@conditional_view(menu_etag, menu_modified)
 @api_view(["GET"])
 def item_detail_view(request, **kwargs):
 	try:
 		params = useParams(request)
-		place = Restaurant.objects.get(slug=params.get('place'))
+		place = request.place
 		foodId = params.get('itemId')
 		food_item = place.menu.get(slug=foodId)
 		related_items = get_related_items(place, food_item)
 
 		data = {
 			'item': FoodSerializer(food_item, context={'request': request}).data,
-			'related_items': FoodSerializer(related_items, context={'request': request}, many=True).data,
+			'related_items': menus.with_absolute_urls(related_items, request),
 			'error': False,
 		}
 
@@ -266,8 +346,7 @@ def item_detail_view(request, **kwargs):
 @api_view(["GET", "POST"])
 def cart_view(request):
 	customer = Customer.objects.get(user=request.user)
-	params = useParams(request)
-	place = Restaurant.objects.get(slug=params.get('place'))
+	place = request.place
 	cart = get_cart(customer, place)
 
 	#  customization format
@@ -328,8 +407,7 @@ def cart_view(request):
 @api_view(["GET", "POST"])
 def checkout_view(request):
 	customer = Customer.objects.get(user=request.user)
-	params = useParams(request)
-	place = Restaurant.objects.get(slug=params.get('place'))
+	place = request.place
 	cart = get_cart(customer, place)
 	cart_items = cart.items.all()
 
@@ -0,0 +1,149 @@
+"""
+	Typo tolerant autocomplete of menu item and category names.
+
+	The menu of each restaurant, or branch, gets an in-memory index from the
+	trigrams of its names to the names holding them. A query is cut into
+	trigrams the same way and names are ranked by how many of them they
+	hold, so "shawarmer" still finds "Shawarma". Words are only padded at
+	the start, the word being typed matches as a prefix, and the trigrams
+	of the first word count twice when they also start the name.
+
+	Indexes are built from the menu snapshots (see `places.menus`) and kept
+	per worker, at most `MAX_TERMS` names each. The snapshot version is
+	checked at most every `AUTOCOMPLETE['REFRESH']` seconds, suggestions
+	are served without a query in between.
+"""
+import heapq
+import math
+import time
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from django.conf import settings
+from .tenants import TenantCache
+from . import menus
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+_options = getattr(settings, 'AUTOCOMPLETE', {})
+indexes = TenantCache(max_size=_options.get('CACHE_SIZE', 128), ttl=_options.get('CACHE_TTL', 3600))
+REFRESH = _options.get('REFRESH', 5)
+LIMIT = _options.get('LIMIT', 8)
+MAX_LIMIT = 20
+MAX_TERMS = _options.get('MAX_TERMS', 20000)
+
+# share of the query's trigrams a name must hold to be suggested
+MIN_SIMILARITY = 0.4
+
+
+def normalize(text):
+	""" The words of `text`, case and accents folded """
+	text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+	return ''.join(c if c.isalnum() else ' ' for c in text.casefold()).split()
+
+
+def trigrams(words):
+	""" Trigrams of `words`, those of the first word again marked with `^` """
+	grams = set()
+	for n, word in enumerate(words):
+		padded = f'  {word}'
+		word_grams = {padded[start:start + 3] for start in range(len(padded) - 2)}
+		grams |= word_grams
+		if n == 0:
+			grams.update('^' + gram for gram in word_grams)
+	return grams
+
+
+class Index:
+	""" Trigram index of a menu's names, postings are arrays (tuples without numpy) of suggestion positions """
+
+	def __init__(self, version, suggestions):
+		self.version = version
+		self.checked = time.monotonic()
+		self.suggestions = suggestions[:MAX_TERMS]
+		self.lengths = array('H')
+		postings = defaultdict(lambda: array('I'))
+		for position, suggestion in enumerate(self.suggestions):
+			words = normalize(suggestion['text'])
+			self.lengths.append(min(sum(map(len, words)), 65535))
+			for gram in trigrams(words):
+				postings[gram].append(position)
+		if numpy is not None:
+			self.postings = dict(postings)
+			self.length_array = numpy.frombuffer(self.lengths, dtype=numpy.uint16)
+		else:
+			# counting tuples of shared ints allocates nothing, unlike reading arrays
+			positions = list(range(len(self.suggestions)))
+			self.postings = {gram: tuple(map(positions.__getitem__, found)) for gram, found in postings.items()}
+
+	def suggest(self, query, limit=LIMIT):
+		""" The names closest to `query`, best first: most trigrams shared, then shortest """
+		grams = trigrams(normalize(query))
+		lists = [self.postings[gram] for gram in grams if gram in self.postings]
+		if not lists:
+			return []
+		needed = max(1, math.ceil(MIN_SIMILARITY * sum(not gram.startswith('^') for gram in grams)))
+		ranker = self.rank_numpy if numpy is not None else self.rank_python
+		return [self.suggestions[position] for position in ranker(lists, needed, limit)]
+
+	def rank_numpy(self, lists, needed, limit):
+		counts = numpy.bincount(
+			numpy.concatenate([numpy.frombuffer(positions, dtype=numpy.uint32) for positions in lists]),
+			minlength=len(self.suggestions),
+		)
+		positions = numpy.flatnonzero(counts >= needed)
+		best = numpy.lexsort((positions, self.length_array[positions], -counts[positions]))
+		return positions[best[:limit]].tolist()
+
+	def rank_python(self, lists, needed, limit):
+		counts = Counter()
+		for positions in lists:
+			counts.update(positions)
+		levels = defaultdict(list)
+		for position, count in counts.items():
+			if count >= needed:
+				levels[count].append(position)
+		# only the names of the best counts are sorted
+		best = []
+		for count in sorted(levels, reverse=True):
+			best += heapq.nsmallest(
+				limit - len(best), levels[count], key=lambda position: (self.lengths[position], position)
+			)
+			if len(best) >= limit:
+				break
+		return best
+
+
+def build(menu):
+	suggestions = [
+		{'text': item['name'], 'type': 'item', 'id': item['id'], 'slug': item['slug']}
+		for item in menu.products
+	]
+	suggestions += [
+		{'text': category['name'], 'type': 'category', 'id': category['id'], 'slug': None}
+		for category in menu.categories
+	]
+	return Index(menu.version, suggestions)
+
+
+def get_index(place, branch=None):
+	""" The autocomplete `Index` of a restaurant (or branch) menu """
+	branch = menus.menu_branch(branch)
+	key = (place.pk, branch.pk if branch else None)
+	index = indexes.get(key)
+	if index is not None and time.monotonic() - index.checked < REFRESH:
+		return index
+	version = menus.get_version(place, branch)[0]
+	if index is None or index.version != version:
+		index = build(menus.get_menu(place, branch))
+	index.checked = time.monotonic()
+	indexes.set(key, index)
+	return index
+
+
+def suggest(place, branch, query, limit=LIMIT):
+	return get_index(place, branch).suggest(query, max(1, min(limit, MAX_LIMIT)))
@@ -0,0 +1,82 @@
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from places import autocomplete
+from places.menus import Menu
+
+
+DISHES = (
+	'shawarma', 'biryani', 'jollof', 'suya', 'egusi', 'pounded', 'yam', 'plantain', 'moi', 'puff', 'chicken',
+	'beef', 'goat', 'pepper', 'soup', 'rice', 'fried', 'noodles', 'burger', 'pizza', 'wrap', 'salad', 'fish',
+	'prawns', 'ofada', 'stew', 'akara', 'efo', 'riro', 'amala', 'ewedu', 'gizdodo', 'asun', 'nkwobi', 'isi', 'ewu',
+)
+QUERIES = ('shawarmer', 'briyani', 'jol', 'chiken suya', 'pepersoup', 'p', 'gizdod', 'zzzz')
+
+
+def misspell(word, chooser):
+	""" `word` with one letter dropped, doubled or swapped with the next """
+	n = chooser.randrange(len(word) - 1)
+	return chooser.choice((
+		word[:n] + word[n + 1:],
+		word[:n] + word[n] + word[n:],
+		word[:n] + word[n + 1] + word[n] + word[n + 2:],
+	))
+
+
+class Command(BaseCommand):
+	help = "Measure the memory and query time of autocomplete indexes over generated menus, no database involved"
+
+	def add_arguments(self, parser):
+		parser.add_argument('sizes', nargs='*', type=int, default=[1000, 10000])
+		parser.add_argument('-q', '--queries', type=int, default=2000)
+
+	def handle(self, *args, **options):
+		self.stdout.write(f'numpy: {"yes" if autocomplete.numpy is not None else "no"}')
+		for size in options['sizes']:
+			menu = self.generate(size)
+			start = time.perf_counter()
+			autocomplete.build(menu)
+			built = time.perf_counter() - start
+			gc.collect()
+			tracemalloc.start()
+			index = autocomplete.build(menu)
+			memory, _ = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+			self.stdout.write(
+				f'{size:>7} items  built in {built * 1000:.0f} ms  {memory / 1024:,.0f} KB '
+				f'({memory / size:.0f} bytes per item, suggestions included)  {len(index.postings)} trigrams'
+			)
+			for query in QUERIES:
+				found = index.suggest(query)
+				self.stdout.write(f'  {query!r:<14} {", ".join(item["text"] for item in found[:3])}')
+
+			chooser = random.Random(size)
+			queries = [
+				misspell(chooser.choice(DISHES), chooser)[:chooser.randrange(3, 10)]
+				for _ in range(options['queries'])
+			]
+			timings = []
+			for query in queries:
+				start = time.perf_counter()
+				index.suggest(query)
+				timings.append(time.perf_counter() - start)
+			timings.sort()
+			self.stdout.write(
+				f'  {len(queries)} misspelled queries  median {statistics.median(timings) * 1e6:.0f} us  '
+				f'p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us  max {timings[-1] * 1e6:.0f} us'
+			)
+
+	def generate(self, size):
+		chooser = random.Random(size)
+		products = [
+			{
+				'id': n, 'slug': f'item-{n}',
+				'name': ' '.join(word.capitalize() for word in chooser.sample(DISHES, chooser.randrange(2, 5))) + f' {n}',
+			}
+			for n in range(size)
+		]
+		categories = [{'id': n, 'name': dish.capitalize()} for n, dish in enumerate(DISHES)]
+		return Menu(1, None, products, categories, (), {})
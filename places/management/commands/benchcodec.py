@@ -0,0 +1,145 @@
+import gc
+import gzip
+import io
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from places import menus
+from places.api import fastjson
+from places.api.parsers import FastJSONParser, MessagePackParser
+from places.api.prefetch import optimize_queryset
+from places.api.renderers import FastJSONRenderer, MessagePackRenderer
+from places.api.serializers import CartSerializer, OrderSerializer
+from places.models import BuyerCart, Restaurant
+
+
+def order_payload(orders, items):
+	""" Something shaped like `ListOrdersView` output, with the types the encoder has to convert """
+	now = timezone.now()
+	return {
+		'error': False,
+		'count': orders,
+		'results': [
+			{
+				'id': n,
+				'order_id': uuid.uuid4(),
+				'created_on': now - timedelta(minutes=n),
+				'status': 'pending',
+				'subtotal': Decimal('12.50') * items,
+				'customer': {'id': n % 50, 'user': {'first_name': 'Ada', 'last_name': 'Obi', 'email': f'ada{n}@example.com'}},
+				'items': [
+					{
+						'id': n * items + i,
+						'quantity': i % 3 + 1,
+						'total': Decimal('12.50') * (i % 3 + 1),
+						'item': {
+							'id': i, 'name': f'Jollof rice {i}', 'about': 'Smoky party jollof, served with plantain',
+							'slug': f'jollof-rice-{i}', 'price': '12.50', 'tags': [1, 2],
+							'image': {'url': f'http://localhost:8000/files/food/{i}.jpg', 'id': i},
+							'category': 'Rice', 'rating': '4.5',
+						},
+					}
+					for i in range(items)
+				],
+			}
+			for n in range(orders)
+		],
+	}
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare the stock DRF JSON renderer and parser with the fastjson ones, "
+		"then JSON with MessagePack on the menu, cart and orders of a restaurant"
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--place', help="slug of the restaurant, the one with the largest menu by default")
+		parser.add_argument('-o', '--orders', type=int, default=1000)
+		parser.add_argument('-i', '--items', type=int, default=5)
+		parser.add_argument('-r', '--rounds', type=int, default=5)
+
+	def handle(self, *args, **options):
+		data = order_payload(options['orders'], options['items'])
+		rounds = options['rounds']
+		content = JSONRenderer().render(data)
+		parsed = JSONParser().parse(io.BytesIO(content))
+		self.stdout.write(f'{len(content) / 1024:.0f} KB of JSON, fastjson backend: {fastjson.BACKEND}')
+
+		if FastJSONRenderer().render(data) != content:
+			raise CommandError('FastJSONRenderer output differs from JSONRenderer')
+		if FastJSONParser().parse(io.BytesIO(content)) != parsed:
+			raise CommandError('FastJSONParser result differs from JSONParser')
+
+		results = (
+			('render', 'DRF', self.measure(rounds, lambda: JSONRenderer().render(data))),
+			('render', 'fastjson', self.measure(rounds, lambda: FastJSONRenderer().render(data))),
+			('parse', 'DRF', self.measure(rounds, lambda: JSONParser().parse(io.BytesIO(content)))),
+			('parse', 'fastjson', self.measure(rounds, lambda: FastJSONParser().parse(io.BytesIO(content)))),
+		)
+		baseline = {}
+		for action, name, elapsed in results:
+			baseline.setdefault(action, elapsed)
+			self.stdout.write(
+				f'{action:<7} {name:<9} {elapsed * 1000:9.2f} ms  {baseline[action] / elapsed:5.1f}x'
+			)
+
+		payloads = [('generated', data)]
+		place = self.get_place(options['place'])
+		if place is not None:
+			payloads += self.endpoint_payloads(place)
+		self.stdout.write(f'\n{"payload":<10} {"codec":<8} {"bytes":>10} {"gzipped":>10} {"encode":>10} {"decode":>10}')
+		for name, payload in payloads:
+			for codec, renderer, parser in (
+				('json', FastJSONRenderer(), FastJSONParser()),
+				('msgpack', MessagePackRenderer(), MessagePackParser()),
+			):
+				content = renderer.render(payload)
+				encode = self.measure(rounds, lambda: renderer.render(payload))
+				decode = self.measure(rounds, lambda: parser.parse(io.BytesIO(content)))
+				self.stdout.write(
+					f'{name:<10} {codec:<8} {len(content):>10} {len(gzip.compress(content)):>10} '
+					f'{encode * 1000:7.2f} ms {decode * 1000:7.2f} ms'
+				)
+
+	def get_place(self, slug):
+		if slug:
+			return Restaurant.objects.get(slug=slug)
+		return Restaurant.objects.annotate(items=Count('menu')).order_by('-items').first()
+
+	def endpoint_payloads(self, place):
+		""" What `menu_view`, `cart_view` and `ListOrdersView` send for `place` """
+		request = RequestFactory().get('/')
+		menu = menus.get_menu(place)
+		payloads = [('menu', {
+			'error': False,
+			'data': {'products': menus.with_absolute_urls(menu.products, request), 'categories': menu.categories},
+		})]
+		cart = (
+			BuyerCart.objects.filter(restaurant=place)
+			.annotate(size=Count('items')).order_by('-size').first()
+		)
+		if cart is not None:
+			payloads.append(('cart', {'error': False, 'cart': CartSerializer(cart, context={'request': request}).data}))
+		orders = optimize_queryset(place.orders.all(), OrderSerializer).order_by('-id')
+		payloads.append(('orders', {
+			'error': None,
+			'orders': OrderSerializer(orders, many=True, context={'request': request}).data,
+		}))
+		return payloads
+
+	def measure(self, rounds, func):
+		timings = []
+		for _ in range(rounds):
+			gc.collect()
+			start = time.perf_counter()
+			func()
+			timings.append(time.perf_counter() - start)
+		return min(timings)
@@ -0,0 +1,128 @@
+import gc
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from accounts.models import Account, Merchant
+from places.api.prefetch import optimize_queryset
+from places.api.projections import food_items
+from places.api.serializers import FoodSerializer
+from places.models import (
+	Category,
+	CustomOptionChoice,
+	FoodImage,
+	FoodItem,
+	OrderOption,
+	Restaurant,
+	Tag,
+)
+
+
+class Rollback(Exception):
+	pass
+
+
+class Command(BaseCommand):
+	help = "Compare FoodSerializer with the values() projection on generated menus, nothing is kept in the database"
+
+	def add_arguments(self, parser):
+		parser.add_argument('sizes', nargs='*', type=int, default=[1000, 10000])
+		parser.add_argument('-r', '--rounds', type=int, default=3)
+
+	def handle(self, *args, **options):
+		request = RequestFactory().get('/api/places/menu/')
+		try:
+			with transaction.atomic():
+				for size in options['sizes']:
+					place = self.generate(size)
+					self.compare(place.menu.order_by('pk'), request, size, options['rounds'])
+				raise Rollback
+		except Rollback:
+			pass
+
+	def compare(self, items, request, size, rounds):
+		renderer = JSONRenderer()
+		paths = (
+			('serializer', lambda: FoodSerializer(
+				optimize_queryset(items, FoodSerializer), many=True, context={'request': request}
+			).data),
+			('projection', lambda: food_items(items, request)),
+		)
+		results = []
+		for name, read in paths:
+			timings = []
+			for _ in range(rounds):
+				gc.collect()
+				with CaptureQueriesContext(connection) as queries:
+					start = time.perf_counter()
+					data = read()
+					timings.append(time.perf_counter() - start)
+			results.append((name, min(timings), len(queries), renderer.render(data)))
+
+		if results[0][3] != results[1][3]:
+			raise CommandError(f'The projection of {size} items differs from FoodSerializer')
+		baseline = results[0][1]
+		for name, elapsed, queries, content in results:
+			self.stdout.write(
+				f'{size:>6} items  {name:<10}  {elapsed * 1000:9.1f} ms  '
+				f'{queries:>3} queries  {baseline / elapsed:5.1f}x'
+			)
+
+	def generate(self, size):
+		""" A restaurant with `size` items, each with 2 images, 2 tags and an option of 3 choices """
+		suffix = f'{size}-{time.monotonic_ns()}'
+		account = Account.objects.create_user(email=f'bench-{suffix}@example.com', password=None)
+		owner = Merchant.objects.create(user=account, phone=suffix)
+		place = Restaurant.objects.create(name=f'Bench {suffix}', owner=owner, delivery_fulfilment='in-house')
+		# bulk_create() leaves the primary keys unset on SQLite, objects are read back
+		Category.objects.bulk_create(Category(name=f'Bench {suffix} {n}') for n in range(10))
+		categories = list(Category.objects.filter(name__startswith=f'Bench {suffix} '))
+		Tag.objects.bulk_create(Tag(tag=f'bench-{suffix}-{n}') for n in range(20))
+		tags = list(Tag.objects.filter(tag__startswith=f'bench-{suffix}-'))
+
+		FoodItem.objects.bulk_create(
+			FoodItem(
+				name=f'Bench {suffix} item {n}', slug=f'bench-item-{n}', about='Generated by benchmenu',
+				price=Decimal(n % 50) + Decimal('0.99'), category=categories[n % 10], place=place,
+			)
+			for n in range(size)
+		)
+		items = list(FoodItem.objects.filter(place=place).order_by('pk'))
+		place.menu.add(*items)
+
+		FoodImage.objects.bulk_create(
+			FoodImage(item=item, image=f'food/bench-{n}.jpg') for item in items for n in range(2)
+		)
+		images = FoodImage.objects.filter(item__place=place).values_list('item', 'pk')
+		FoodItem.images.through.objects.bulk_create(
+			FoodItem.images.through(fooditem_id=item, foodimage_id=image) for item, image in images
+		)
+		FoodItem.tags.through.objects.bulk_create(
+			FoodItem.tags.through(fooditem_id=item.pk, tag_id=tags[(item.pk + n) % 20].pk)
+			for item in items for n in range(2)
+		)
+
+		OrderOption.objects.bulk_create(
+			OrderOption(food_item=item, name=f'Bench {suffix} option {item.pk}') for item in items
+		)
+		options = list(OrderOption.objects.filter(food_item__place=place))
+		CustomOptionChoice.objects.bulk_create(
+			CustomOptionChoice(
+				customization=option, name=f'Bench {suffix} choice {option.pk}-{n}',
+				price=Decimal(n) if n else None,
+			)
+			for option in options for n in range(3)
+		)
+		choices = CustomOptionChoice.objects.filter(customization__in=options).values_list('customization', 'pk')
+		OrderOption.choices.through.objects.bulk_create(
+			OrderOption.choices.through(orderoption_id=option, customoptionchoice_id=choice)
+			for option, choice in choices
+		)
+		FoodItem.custom_choices.through.objects.bulk_create(
+			FoodItem.custom_choices.through(fooditem_id=option.food_item_id, orderoption_id=option.pk)
+			for option in options
+		)
+		return place
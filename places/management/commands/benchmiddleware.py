@@ -0,0 +1,74 @@
+import gc
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import RequestFactory
+from django.urls import re_path
+from hotspot.handlers import ProfileHandler
+
+
+def ping_view(request, *args, **kwargs):
+	return JsonResponse({'error': False})
+
+
+# every benchmark request is resolved against this module so that only
+# the middleware (and not a real view) is measured
+urlpatterns = [
+	re_path(r'', ping_view),
+]
+
+
+class Command(BaseCommand):
+	help = "Measure the per request overhead of each middleware profile"
+
+	def add_arguments(self, parser):
+		parser.add_argument('-n', '--requests', type=int, default=2000)
+		parser.add_argument('-r', '--rounds', type=int, default=5)
+
+	def handle(self, *args, **options):
+		count = options['requests']
+		factory = RequestFactory()
+		profiles = [('(default)', '/', settings.MIDDLEWARE)]
+		for prefix, middleware in getattr(settings, 'MIDDLEWARE_PROFILES', ()):
+			profiles.append((prefix, prefix, middleware))
+
+		handlers = []
+		for name, path, middleware in profiles:
+			handler = ProfileHandler(middleware)
+			handler.load_middleware()
+			# warm up lazy imports, the host map etc
+			handler.get_response(self.build_requests(factory, path, 1)[0])
+			handlers.append((name, path, handler, []))
+
+		# rounds are interleaved so that cpu frequency changes
+		# affect every profile alike
+		for _ in range(options['rounds']):
+			for name, path, handler, timings in handlers:
+				requests = self.build_requests(factory, path, count)
+				gc.collect()
+				gc.disable()
+				start = time.perf_counter()
+				for request in requests:
+					handler.get_response(request)
+				timings.append(time.perf_counter() - start)
+				gc.enable()
+
+		baseline = None
+		for name, path, handler, timings in handlers:
+			per_request = min(timings) / count * 1e6
+			if baseline is None:
+				baseline = per_request
+			self.stdout.write(
+				f'{name:<16} {len(handler.middleware):>2} middleware  '
+				f'{per_request:8.1f} us/request  '
+				f'{baseline - per_request:+8.1f} us saved'
+			)
+
+	def build_requests(self, factory, path, count):
+		requests = []
+		for _ in range(count):
+			request = factory.get(path)
+			request.urlconf = __name__
+			requests.append(request)
+		return requests
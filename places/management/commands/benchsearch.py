@@ -0,0 +1,105 @@
+import gc
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from accounts.models import Account, Merchant
+from places import search
+from places.models import Category, FoodItem, Restaurant, Tag
+
+
+DISHES = ('jollof', 'fried', 'rice', 'chicken', 'suya', 'beef', 'pepper', 'soup', 'egusi', 'yam', 'plantain', 'moi', 'puff', 'fish', 'goat', 'stew')
+WORDS = (
+	'smoky', 'grilled', 'spicy', 'served', 'with', 'fresh', 'party', 'sauce', 'crispy', 'sweet', 'onions',
+	'home', 'style', 'tomatoes', 'peppers', 'garlic', 'ginger', 'lime', 'coconut', 'palm', 'oil', 'slow',
+	'cooked', 'roasted', 'steamed', 'local', 'spices', 'herbs', 'side', 'salad', 'bread', 'dip',
+)
+LIMIT = 20
+QUERIES = ('jollof', 'chick', 'spicy rice', 'goat pepper soup', 'zzz')
+
+
+class Rollback(Exception):
+	pass
+
+
+class Command(BaseCommand):
+	help = "Compare the icontains search with the FTS5 index on generated menus, nothing is kept in the database"
+
+	def add_arguments(self, parser):
+		parser.add_argument('sizes', nargs='*', type=int, default=[1000, 10000, 100000])
+		parser.add_argument('-r', '--rounds', type=int, default=5)
+
+	def handle(self, *args, **options):
+		if not search.available():
+			raise CommandError('The FTS5 table is missing, migrate on SQLite with FTS5 first')
+		try:
+			with transaction.atomic():
+				for size in options['sizes']:
+					self.generate(size)
+					self.compare(size, options['rounds'])
+				raise Rollback
+		except Rollback:
+			pass
+
+	def compare(self, size, rounds):
+		total = FoodItem.objects.count()
+		self.stdout.write(f'{total} items, {size} generated')
+		for query in QUERIES:
+			icontains = FoodItem.objects.filter(name__icontains=query).order_by('pk').values_list('pk', flat=True)
+			paths = (
+				('icontains', lambda: list(icontains.all())),
+				('fts5', lambda: search.ranked(query)),
+				(f'icontains[:{LIMIT}]', lambda: list(icontains[:LIMIT])),
+				(f'fts5[:{LIMIT}]', lambda: search.ranked(query, limit=LIMIT)),
+			)
+			results = []
+			for name, run in paths:
+				timings = []
+				for _ in range(rounds):
+					gc.collect()
+					start = time.perf_counter()
+					found = run()
+					timings.append(time.perf_counter() - start)
+				results.append((name, min(timings), len(found)))
+			for n, (name, elapsed, found) in enumerate(results):
+				# each path against the icontains one returning as many rows
+				baseline = results[n - n % 2][1]
+				self.stdout.write(
+					f'  {query!r:<20} {name:<14} {elapsed * 1000:9.2f} ms  {found:>7} matches  {baseline / elapsed:6.1f}x'
+				)
+
+	def generate(self, size):
+		""" A restaurant with `size` items named from a few dish words, indexed like `places.signals` would """
+		suffix = f'{size}-{time.monotonic_ns()}'
+		account = Account.objects.create_user(email=f'bench-{suffix}@example.com', password=None)
+		owner = Merchant.objects.create(user=account, phone=suffix)
+		place = Restaurant.objects.create(name=f'Bench {suffix}', owner=owner, delivery_fulfilment='in-house')
+		# bulk_create() leaves the primary keys unset on SQLite, objects are read back
+		Category.objects.bulk_create(Category(name=f'Bench {suffix} {dish}') for dish in DISHES)
+		categories = list(Category.objects.filter(name__startswith=f'Bench {suffix} '))
+		Tag.objects.bulk_create(Tag(tag=f'{word}-{suffix}') for word in WORDS)
+		tags = list(Tag.objects.filter(tag__endswith=f'-{suffix}'))
+
+		chooser = random.Random(size)
+		FoodItem.objects.bulk_create(
+			(
+				FoodItem(
+					name=f'{" ".join(chooser.sample(DISHES, 3))} {suffix} {n}',
+					about=' '.join(chooser.choices(WORDS, k=8) + [chooser.choice(DISHES)]),
+					price=Decimal(n % 50) + Decimal('0.99'), category=chooser.choice(categories), place=place,
+				)
+				for n in range(size)
+			),
+			batch_size=1000,
+		)
+		pks = list(FoodItem.objects.filter(place=place).values_list('pk', flat=True))
+		FoodItem.tags.through.objects.bulk_create(
+			(
+				FoodItem.tags.through(fooditem_id=pk, tag_id=chooser.choice(tags).pk)
+				for pk in pks
+			),
+			batch_size=1000,
+		)
+		search.index_items(pks)
+		return place
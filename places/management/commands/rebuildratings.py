@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from places.ratings import rebuild
+
+
+class Command(BaseCommand):
+	help = "Recompute the stored rating counts of every food item and restaurant from their reviews, run after migrating"
+
+	def handle(self, *args, **options):
+		items, places = rebuild()
+		self.stdout.write(f'Rebuilt ratings of {items} food items and {places} restaurants')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from places.related import rebuild
+
+
+class Command(BaseCommand):
+	help = "Rescore the related items of every menu item, run after migrating or changing RELATED_ITEMS"
+
+	def handle(self, *args, **options):
+		items = rebuild()
+		self.stdout.write(f'Rebuilt related items of {items} food items')
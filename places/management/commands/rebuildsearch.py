@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from places.search import rebuild
+
+
+class Command(BaseCommand):
+	help = "Index every food item for full-text search again, run after bulk changes to the menus"
+
+	def handle(self, *args, **options):
+		items = rebuild()
+		self.stdout.write(f'Indexed {items} food items')
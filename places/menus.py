@@ -0,0 +1,187 @@
+"""
+	Precomputed menus.
+
+	The serialized menu of every restaurant, and of every branch that keeps
+	its own menu, is stored in a `MenuSnapshot` whose version goes up each
+	time it is rebuilt. Changes to menu items and what hangs off them
+	schedule a rebuild of the restaurant's snapshots once the transaction
+	commits, which runs after the response has been sent (see
+	`places.signals` and `places.utils.background`).
+
+	`get_menu()` serves the parsed snapshot from memory for as long as its
+	version in the database stays the same. The snapshot also lists the
+	featured items, `featured_items()` samples them without a query.
+"""
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from metrics.models import Review
+from .api import fastjson
+from .api.projections import food_items
+from .api.serializers import CategorySerializer
+from .models import (
+	Category,
+	CustomOptionChoice,
+	FoodImage,
+	FoodItem,
+	MenuSnapshot,
+	OrderOption,
+	Restaurant,
+	RestaurantBranch,
+)
+from .tenants import TenantCache
+from .utils.background import defer
+
+
+Menu = namedtuple('Menu', ('version', 'updated', 'products', 'categories', 'featured', 'by_id'))
+
+# bumped when the payload changes shape, older snapshots are rebuilt when loaded
+FORMAT = 2
+
+_options = getattr(settings, 'MENU_SNAPSHOTS', {})
+loaded = TenantCache(max_size=_options.get('CACHE_SIZE', 128), ttl=_options.get('CACHE_TTL', 3600))
+FEATURED_COUNT = _options.get('FEATURED_COUNT', 10)
+FEATURED_ROTATION = _options.get('FEATURED_ROTATION', 300)
+
+
+def menu_items(place, branch=None):
+	items = place.menu.all() if branch is None else branch.menu.all()
+	return items.order_by('pk')
+
+
+def build(place, branch=None):
+	""" Serialize the menu and store it as the next version of the snapshot """
+	items = menu_items(place, branch)
+	payload = fastjson.dumps({
+		'format': FORMAT,
+		'products': food_items(items),
+		'categories': CategorySerializer(place.categories.all(), many=True).data,
+		'featured': list(items.filter(featured=True).values_list('pk', flat=True)),
+	}).decode()
+	# single statement writes, on SQLite a transaction that reads before
+	# it writes fails with "database is locked" next to other writers
+	snapshots = MenuSnapshot.objects.filter(place=place, branch=branch)
+	updated = snapshots.update(payload=payload, version=F('version') + 1, date_created=timezone.now())
+	if not updated:
+		try:
+			MenuSnapshot.objects.create(place=place, branch=branch, payload=payload, version=1)
+		except IntegrityError:
+			# built at the same time by another worker
+			snapshots.update(payload=payload, version=F('version') + 1, date_created=timezone.now())
+
+
+def rebuild(place_pk):
+	""" Rebuild the snapshots of a restaurant and of its branches with their own menu """
+	place = Restaurant.objects.filter(pk=place_pk).first()
+	if place is None:
+		return
+	build(place)
+	for branch in place.branches.filter(inherit_menu=False):
+		build(place, branch)
+
+
+def schedule_rebuild(place_pk):
+	transaction.on_commit(lambda: defer(('menu', place_pk), rebuild, place_pk))
+
+
+def menu_branch(branch):
+	# branches inheriting the menu are served the restaurant's snapshot
+	if branch is not None and branch.inherit_menu:
+		return None
+	return branch
+
+
+def get_version(place, branch=None):
+	""" `(version, updated)` of the menu snapshot, built right away if missing """
+	branch = menu_branch(branch)
+	snapshots = MenuSnapshot.objects.filter(place=place, branch=branch)
+	current = snapshots.values_list('version', 'date_created').first()
+	if current is None:
+		build(place, branch)
+		current = snapshots.values_list('version', 'date_created').get()
+	return current
+
+
+def get_menu(place, branch=None):
+	""" The current `Menu` of a restaurant (or branch) """
+	branch = menu_branch(branch)
+	snapshots = MenuSnapshot.objects.filter(place=place, branch=branch)
+	current = get_version(place, branch)
+
+	key = (place.pk, branch.pk if branch else None)
+	menu = loaded.get(key)
+	if menu is None or menu.version != current[0]:
+		version, updated, payload = snapshots.values_list('version', 'date_created', 'payload').get()
+		data = fastjson.loads(payload)
+		if data.get('format') != FORMAT:
+			build(place, branch)
+			return get_menu(place, branch)
+		products = data['products']
+		menu = Menu(
+			version, updated, products, data['categories'],
+			tuple(data['featured']), {item['id']: item for item in products},
+		)
+		loaded.set(key, menu)
+	return menu
+
+
+def featured_window(now=None):
+	""" Number of the current `FEATURED_ROTATION` period and when it started """
+	now = time.time() if now is None else now
+	window = int(now // FEATURED_ROTATION)
+	return window, datetime.fromtimestamp(window * FEATURED_ROTATION, dt_timezone.utc)
+
+
+def featured_items(menu, count=FEATURED_COUNT):
+	"""
+		A sample of the featured products of `menu`.
+
+		The sample only changes with the menu version and every
+		`FEATURED_ROTATION` seconds, every worker picks the same one so
+		that the menu stays cacheable (see `places.api.conditional`).
+	"""
+	window, _ = featured_window()
+	sample = random.Random(f'{menu.version}:{window}').sample(menu.featured, min(count, len(menu.featured)))
+	return [menu.by_id[pk] for pk in sample]
+
+
+def with_absolute_urls(products, request):
+	""" Copies of snapshot products with absolute image urls, like `FoodImageSerializer` gives """
+	def image(data):
+		return dict(data, url=request.build_absolute_uri(data['url']))
+
+	return [
+		dict(
+			item,
+			image=image(item['image']) if item['image'] else None,
+			images=[image(data) for data in item['images']],
+		)
+		for item in products
+	]
+
+
+def places_of(instance):
+	""" Primary keys of the restaurants whose menu shows `instance` """
+	if isinstance(instance, Restaurant):
+		return {instance.pk}
+	if isinstance(instance, (Review, RestaurantBranch)):
+		return {instance.place_id_id}
+	if isinstance(instance, FoodItem):
+		return {instance.place_id}
+	if isinstance(instance, FoodImage):
+		items = Q(pk=instance.item_id) | Q(images=instance)
+	elif isinstance(instance, OrderOption):
+		items = Q(pk=instance.food_item_id) | Q(custom_choices=instance)
+	elif isinstance(instance, CustomOptionChoice):
+		items = Q(orderoption=instance.customization_id) | Q(custom_choices__choices=instance)
+	elif isinstance(instance, Category):
+		places = set(Restaurant.objects.filter(categories=instance).values_list('pk', flat=True))
+		return places | set(FoodItem.objects.filter(category=instance).values_list('place_id', flat=True))
+	else:
+		return set()
+	return set(FoodItem.objects.filter(items).values_list('place_id', flat=True))
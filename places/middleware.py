@@ -1,32 +1,24 @@
 from django.utils.deprecation import MiddlewareMixin
-from .models import Restaurant
-import logging
+from metrics.tracing import span
+from . import tenants
 
 
-logger = logging.Logger('EventLog')
-
 class PlacesMiddleware(MiddlewareMixin):
 
 	def process_request(self, request, **kwargs):
-		placeId = request.GET.get('place', None)
-		branchId = request.GET.get('branch', None)
-		if placeId:
-			request.place = Restaurant.objects.get(slug=placeId)
-			if branchId:
-				request.branch = request.place.branches.get(branch_id=branchId)
+		with span('PlacesMiddleware'):
+			placeId = request.GET.get('place', None)
+			branchId = request.GET.get('branch', None)
+			# storefronts are resolved from their own domain,
+			# everything else falls back to the `place` param
+			place = tenants.get_place_for_host(request.get_host())
+			if not place and placeId:
+				place = tenants.get_place(placeId)
+			if place:
+				request.place = place
+				if branchId:
+					request.branch = tenants.get_branch(request.place, branchId)
+				else:
+					request.branch = None
 			else:
-				request.branch = None
-		else:
-			request.place = None
-
-class VerboseLogMiddleware(MiddlewareMixin):
-
-	def process_request(self, request, **kwargs):
-		if request.method == 'POST':
-			logger.info("")
-		elif request.method == 'DELETE':
-			logger.info("")
-		else:
-			logger.info("")
-
-
+				request.place = None
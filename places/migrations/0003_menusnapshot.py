@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 10:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0002_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now=True, null=True)),
+                ('last_modified', models.DateTimeField(auto_now_add=True, null=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('payload', models.TextField(default='{}')),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='places.restaurantbranch')),
+                ('place', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='menu_snapshots', to='places.restaurant')),
+            ],
+            options={
+                'unique_together': {('place', 'branch')},
+            },
+        ),
+    ]
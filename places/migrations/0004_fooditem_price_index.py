@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0003_menusnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['price', 'id'], name='places_food_price_082494_idx'),
+        ),
+    ]
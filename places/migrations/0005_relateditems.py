@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 11:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0004_fooditem_price_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedItems',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now=True, null=True)),
+                ('last_modified', models.DateTimeField(auto_now_add=True, null=True)),
+                ('related', models.TextField(default='[]')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_index', to='places.fooditem')),
+                ('place', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_items', to='places.restaurant')),
+            ],
+            options={
+                'verbose_name_plural': 'Related items',
+                'unique_together': {('place', 'item')},
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2 on 2026-10-18 13:10
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+TABLE = 'places_fooditem_search'
+
+
+def create_search_table(apps, schema_editor):
+    # SQLite only, see places.search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            "name, about, category, tags, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except OperationalError:
+        # built without FTS5
+        return
+
+    FoodItem = apps.get_model('places', 'FoodItem')
+    tags = {}
+    for pk, tag in FoodItem.tags.through.objects.values_list('fooditem_id', 'tag__tag'):
+        tags.setdefault(pk, []).append(tag)
+    rows = [
+        (pk, name, about or '', category or '', ' '.join(tags.get(pk, ())))
+        for pk, name, about, category in FoodItem.objects.values_list('pk', 'name', 'about', 'category__name')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, about, category, tags) VALUES (%s, %s, %s, %s, %s)', rows
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0005_relateditems'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
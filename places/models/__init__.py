@@ -10,3 +10,4 @@ from rest_framework.authtoken.models import Token
 from decimal import Decimal
 from .orders import *
 from .places import *
+from .snapshots import *
@@ -4,7 +4,7 @@ from django.contrib.auth.models import User, Permission
 from ..utils.helpers import (
 	generate_staff_id,
 	generate_invoice_id,
-	get_average_rating,
+	format_rating,
 	slugify,
 	parse_image_url,
 )
@@ -54,7 +54,43 @@ class NotificationMessage(DbModel):
 		abstract = False
 
 
-class FoodItem(DbModel):
+class RatedModel(models.Model):
+	"""
+		Review counts kept on the row, see `places.ratings`. They are only
+		written through F() expressions so `save()` leaves them alone.
+	"""
+	RATING_FIELDS = (
+		'rating_count', 'rating_sum',
+		'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+	)
+	rating_count = models.IntegerField(default=0, editable=False)
+	rating_sum = models.IntegerField(default=0, editable=False)
+	rating_1 = models.IntegerField(default=0, editable=False)
+	rating_2 = models.IntegerField(default=0, editable=False)
+	rating_3 = models.IntegerField(default=0, editable=False)
+	rating_4 = models.IntegerField(default=0, editable=False)
+	rating_5 = models.IntegerField(default=0, editable=False)
+
+	class Meta:
+		abstract = True
+
+	def rating(self):
+		return format_rating(self.rating_sum, self.rating_count)
+
+	def rating_histogram(self):
+		return [getattr(self, f'rating_{stars}') for stars in range(1, 6)]
+
+	def save(self, *args, **kwargs):
+		# a stale instance must not overwrite counts updated since it was loaded
+		if not args and not self._state.adding and kwargs.get('update_fields') is None:
+			kwargs['update_fields'] = [
+				field.name for field in self._meta.concrete_fields
+				if not field.primary_key and field.name not in self.RATING_FIELDS
+			]
+		super().save(*args, **kwargs)
+
+
+class FoodItem(DbModel, RatedModel):
 	name = models.CharField(max_length=150, unique=True)
 	slug = models.SlugField(blank=True, null=True)
 	is_package_item = models.BooleanField(default=False)
@@ -70,16 +106,15 @@ class FoodItem(DbModel):
 	place = models.ForeignKey("Restaurant", on_delete=models.CASCADE)
 	prep_time = models.DurationField(blank=True, null=True)
 
+	class Meta:
+		# keyset pagination of search results by price
+		indexes = [models.Index(fields=['price', 'id'])]
+
 	# metrics and analytics field
 	@property
 	def metrics(self):
 		pass
 
-	def rating(self):
-		reviews = self.reviews.all()
-		rate = get_average_rating(reviews)
-		return rate
-
 	def __str__(self):
 		return self.name
 
@@ -148,7 +183,7 @@ class CustomOptionChoice(DbModel):
 		return self.name
 
 
-class Restaurant(DbModel):
+class Restaurant(DbModel, RatedModel):
 	STORE_MODES = (
 		('live', 'Live Mode'),
 		('test', 'Test Mode'),
@@ -0,0 +1,32 @@
+from django.db import models
+from accounts.models import DbModel
+
+
+class MenuSnapshot(DbModel):
+	# The serialized menu of a restaurant, or of one of its branches, as
+	# served by `menu_view`. Built by `places.menus`
+	place = models.ForeignKey("Restaurant", on_delete=models.CASCADE, related_name='menu_snapshots')
+	branch = models.ForeignKey("RestaurantBranch", blank=True, null=True, on_delete=models.CASCADE)
+	version = models.PositiveIntegerField(default=0)
+	payload = models.TextField(default='{}')
+
+	class Meta:
+		unique_together = ('place', 'branch')
+
+	def __str__(self):
+		return f'{self.place_id}/{self.branch_id or "-"} v{self.version}'
+
+
+class RelatedItems(DbModel):
+	# The ids of the items on a restaurant's menu most related to `item`,
+	# best first, as a JSON list. Built by `places.related`
+	place = models.ForeignKey("Restaurant", on_delete=models.CASCADE, related_name='related_items')
+	item = models.ForeignKey("FoodItem", on_delete=models.CASCADE, related_name='related_index')
+	related = models.TextField(default='[]')
+
+	class Meta:
+		unique_together = ('place', 'item')
+		verbose_name_plural = 'Related items'
+
+	def __str__(self):
+		return f'{self.place_id}/{self.item_id}'
@@ -0,0 +1,69 @@
+"""
+	Rating aggregates of food items and restaurants.
+
+	Every `metrics.Review` with a 1-5 star rating is counted on the food
+	items it is attached to (`FoodItem.reviews`) and on its restaurant
+	(`Review.place_id`). The counts are adjusted with F() expressions as
+	reviews change, see `places.signals`, and `rebuild()` recomputes them
+	from scratch (`manage.py rebuildratings`).
+"""
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from metrics.models import Review
+from .models import FoodItem, Restaurant
+from .models.places import RatedModel
+
+
+STARS = range(1, 6)
+
+
+def rating_updates(ratings, sign=1):
+	""" `update()` kwargs adding (or with `sign=-1` removing) `ratings` """
+	stars = Counter(rating for rating in ratings if rating in STARS)
+	count = sum(stars.values())
+	if not count:
+		return {}
+	updates = {
+		'rating_count': F('rating_count') + sign * count,
+		'rating_sum': F('rating_sum') + sign * sum(rating * n for rating, n in stars.items()),
+	}
+	for rating, n in stars.items():
+		updates[f'rating_{rating}'] = F(f'rating_{rating}') + sign * n
+	return updates
+
+
+def add_ratings(queryset, ratings, sign=1):
+	updates = rating_updates(ratings, sign)
+	if updates:
+		queryset.update(**updates)
+
+
+def remove_ratings(queryset, ratings):
+	add_ratings(queryset, ratings, sign=-1)
+
+
+def aggregate_by(reviews, key):
+	""" `{key value: {field: value}}` of the ratings in `reviews` """
+	rows = reviews.filter(rating__in=STARS).values(key).annotate(
+		rating_count=Count('pk'),
+		rating_sum=Sum('rating'),
+		**{f'rating_{stars}': Count('pk', filter=Q(rating=stars)) for stars in STARS}
+	)
+	return {row.pop(key): row for row in rows if row[key] is not None}
+
+
+def rebuild_model(model, totals, batch_size=500):
+	model.objects.update(**{field: 0 for field in RatedModel.RATING_FIELDS})
+	objects = [model(pk=pk, **values) for pk, values in totals.items()]
+	model.objects.bulk_update(objects, RatedModel.RATING_FIELDS, batch_size=batch_size)
+	return len(objects)
+
+
+def rebuild():
+	""" Recompute every aggregate, returns the number of rated food items and restaurants """
+	reviews = Review.objects.all()
+	with transaction.atomic():
+		items = rebuild_model(FoodItem, aggregate_by(reviews, 'reviews'))
+		places = rebuild_model(Restaurant, aggregate_by(reviews, 'place_id'))
+	return items, places
@@ -0,0 +1,242 @@
+"""
+	Feed recommendations.
+
+	Every item on a restaurant's menu is scored for a customer in one pass
+	over arrays of the whole catalogue:
+
+		TAG_WEIGHT * tag affinity + PLACE_TAG_WEIGHT * restaurant tag affinity
+		+ FOLLOW_BOOST * followed + FEATURED_BOOST * featured
+		+ POPULARITY_WEIGHT * popularity
+
+	Affinities add up the customer's liked tags an item, or its restaurant,
+	carries, each weighted by how often it was liked relative to the most
+	liked one (see `Customer.get_liked_tags()`). Popularity is the average
+	rating, pulled towards 3 stars while an item has few reviews, from 0 to 1.
+
+	The index from tags to items is built from the menu snapshots (see
+	`places.menus`) and kept per worker, one `Shelf` of postings per
+	restaurant. Each feed compares the snapshot versions with the indexed
+	ones in one query and only re-reads and re-indexes the menus that
+	changed, the shelves are then lined up again for one pass over all of
+	them. The ranking runs on NumPy when it is installed.
+"""
+import threading
+from collections import defaultdict
+from itertools import chain
+from django.conf import settings
+from .api.projections import chunks
+from .models import FoodItem, Restaurant
+from . import menus
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+_options = getattr(settings, 'RECOMMENDATIONS', {})
+TAG_WEIGHT = _options.get('TAG_WEIGHT', 1.0)
+PLACE_TAG_WEIGHT = _options.get('PLACE_TAG_WEIGHT', 0.5)
+FOLLOW_BOOST = _options.get('FOLLOW_BOOST', 1.0)
+FEATURED_BOOST = _options.get('FEATURED_BOOST', 0.5)
+POPULARITY_WEIGHT = _options.get('POPULARITY_WEIGHT', 0.5)
+FEED_SIZE = _options.get('FEED_SIZE', 200)
+
+# reviews an item needs before its own average counts as much as the prior
+RATING_PRIOR = 5
+
+
+def popularity(rating_sum, rating_count):
+	average = (rating_sum + 3 * RATING_PRIOR) / (rating_count + RATING_PRIOR)
+	return (average - 1) / 4
+
+
+class Shelf:
+	""" The indexed items of one restaurant's menu, postings are positions on the shelf """
+
+	def __init__(self, menu, ratings):
+		self.version = menu.version
+		self.products = menu.products
+		self.item_pks = [item['id'] for item in self.products]
+		featured = set(menu.featured)
+		self.featured = [pk in featured for pk in self.item_pks]
+		self.popularity = [popularity(*ratings.get(pk, (0, 0))) for pk in self.item_pks]
+		postings = defaultdict(list)
+		for entry, item in enumerate(self.products):
+			for tag in item['tags']:
+				postings[tag].append(entry)
+		self.postings = dict(postings)
+		if numpy is not None:
+			self.base = POPULARITY_WEIGHT * numpy.array(self.popularity) + FEATURED_BOOST * numpy.array(self.featured)
+			self.postings = {tag: numpy.array(entries) for tag, entries in self.postings.items()}
+
+	def __len__(self):
+		return len(self.products)
+
+
+class Catalogue:
+	"""
+		The shelves of every restaurant side by side, one entry per item and
+		menu listing it. `tagged` maps tag pks to the restaurants whose shelf
+		holds them.
+	"""
+
+	def __init__(self, shelves, tagged):
+		self.places = list(shelves)
+		self.shelves = shelves
+		self.tagged = tagged
+		self.offsets = {}
+		offset = 0
+		for place, shelf in shelves.items():
+			self.offsets[place] = offset
+			offset += len(shelf)
+		self.positions = {place: position for position, place in enumerate(self.places)}
+		self.products = list(chain.from_iterable(shelf.products for shelf in shelves.values()))
+		self.item_pks = list(chain.from_iterable(shelf.item_pks for shelf in shelves.values()))
+		if numpy is None:
+			self.popularity = list(chain.from_iterable(shelf.popularity for shelf in shelves.values()))
+			self.featured = list(chain.from_iterable(shelf.featured for shelf in shelves.values()))
+		elif self.products:
+			self.item_pks = numpy.array(self.item_pks, dtype=numpy.int64)
+			self.base = numpy.concatenate([shelf.base for shelf in shelves.values()])
+			self.place_positions = numpy.repeat(
+				numpy.arange(len(shelves)), [len(shelf) for shelf in shelves.values()]
+			)
+
+	def postings(self, tag):
+		""" `(offset, entries)` of the shelves holding `tag` """
+		for place in self.tagged.get(tag, ()):
+			yield self.offsets[place], self.shelves[place].postings[tag]
+
+	def rank(self, tags, place_tags, follows, limit=FEED_SIZE):
+		"""
+			Products best first for the liked `tags` (`{tag pk: weight}`),
+			restaurant weights `place_tags` and followed restaurants `follows`.
+			Without anything to go on every item is a candidate.
+		"""
+		if not self.products:
+			return []
+		place_boost = [
+			FOLLOW_BOOST * (place in follows) + PLACE_TAG_WEIGHT * place_tags.get(place, 0)
+			for place in self.places
+		]
+		ranker = self.rank_numpy if numpy is not None else self.rank_python
+		results, seen = [], set()
+		for entry in ranker(tags, place_boost):
+			# items listed by several menus are recommended once
+			pk = self.products[entry]['id']
+			if pk not in seen:
+				seen.add(pk)
+				results.append(self.products[entry])
+				if len(results) == limit:
+					break
+		return results
+
+	def rank_numpy(self, tags, place_boost):
+		place_boost = numpy.array(place_boost)
+		scores = self.base + place_boost[self.place_positions]
+		candidates = place_boost[self.place_positions] > 0
+		for tag, weight in tags.items():
+			for offset, entries in self.postings(tag):
+				scores[entries + offset] += TAG_WEIGHT * weight
+				candidates[entries + offset] = True
+		entries = numpy.flatnonzero(candidates) if candidates.any() else numpy.arange(len(scores))
+		# best score first, lowest item pk first on ties
+		return entries[numpy.lexsort((self.item_pks[entries], -scores[entries]))]
+
+	def rank_python(self, tags, place_boost):
+		scores = {}
+		for position, place in enumerate(self.places):
+			if place_boost[position] > 0:
+				offset = self.offsets[place]
+				scores.update(dict.fromkeys(range(offset, offset + len(self.shelves[place])), place_boost[position]))
+		for tag, weight in tags.items():
+			for place in self.tagged.get(tag, ()):
+				offset, boost = self.offsets[place], place_boost[self.positions[place]]
+				for entry in self.shelves[place].postings[tag]:
+					scores[offset + entry] = scores.get(offset + entry, boost) + TAG_WEIGHT * weight
+		if not scores:
+			scores = dict.fromkeys(range(len(self.products)), 0)
+		for entry in scores:
+			scores[entry] += POPULARITY_WEIGHT * self.popularity[entry] + FEATURED_BOOST * self.featured[entry]
+		return sorted(scores, key=lambda entry: (-scores[entry], self.item_pks[entry]))
+
+
+class FeedIndex:
+	""" A `Catalogue` kept in step with the menu snapshots, one `Shelf` per restaurant """
+
+	def __init__(self):
+		self.shelves = {}
+		self.tagged = {}
+		self.catalogue = Catalogue({}, {})
+		self.lock = threading.Lock()
+
+	def ratings(self, menus_by_place):
+		pks = list({item['id'] for menu in menus_by_place.values() for item in menu.products})
+		ratings = {}
+		for chunk in chunks(pks):
+			for pk, rating_sum, rating_count in FoodItem.objects.filter(pk__in=chunk).values_list(
+				'pk', 'rating_sum', 'rating_count'
+			):
+				ratings[pk] = (rating_sum, rating_count)
+		return ratings
+
+	def place(self, tagged, pk, shelf):
+		""" Put `shelf` up for restaurant `pk`, or take its shelf down when None """
+		previous = self.shelves.pop(pk, None)
+		for tag in previous.postings if previous is not None else ():
+			tagged[tag] = tagged[tag] - {pk}
+			if not tagged[tag]:
+				del tagged[tag]
+		if shelf is not None:
+			self.shelves[pk] = shelf
+			for tag in shelf.postings:
+				tagged[tag] = tagged.get(tag, frozenset()) | {pk}
+
+	def refresh(self):
+		""" Re-read the menus that changed since the last call, returns the current `Catalogue` """
+		# `menu_snapshots__branch=None` also keeps restaurants without a snapshot yet
+		current = dict(
+			Restaurant.objects.filter(menu_snapshots__branch=None)
+			.values_list('pk', 'menu_snapshots__version')
+		)
+		with self.lock:
+			stale = [
+				pk for pk, version in current.items()
+				if version is None or pk not in self.shelves or self.shelves[pk].version != version
+			]
+			removed = set(self.shelves) - set(current)
+			if not stale and not removed:
+				return self.catalogue
+
+			changed = {place.pk: menus.get_menu(place) for place in Restaurant.objects.filter(pk__in=stale)}
+			# ratings change with the menu version, reviews rebuild the snapshot
+			ratings = self.ratings(changed)
+			# catalogues being ranked keep their own `tagged`
+			tagged = dict(self.tagged)
+			for pk in removed:
+				self.place(tagged, pk, None)
+			for pk, menu in changed.items():
+				self.place(tagged, pk, Shelf(menu, ratings))
+			self.tagged = tagged
+			self.catalogue = Catalogue(dict(sorted(self.shelves.items())), tagged)
+			return self.catalogue
+
+
+index = FeedIndex()
+
+
+def feed(customer=None, limit=FEED_SIZE):
+	""" The products recommended to `customer`, best first, the best rated to anonymous users """
+	if customer is None:
+		return index.refresh().rank({}, {}, set(), limit)
+	liked = dict(customer.get_liked_tags().values_list('pk', 'likes'))
+	most = max(liked.values(), default=1)
+	tags = {tag: likes / most for tag, likes in liked.items()}
+
+	place_tags = defaultdict(float)
+	tagged = Restaurant.tags.through.objects.filter(tag__in=list(tags)).values_list('restaurant_id', 'tag_id')
+	for place, tag in tagged:
+		place_tags[place] += tags[tag]
+	follows = set(customer.get_follows().values_list('pk', flat=True))
+	return index.refresh().rank(tags, place_tags, follows, limit)
@@ -0,0 +1,216 @@
+"""
+	Related items index.
+
+	Every item on a restaurant's menu is scored against the others by what
+	they share: the category, tags and the less common words of their
+	names. The ids of the best `RELATED_ITEMS['COUNT']` are stored in a
+	`RelatedItems` row per item, read by `item_detail_view` in one lookup.
+
+	When items change, see `places.signals`, only the items that can rank
+	differently are rescored: the changed items, the items sharing a
+	category, tag or word with them, the items listing them and the items
+	with a word close to being counted as common. Scores are
+	computed in batches through an inverted index, with NumPy when it is
+	installed.
+"""
+import re
+import threading
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from .api import fastjson
+from .models import FoodItem, RelatedItems, Restaurant
+from .utils.background import defer
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+_options = getattr(settings, 'RELATED_ITEMS', {})
+COUNT = _options.get('COUNT', 10)
+BATCH_SIZE = _options.get('BATCH_SIZE', 256)
+
+CATEGORY_WEIGHT = 3
+TAG_WEIGHT = 2
+WORD_WEIGHT = 1
+# words found in more than this share of the menu tell items apart poorly
+COMMON_WORDS = 0.5
+
+_pending = defaultdict(set)
+_lock = threading.Lock()
+
+
+def words(name):
+	return set(re.findall(r'[a-z0-9]{3,}', name.casefold()))
+
+
+class MenuIndex:
+	""" The features of a menu's items and an inverted index over them """
+
+	def __init__(self, place_pk):
+		items = FoodItem.objects.filter(food_items=place_pk)
+		rows = sorted(items.values_list('pk', 'name', 'category_id'))
+		self.pks = [pk for pk, name, category in rows]
+		self.position = {pk: n for n, pk in enumerate(self.pks)}
+
+		features = {pk: set() for pk in self.pks}
+		for pk, name, category in rows:
+			if category is not None:
+				features[pk].add(('category', category))
+			features[pk].update(('word', word) for word in words(name))
+		tags = FoodItem.tags.through.objects.filter(fooditem__in=items).values_list('fooditem_id', 'tag_id')
+		for pk, tag in tags:
+			features[pk].add(('tag', tag))
+
+		members = defaultdict(list)
+		for pk in self.pks:
+			for feature in features[pk]:
+				members[feature].append(self.position[pk])
+		self.words = {feature: positions for feature, positions in members.items() if feature[0] == 'word'}
+		limit = COMMON_WORDS * len(self.pks)
+		self.members = {
+			feature: positions for feature, positions in members.items()
+			if len(positions) > 1 and not (feature[0] == 'word' and len(positions) > limit)
+		}
+		self.features = {
+			pk: [feature for feature in item_features if feature in self.members]
+			for pk, item_features in features.items()
+		}
+		if numpy is not None:
+			self.arrays = {feature: numpy.array(positions) for feature, positions in self.members.items()}
+
+	def weight(self, feature):
+		return {'category': CATEGORY_WEIGHT, 'tag': TAG_WEIGHT, 'word': WORD_WEIGHT}[feature[0]]
+
+	def neighbours(self, pks):
+		""" Items sharing a feature with any of `pks` """
+		found = set()
+		for pk in pks:
+			for feature in self.features.get(pk, ()):
+				found.update(self.pks[position] for position in self.members[feature])
+		return found
+
+	def borderline(self, changes):
+		"""
+			Items with a word that `changes` added or removed items could
+			have moved across the `COMMON_WORDS` cutoff, in either direction
+		"""
+		limit = COMMON_WORDS * len(self.pks)
+		margin = changes * (1 + COMMON_WORDS)
+		found = set()
+		for positions in self.words.values():
+			if abs(len(positions) - limit) <= margin:
+				found.update(self.pks[position] for position in positions)
+		return found
+
+	def top(self, pks, count=COUNT):
+		""" `{pk: [related pk, ...]}`, best first and lowest pk first on ties """
+		pks = [pk for pk in pks if pk in self.position]
+		results = {}
+		for start in range(0, len(pks), BATCH_SIZE):
+			batch = pks[start:start + BATCH_SIZE]
+			scorer = self.top_numpy if numpy is not None else self.top_python
+			results.update(scorer(batch, count))
+		return results
+
+	def top_python(self, batch, count):
+		results = {}
+		for pk in batch:
+			scores = Counter()
+			for feature in self.features[pk]:
+				weight = self.weight(feature)
+				for position in self.members[feature]:
+					scores[position] += weight
+			scores.pop(self.position[pk], None)
+			best = sorted(scores.items(), key=lambda score: (-score[1], score[0]))[:count]
+			results[pk] = [self.pks[position] for position, score in best]
+		return results
+
+	def top_numpy(self, batch, count):
+		size = len(self.pks)
+		scores = numpy.zeros((len(batch), size))
+		for row, pk in enumerate(batch):
+			for feature in self.features[pk]:
+				scores[row, self.arrays[feature]] += self.weight(feature)
+			scores[row, self.position[pk]] = 0
+		# scores are whole numbers, the fraction ranks lower positions first on ties
+		ranked = scores - numpy.arange(size) / (size + 1)
+		count = min(count, size)
+		best = numpy.argpartition(-ranked, count - 1, axis=1)[:, :count]
+		results = {}
+		for row, pk in enumerate(batch):
+			positions = sorted(best[row], key=lambda position: -ranked[row, position])
+			results[pk] = [self.pks[position] for position in positions if scores[row, position] > 0]
+		return results
+
+
+def stored(place_pk):
+	return {
+		item: fastjson.loads(related)
+		for item, related in RelatedItems.objects.filter(place=place_pk).values_list('item', 'related')
+	}
+
+
+def update(place_pk, changed=None):
+	"""
+		Rescore the items of a restaurant's menu that `changed` can affect,
+		every item when `changed` is None. Returns the number of items rescored.
+	"""
+	index = MenuIndex(place_pk)
+	if changed is None:
+		affected = set(index.pks)
+	else:
+		changed = set(changed)
+		listing = {item for item, related in stored(place_pk).items() if changed.intersection(related)}
+		affected = changed | listing | index.neighbours(changed) | index.borderline(len(changed))
+	affected = sorted(affected)
+	results = index.top(affected)
+
+	rows = RelatedItems.objects.filter(place=place_pk)
+	with transaction.atomic():
+		if changed is None:
+			rows.delete()
+		else:
+			for start in range(0, len(affected), BATCH_SIZE):
+				rows.filter(item__in=affected[start:start + BATCH_SIZE]).delete()
+		RelatedItems.objects.bulk_create(
+			[
+				RelatedItems(place_id=place_pk, item_id=pk, related=fastjson.dumps(related).decode())
+				for pk, related in results.items()
+			],
+			batch_size=BATCH_SIZE,
+		)
+	return len(results)
+
+
+def rebuild():
+	""" Rebuild the index of every restaurant, returns the number of items """
+	return sum(update(place_pk) for place_pk in Restaurant.objects.values_list('pk', flat=True))
+
+
+def related_ids(place, item):
+	""" The related item ids of `item`, scored right away when missing """
+	rows = RelatedItems.objects.filter(place=place, item=item).values_list('related', flat=True)
+	related = rows.first()
+	if related is None:
+		update(place.pk, [item.pk])
+		related = rows.first()
+	return fastjson.loads(related) if related is not None else []
+
+
+def flush(place_pk):
+	with _lock:
+		changed = _pending.pop(place_pk, set())
+	if changed:
+		update(place_pk, changed)
+
+
+def schedule_update(place_pk, pks):
+	""" Rescore after the transaction commits, once per restaurant and request """
+	def schedule():
+		with _lock:
+			_pending[place_pk].update(pks)
+		defer(('related', place_pk), flush, place_pk)
+	transaction.on_commit(schedule)
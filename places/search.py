@@ -0,0 +1,111 @@
+"""
+	Full-text search of food items.
+
+	On SQLite an FTS5 table, created by migration 0006, holds the name,
+	description, category and tag names of every food item under the
+	item's primary key, and `places.signals` keeps it in step with them.
+	Matches are ranked with BM25, the name counting the most, and the last
+	word of a query also matches the longer words it starts.
+
+	Other databases, or SQLite builds without FTS5, fall back to an
+	unranked `icontains` lookup on the name.
+"""
+import re
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from .api.projections import chunks, grouped
+from .models import FoodItem, Tag
+
+
+TABLE = 'places_fooditem_search'
+COLUMNS = ('name', 'about', 'category', 'tags')
+# bm25() weights of `COLUMNS`
+WEIGHTS = (10.0, 1.0, 4.0, 4.0)
+
+_available = False
+
+
+def available():
+	""" Whether the FTS5 table exists, only a found table is remembered """
+	global _available
+	if not _available and connection.vendor == 'sqlite':
+		_available = TABLE in connection.introspection.table_names()
+	return _available
+
+
+def match_expression(text):
+	""" Every word of `text` required, the last one as a prefix of what is being typed """
+	terms = [f'"{term}"' for term in re.findall(r'\w+', text.casefold())]
+	if terms:
+		terms[-1] += '*'
+	return ' '.join(terms)
+
+
+def documents(pks):
+	rows = FoodItem.objects.filter(pk__in=pks).values_list('pk', 'name', 'about', 'category__name')
+	tags = grouped(Tag.objects.all(), 'fooditem', pks, 'tag')
+	return [
+		(pk, name, about or '', category or '', ' '.join(tag for tag, in tags.get(pk, ())))
+		for pk, name, about, category in rows
+	]
+
+
+def index_items(pks):
+	""" Index the items of `pks` again, deleted items are dropped """
+	if not available():
+		return
+	pks = list(pks)
+	with connection.cursor() as cursor:
+		for chunk in chunks(pks):
+			placeholders = ', '.join(['%s'] * len(chunk))
+			cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', chunk)
+			cursor.executemany(
+				f'INSERT INTO {TABLE} (rowid, {", ".join(COLUMNS)}) VALUES (%s, %s, %s, %s, %s)',
+				documents(chunk),
+			)
+
+
+def rebuild():
+	""" Index every food item from scratch, returns the number of items """
+	if not available():
+		return 0
+	with connection.cursor() as cursor:
+		cursor.execute(f'DELETE FROM {TABLE}')
+	pks = list(FoodItem.objects.values_list('pk', flat=True))
+	index_items(pks)
+	with connection.cursor() as cursor:
+		cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+	return len(pks)
+
+
+def matching(queryset, text):
+	""" `queryset` narrowed to the food items matching `text` """
+	if not available():
+		return queryset.filter(name__icontains=text)
+	expression = match_expression(text)
+	if not expression:
+		return queryset.none()
+	return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [expression]))
+
+
+def ranked(text, queryset=None, limit=None):
+	""" Primary keys of the best `limit` food items matching `text`, among `queryset` if given """
+	if not available():
+		items = FoodItem.objects.all() if queryset is None else queryset
+		return list(items.filter(name__icontains=text).order_by('pk').values_list('pk', flat=True)[:limit])
+	expression = match_expression(text)
+	if not expression:
+		return []
+	sql = f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+	params = [expression]
+	if queryset is not None:
+		subquery, subquery_params = queryset.order_by().values('pk').query.sql_with_params()
+		sql += f' AND rowid IN ({subquery})'
+		params += subquery_params
+	sql += f' ORDER BY bm25({TABLE}, {", ".join(map(str, WEIGHTS))}), rowid'
+	if limit is not None:
+		sql += ' LIMIT %s'
+		params.append(limit)
+	with connection.cursor() as cursor:
+		cursor.execute(sql, params)
+		return [pk for pk, in cursor.fetchall()]
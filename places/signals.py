@@ -0,0 +1,298 @@
+from collections import defaultdict
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from accounts.models import Account, Merchant
+from metrics.models import Review
+from .api.conditional import touch_places
+from .models import (
+	Category,
+	CustomOptionChoice,
+	FoodImage,
+	FoodItem,
+	OrderOption,
+	Restaurant,
+	RestaurantBranch,
+	Tag,
+)
+from . import menus, ratings, related, search, tenants
+
+
+# Tenant cache invalidation
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def forget_cached_place(sender, instance, **kwargs):
+	tenants.forget_place(instance.pk)
+	tenants.hosts.invalidate()
+
+
+@receiver(post_save, sender=RestaurantBranch)
+@receiver(post_delete, sender=RestaurantBranch)
+def forget_cached_branch(sender, instance, **kwargs):
+	tenants.forget_branch(instance.pk)
+
+
+@receiver(m2m_changed, sender=Restaurant.branches.through)
+def forget_cached_branch_membership(sender, instance, reverse, **kwargs):
+	if reverse:
+		tenants.forget_branch(instance.pk)
+	else:
+		tenants.forget_place(instance.pk)
+
+
+
+# Rating aggregates
+
+def count_place_rating(place_pk, rating, sign=1):
+	ratings.add_ratings(Restaurant.objects.filter(pk=place_pk), [rating], sign)
+	tenants.forget_place(place_pk)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+	# what the aggregates currently hold for this review
+	instance._counted_as = None
+	if instance.pk:
+		instance._counted_as = (
+			Review.objects.filter(pk=instance.pk)
+			.values_list('rating', 'place_id').first()
+		)
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, **kwargs):
+	counted = getattr(instance, '_counted_as', None)
+	if counted == (instance.rating, instance.place_id_id):
+		return
+	if counted is not None:
+		rating, place_pk = counted
+		count_place_rating(place_pk, rating, -1)
+		items = FoodItem.objects.filter(reviews=instance)
+		ratings.remove_ratings(items, [rating])
+		ratings.add_ratings(items, [instance.rating])
+	count_place_rating(instance.place_id_id, instance.rating)
+
+
+@receiver(pre_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+	ratings.remove_ratings(FoodItem.objects.filter(reviews=instance), [instance.rating])
+	count_place_rating(instance.place_id_id, instance.rating, -1)
+
+
+@receiver(m2m_changed, sender=FoodItem.reviews.through)
+def count_item_reviews(sender, instance, action, reverse, pk_set, **kwargs):
+	# removals are counted before they happen, `pk_set` may hold
+	# reviews that were never attached
+	if action == 'post_add':
+		sign = 1
+	elif action in ('pre_remove', 'pre_clear'):
+		sign = -1
+	else:
+		return
+
+	if reverse:
+		# `instance` is a review, `pk_set` food items
+		attached = FoodItem.objects.filter(reviews=instance)
+		items = attached
+		if pk_set is not None:
+			items = (FoodItem.objects if sign > 0 else attached).filter(pk__in=pk_set)
+		values = [instance.rating]
+	else:
+		items = FoodItem.objects.filter(pk=instance.pk)
+		reviews = instance.reviews.all()
+		if pk_set is not None:
+			reviews = (Review.objects if sign > 0 else reviews).filter(pk__in=pk_set)
+		values = list(reviews.values_list('rating', flat=True))
+	ratings.add_ratings(items, values, sign)
+
+
+# Menu snapshots, after the rating aggregates so that a rebuild sees them
+
+MENU_MODELS = (FoodItem, FoodImage, OrderOption, CustomOptionChoice, Category, Review, RestaurantBranch)
+MENU_RELATIONS = (
+	FoodItem.images.through,
+	FoodItem.custom_choices.through,
+	FoodItem.tags.through,
+	FoodItem.reviews.through,
+	OrderOption.choices.through,
+	Restaurant.menu.through,
+	Restaurant.categories.through,
+	RestaurantBranch.menu.through,
+)
+
+
+def rebuild_menus(sender, instance, **kwargs):
+	for place_pk in menus.places_of(instance):
+		menus.schedule_rebuild(place_pk)
+
+
+def rebuild_menus_on_relation(sender, instance, action, model, pk_set, **kwargs):
+	if not action.startswith('post_'):
+		return
+	places = menus.places_of(instance)
+	if pk_set:
+		for obj in model.objects.filter(pk__in=pk_set):
+			places |= menus.places_of(obj)
+	for place_pk in places:
+		menus.schedule_rebuild(place_pk)
+
+
+for model in MENU_MODELS:
+	post_save.connect(rebuild_menus, sender=model)
+	post_delete.connect(rebuild_menus, sender=model)
+for through in MENU_RELATIONS:
+	m2m_changed.connect(rebuild_menus_on_relation, sender=through)
+
+
+# `place_view` validators, the restaurant is touched when what it shows changes
+
+PLACE_RELATIONS = (
+	Restaurant.branches.through,
+	Restaurant.categories.through,
+	Restaurant.links.through,
+	Restaurant.reviews.through,
+	RestaurantBranch.menu.through,
+)
+OWNER_FIELDS = {'first_name', 'last_name', 'email'}
+
+
+def branch_places(branches):
+	return Q(restaurantbranch__in=branches) | Q(branches__in=branches)
+
+
+@receiver(post_save, sender=RestaurantBranch)
+@receiver(post_delete, sender=RestaurantBranch)
+def touch_branch_place(sender, instance, **kwargs):
+	touch_places(Restaurant.objects.filter(Q(pk=instance.place_id_id) | branch_places([instance.pk])))
+
+
+@receiver(post_save, sender=Merchant)
+def touch_merchant_place(sender, instance, **kwargs):
+	touch_places(Restaurant.objects.filter(owner=instance))
+
+
+@receiver(post_save, sender=Account)
+def touch_owner_place(sender, instance, update_fields=None, **kwargs):
+	# logins only save `last_login`
+	if update_fields is None or OWNER_FIELDS & set(update_fields):
+		touch_places(Restaurant.objects.filter(owner__user=instance))
+
+
+def touch_related_place(sender, instance, action, model, pk_set, **kwargs):
+	if not action.startswith('post_'):
+		return
+	places = Q(pk__in=())
+	if isinstance(instance, Restaurant):
+		places |= Q(pk=instance.pk)
+	elif isinstance(instance, RestaurantBranch):
+		places |= branch_places([instance.pk])
+	if pk_set and model is Restaurant:
+		places |= Q(pk__in=pk_set)
+	elif pk_set and model is RestaurantBranch:
+		places |= branch_places(pk_set)
+	touch_places(Restaurant.objects.filter(places))
+
+
+for through in PLACE_RELATIONS:
+	m2m_changed.connect(touch_related_place, sender=through)
+
+
+# Related items index, rescored when what items are matched on changes
+
+def rescore_items(pks):
+	""" Rescore the related items of `pks` on every menu listing them """
+	places = defaultdict(set)
+	listed = Restaurant.menu.through.objects.filter(fooditem__in=pks).values_list('restaurant_id', 'fooditem_id')
+	for place_pk, pk in listed:
+		places[place_pk].add(pk)
+	for place_pk, pks in places.items():
+		related.schedule_update(place_pk, pks)
+
+
+@receiver(pre_save, sender=FoodItem)
+def remember_item_features(sender, instance, **kwargs):
+	instance._indexed_as = None
+	if instance.pk:
+		instance._indexed_as = FoodItem.objects.filter(pk=instance.pk).values_list('name', 'category_id').first()
+
+
+@receiver(post_save, sender=FoodItem)
+def rescore_saved_item(sender, instance, **kwargs):
+	if getattr(instance, '_indexed_as', None) != (instance.name, instance.category_id):
+		rescore_items([instance.pk])
+
+
+@receiver(pre_delete, sender=FoodItem)
+def rescore_deleted_item(sender, instance, **kwargs):
+	# the menus listing the item are gone by `post_delete`
+	rescore_items([instance.pk])
+
+
+@receiver(m2m_changed, sender=FoodItem.tags.through)
+def rescore_tagged_items(sender, instance, action, reverse, pk_set, **kwargs):
+	if action not in ('post_add', 'post_remove', 'pre_clear'):
+		return
+	if not reverse:
+		rescore_items([instance.pk])
+	elif pk_set is not None:
+		rescore_items(pk_set)
+	else:
+		rescore_items(instance.fooditem_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Restaurant.menu.through)
+def rescore_menu(sender, instance, action, reverse, pk_set, **kwargs):
+	if action not in ('post_add', 'post_remove', 'pre_clear'):
+		return
+	if action == 'pre_clear':
+		related_objects = instance.food_items if reverse else instance.menu
+		pk_set = set(related_objects.values_list('pk', flat=True))
+	if reverse:
+		# `instance` is a food item, `pk_set` restaurants
+		for place_pk in pk_set:
+			related.schedule_update(place_pk, [instance.pk])
+	else:
+		related.schedule_update(instance.pk, pk_set)
+
+
+# Full-text search index, written in the transaction that changes the items
+
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def index_item(sender, instance, **kwargs):
+	search.index_items([instance.pk])
+
+
+@receiver(m2m_changed, sender=FoodItem.tags.through)
+def index_tagged_items(sender, instance, action, reverse, pk_set, **kwargs):
+	if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+		return
+	if not reverse:
+		if action != 'pre_clear':
+			search.index_items([instance.pk])
+	elif action == 'pre_clear':
+		# the items are unknown once cleared
+		items = list(instance.fooditem_set.values_list('pk', flat=True))
+		transaction.on_commit(lambda: search.index_items(items))
+	elif pk_set is not None:
+		search.index_items(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def index_renamed_tag(sender, instance, created, **kwargs):
+	if not created:
+		search.index_items(instance.fooditem_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def index_deleted_tag(sender, instance, **kwargs):
+	items = list(instance.fooditem_set.values_list('pk', flat=True))
+	transaction.on_commit(lambda: search.index_items(items))
+
+
+@receiver(post_save, sender=Category)
+def index_renamed_category(sender, instance, created, **kwargs):
+	if not created:
+		search.index_items(FoodItem.objects.filter(category=instance).values_list('pk', flat=True))
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .models import Restaurant, RestaurantBranch
+
+
+class TenantCache:
+	"""
+		A small thread safe LRU cache with a per entry time-to-live.
+
+		Only the raw column values of a row are kept, so every lookup hands
+		out a fresh model instance and a view mutating `request.place` can
+		never leak into another request.
+	"""
+	def __init__(self, max_size=512, ttl=300):
+		self.max_size = max_size
+		self.ttl = ttl
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key):
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				return None
+			expires, value = entry
+			if expires < time.monotonic():
+				del self._entries[key]
+				return None
+			self._entries.move_to_end(key)
+			return value
+
+	def set(self, key, value):
+		with self._lock:
+			self._entries[key] = (time.monotonic() + self.ttl, value)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_size:
+				self._entries.popitem(last=False)
+
+	def discard(self, match):
+		# drop every entry whose (key, value) satisfies `match`
+		with self._lock:
+			stale = [key for key, (_, value) in self._entries.items() if match(key, value)]
+			for key in stale:
+				del self._entries[key]
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def __len__(self):
+		return len(self._entries)
+
+
+class HostMap:
+	"""
+		Maps storefront hosts (`Restaurant.domian_name`) to restaurant slugs.
+
+		The whole map is loaded with a single query and kept in memory, it is
+		rebuilt lazily after a restaurant changes or once `ttl` runs out so
+		that other worker processes pick up changes too.
+	"""
+	def __init__(self, ttl=60):
+		self.ttl = ttl
+		self._hosts = None
+		self._expires = 0
+		self._lock = threading.Lock()
+
+	def get(self, host):
+		hosts = self._hosts
+		if hosts is None or self._expires < time.monotonic():
+			hosts = self.refresh()
+		return hosts.get(normalize_host(host))
+
+	def refresh(self):
+		with self._lock:
+			rows = Restaurant.objects.exclude(domian_name__isnull=True).exclude(domian_name='')
+			hosts = {}
+			for domain, slug in rows.values_list('domian_name', 'slug'):
+				hosts[normalize_host(domain)] = slug
+			self._hosts = hosts
+			self._expires = time.monotonic() + self.ttl
+			return hosts
+
+	def invalidate(self):
+		self._hosts = None
+
+
+def normalize_host(host):
+	# accepts both bare hosts and full urls e.g 'https://www.Example.com:8000/'
+	host = host.strip().lower()
+	if '://' in host:
+		host = host.split('://', 1)[1]
+	host = host.split('/', 1)[0].split(':', 1)[0].rstrip('.')
+	if host.startswith('www.'):
+		host = host[4:]
+	return host
+
+
+_options = getattr(settings, 'TENANT_CACHE', {})
+cache = TenantCache(
+	max_size=_options.get('MAX_SIZE', 512),
+	ttl=_options.get('TTL', 300),
+)
+hosts = HostMap(ttl=_options.get('HOST_MAP_TTL', 60))
+
+
+def _freeze(instance):
+	fields = instance._meta.concrete_fields
+	return instance.pk, tuple(getattr(instance, field.attname) for field in fields)
+
+
+def _thaw(model, entry):
+	names = [field.attname for field in model._meta.concrete_fields]
+	return model.from_db('default', names, entry[1])
+
+
+def get_place(slug):
+	""" Resolve a restaurant by slug, raises `Restaurant.DoesNotExist` like the ORM """
+	key = ('place', slug)
+	entry = cache.get(key)
+	if entry is None:
+		entry = _freeze(Restaurant.objects.get(slug=slug))
+		cache.set(key, entry)
+	return _thaw(Restaurant, entry)
+
+
+def get_place_for_host(host):
+	""" Resolve the restaurant serving `host`, or None for non storefront hosts """
+	slug = hosts.get(host)
+	if slug is None:
+		return None
+	return get_place(slug)
+
+
+def get_branch(place, branch_id):
+	""" Resolve one of `place`'s branches by its public branch id """
+	key = ('branch', place.pk, branch_id)
+	entry = cache.get(key)
+	if entry is None:
+		entry = _freeze(place.branches.get(branch_id=branch_id))
+		cache.set(key, entry)
+	return _thaw(RestaurantBranch, entry)
+
+
+def forget_place(place_pk):
+	# a restaurant's slug may have changed, so match on the primary key
+	cache.discard(lambda key, entry: (
+		(key[0] == 'place' and entry[0] == place_pk) or
+		(key[0] == 'branch' and key[1] == place_pk)
+	))
+
+
+def forget_branch(branch_pk):
+	cache.discard(lambda key, entry: key[0] == 'branch' and entry[0] == branch_pk)
@@ -1,3 +1,509 @@
-from django.test import TestCase
+import importlib
+import random
+import time
+from decimal import Decimal
+from unittest import mock
+from django.apps import apps
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import force_authenticate
+from accounts.models import Account, Customer, Merchant
+from places.api.views import item_detail_view, menu_view, place_view, search_view
+from metrics.models import Review
+from places.models import *
+from places.models.places import RatedModel
+from places import menus, ratings, recommendations, related, search
 
-# Create your tests here.
+search_migration = importlib.import_module('places.migrations.0006_fooditem_search')
+
+
+def create_place(name, rows):
+	""" A restaurant with `rows` food items and `rows` orders, every relation the serializers read filled in """
+	owner = Merchant.objects.create(
+		user=Account.objects.create_user(email=f'{name}@example.com', password='pw', first_name=name, last_name='Owner'),
+		phone=f'{name}-1',
+	)
+	place = Restaurant(name=name, owner=owner, domian_name=f'{name}.example.com', delivery_fulfilment='in-house')
+	place.save()
+	owner.store = place
+	owner.save()
+	branch = RestaurantBranch.objects.create(place_id=place, branch_id=f'{name}-main', branch_name=f'{name} main')
+	place.branches.add(branch)
+	category = Category.objects.create(name=f'{name} burgers')
+	place.categories.add(category)
+	tag = Tag.objects.create(tag=f'{name}-spicy')
+	customer = Customer.objects.create(
+		user=Account.objects.create_user(email=f'{name}-customer@example.com', first_name='Cust', last_name='Omer'),
+		phone=f'{name}-2',
+	)
+	place.customers.add(customer)
+
+	for n in range(rows):
+		item = FoodItem.objects.create(name=f'{name} burger {n}', price=Decimal('10.5') + n, category=category, place=place, about='tasty')
+		place.menu.add(item)
+		item.tags.add(tag)
+		item.images.add(FoodImage.objects.create(item=item, image=f'food/{name}-{n}.jpg'))
+		option = OrderOption.objects.create(food_item=item, name=f'{name} size {n}')
+		small = CustomOptionChoice.objects.create(customization=option, name=f'{name} small {n}')
+		large = CustomOptionChoice.objects.create(customization=option, name=f'{name} large {n}', price=Decimal('1'))
+		option.choices.add(small, large)
+		option.default_choice = small
+		option.save()
+		item.custom_choices.add(option)
+
+		order = Order.objects.create(place_id=place, branch_id=branch, customer=customer)
+		order.items.add(OrderItem.objects.create(item=item, quantity=2))
+		place.orders.add(order)
+		customer.orders.add(order)
+	return place
+
+
+class ServedQueriesTestCase(TestCase):
+	""" The queries of a list view must not grow with the rows it serves """
+
+	factory = RequestFactory()
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.small = create_place('small', 2)
+		cls.large = create_place('large', 10)
+
+	def setUp(self):
+		# menu snapshots are loaded the same way for both restaurants
+		menus.loaded.clear()
+
+	def request(self, place, **params):
+		request = self.factory.get('/', {'place': place.slug, **params})
+		request.place = Restaurant.objects.get(pk=place.pk)
+		request.branch = None
+		force_authenticate(request, place.owner.user)
+		return request
+
+	def assertConstantQueries(self, view, **params):
+		""" `view` serves 2 and 10 rows with as many queries, returns both responses """
+		with CaptureQueriesContext(connection) as queries:
+			small = view(self.request(self.small, **params))
+		with self.assertNumQueries(len(queries)):
+			large = view(self.request(self.large, **params))
+		self.assertEqual(small.status_code, 200, small.data)
+		self.assertEqual(large.status_code, 200, large.data)
+		return small, large
+
+
+class MenuViewTestCase(ServedQueriesTestCase):
+	def test_queries_do_not_grow_with_page_size(self):
+		small, large = self.assertConstantQueries(menu_view)
+		self.assertEqual(len(small.data['data']['products']), 2)
+		self.assertEqual(len(large.data['data']['products']), 10)
+
+
+class RatingAggregatesTestCase(TestCase):
+	""" The stored rating counts must equal what `rebuildratings` computes from the reviews """
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.place = create_place('rated', 2)
+		cls.other = create_place('other', 1)
+		cls.first, cls.second = cls.place.menu.order_by('pk')
+		cls.customer = cls.place.customers.get()
+
+	def review(self, rating, place=None, *items):
+		review = Review.objects.create(author=self.customer, rating=rating, place_id=place or self.place)
+		for item in items:
+			item.reviews.add(review)
+		return review
+
+	def stored(self):
+		return {
+			model.__name__: list(model.objects.order_by('pk').values_list('pk', *RatedModel.RATING_FIELDS))
+			for model in (FoodItem, Restaurant)
+		}
+
+	def assertMatchesRebuild(self):
+		stored = self.stored()
+		ratings.rebuild()
+		self.assertEqual(stored, self.stored())
+
+	def assertRating(self, instance, rating_sum, rating_count):
+		instance.refresh_from_db()
+		self.assertEqual((instance.rating_sum, instance.rating_count), (rating_sum, rating_count))
+
+	def test_create(self):
+		self.review(4, None, self.first)
+		self.review(2, None, self.first, self.second)
+		self.assertRating(self.first, 6, 2)
+		self.assertRating(self.place, 6, 2)
+		self.assertMatchesRebuild()
+
+	def test_rerate(self):
+		review = self.review(4, None, self.first, self.second)
+		review.rating = 1
+		review.save()
+		self.assertRating(self.second, 1, 1)
+		self.assertRating(self.place, 1, 1)
+		self.assertMatchesRebuild()
+
+	def test_move_to_another_restaurant(self):
+		review = self.review(5, None, self.first)
+		review.place_id = self.other
+		review.save()
+		self.assertRating(self.place, 0, 0)
+		self.assertRating(self.other, 5, 1)
+		self.assertRating(self.first, 5, 1)
+		self.assertMatchesRebuild()
+
+	def test_delete(self):
+		self.review(3, None, self.first)
+		self.review(5, None, self.first, self.second).delete()
+		self.assertRating(self.first, 3, 1)
+		self.assertRating(self.second, 0, 0)
+		self.assertMatchesRebuild()
+
+	def test_items_reviews_updated(self):
+		kept, dropped = self.review(4), self.review(2)
+		self.first.reviews.add(kept, dropped)
+		self.first.reviews.remove(dropped)
+		self.second.reviews.add(kept)
+		self.second.reviews.clear()
+		self.assertRating(self.first, 4, 1)
+		self.assertRating(self.second, 0, 0)
+		self.assertMatchesRebuild()
+
+	def test_reviews_items_updated(self):
+		review = self.review(3)
+		review.reviews.add(self.first, self.second)
+		review.reviews.remove(self.second)
+		self.assertRating(self.first, 3, 1)
+		self.assertRating(self.second, 0, 0)
+		review.reviews.clear()
+		self.assertRating(self.first, 0, 0)
+		self.assertMatchesRebuild()
+
+	def test_stale_instance_keeps_counts(self):
+		stale = FoodItem.objects.get(pk=self.first.pk)
+		self.review(5, None, self.first)
+		stale.about = 'still tasty'
+		stale.save()
+		self.assertRating(self.first, 5, 1)
+		self.assertMatchesRebuild()
+
+
+class ConditionalGetTestCase(TestCase):
+	factory = RequestFactory()
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.place = create_place('cached', 2)
+		cls.item = cls.place.menu.order_by('pk').first()
+
+	def get(self, view, etag=None, accept='application/json', **params):
+		headers = {'HTTP_ACCEPT': accept}
+		if etag:
+			headers['HTTP_IF_NONE_MATCH'] = etag
+		request = self.factory.get('/', {'place': self.place.slug, **params}, **headers)
+		request.place = Restaurant.objects.get(pk=self.place.pk)
+		request.branch = None
+		return view(request)
+
+	def assertRevalidates(self, view, **params):
+		""" A repeated request with the ETag is a 304, returns the first response """
+		response = self.get(view, **params)
+		self.assertEqual(response.status_code, 200)
+		self.assertIn('Accept', response['Vary'])
+		revalidated = self.get(view, response['ETag'], **params)
+		self.assertEqual(revalidated.status_code, 304)
+		self.assertEqual(revalidated['ETag'], response['ETag'])
+		return response
+
+	def test_not_modified(self):
+		self.assertRevalidates(menu_view)
+		self.assertRevalidates(item_detail_view, itemId=self.item.slug)
+		self.assertRevalidates(place_view)
+
+	def test_etag_depends_on_accept(self):
+		json = self.get(menu_view)
+		msgpack = self.get(menu_view, json['ETag'], accept='application/msgpack')
+		self.assertEqual(msgpack.status_code, 200)
+		self.assertNotEqual(msgpack['ETag'], json['ETag'])
+
+	def test_menu_change_changes_etag(self):
+		menu = self.assertRevalidates(menu_view)
+		item = self.assertRevalidates(item_detail_view, itemId=self.item.slug)
+		# snapshots are rebuilt once the change is committed
+		with self.captureOnCommitCallbacks(execute=True):
+			self.item.name = 'cached burger renamed'
+			self.item.save()
+		self.assertEqual(self.get(menu_view, menu['ETag']).status_code, 200)
+		self.assertEqual(self.get(item_detail_view, item['ETag'], itemId=self.item.slug).status_code, 200)
+
+	def test_featured_rotation_changes_menu_etag(self):
+		now = time.time()
+		with mock.patch('places.menus.time.time', return_value=now):
+			menu = self.get(menu_view)
+			item = self.get(item_detail_view, itemId=self.item.slug)
+		with mock.patch('places.menus.time.time', return_value=now + menus.FEATURED_ROTATION):
+			self.assertEqual(self.get(menu_view, menu['ETag']).status_code, 200)
+			# item pages do not show featured items
+			self.assertEqual(self.get(item_detail_view, item['ETag'], itemId=self.item.slug).status_code, 304)
+
+	def test_place_change_changes_etag(self):
+		response = self.assertRevalidates(place_view)
+		place = Restaurant.objects.get(pk=self.place.pk)
+		place.name = 'cached renamed'
+		place.save()
+		self.assertEqual(self.get(place_view, response['ETag']).status_code, 200)
+
+
+class RelatedItemsTestCase(TestCase):
+	""" Incremental rescoring must end up where a full rebuild does """
+
+	WORDS = ('smoky', 'pepper', 'chicken', 'beef', 'jollof', 'suya', 'wrap', 'rice', 'spicy')
+	# on about half the menu, edits move it across the COMMON_WORDS cutoff
+	COMMON = 'grilled'
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.place = create_place('related', 0)
+		cls.categories = [Category.objects.create(name=f'related {n}') for n in range(8)]
+		cls.tags = [Tag.objects.create(tag=f'related-{n}') for n in range(8)]
+
+	def setUp(self):
+		# this sequence moves COMMON across the cutoff, dropping `borderline()` fails it
+		self.chooser = random.Random(6)
+		self.created = 0
+		for _ in range(16):
+			self.add_item()
+		related.update(self.place.pk)
+
+	def name(self):
+		self.created += 1
+		words = self.chooser.sample(self.WORDS, self.chooser.randrange(1, 3))
+		if self.chooser.random() < 0.5:
+			words.append(self.COMMON)
+		return ' '.join(words) + f' {self.created}'
+
+	def menu(self):
+		return list(self.place.menu.order_by('pk'))
+
+	def add_item(self):
+		item = FoodItem.objects.create(
+			name=self.name(), price=Decimal('5'), category=self.chooser.choice(self.categories), place=self.place
+		)
+		item.tags.add(*self.chooser.sample(self.tags, self.chooser.randrange(3)))
+		self.place.menu.add(item)
+
+	def rename(self):
+		item = self.chooser.choice(self.menu())
+		item.name = self.name()
+		item.save()
+
+	def recategorize(self):
+		item = self.chooser.choice(self.menu())
+		item.category = self.chooser.choice(self.categories)
+		item.save()
+
+	def tag(self):
+		self.chooser.choice(self.menu()).tags.add(self.chooser.choice(self.tags))
+
+	def untag(self):
+		tagged = [item for item in self.menu() if item.tags.exists()]
+		if tagged:
+			item = self.chooser.choice(tagged)
+			item.tags.remove(self.chooser.choice(list(item.tags.all())))
+
+	def remove(self):
+		self.place.menu.remove(self.chooser.choice(self.menu()))
+
+	def delete(self):
+		self.chooser.choice(self.menu()).delete()
+
+	def test_incremental_updates_match_a_rebuild(self):
+		edits = (self.rename, self.recategorize, self.tag, self.untag, self.add_item, self.remove, self.delete)
+		for step in range(40):
+			edit = self.chooser.choice(edits)
+			with self.subTest(step=step, edit=edit.__name__):
+				# items are rescored once the change is committed
+				with self.captureOnCommitCallbacks(execute=True):
+					edit()
+				incremental = related.stored(self.place.pk)
+				related.update(self.place.pk)
+				self.assertEqual(incremental, related.stored(self.place.pk))
+
+
+class FeedIndexTestCase(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.first = create_place('feed-first', 3)
+		cls.second = create_place('feed-second', 3)
+
+	def rank(self, catalogue):
+		tags = {Tag.objects.get(tag='feed-first-spicy').pk: 1.0}
+		return [item['id'] for item in catalogue.rank(tags, {}, {self.second.pk})]
+
+	def test_only_changed_menus_are_indexed_again(self):
+		index = recommendations.FeedIndex()
+		catalogue = index.refresh()
+		shelves = dict(index.shelves)
+		self.assertIs(index.refresh(), catalogue)
+
+		item = self.first.menu.order_by('pk').first()
+		with self.captureOnCommitCallbacks(execute=True):
+			item.tags.set([Tag.objects.get(tag='feed-second-spicy')])
+		catalogue = index.refresh()
+		self.assertIsNot(index.shelves[self.first.pk], shelves[self.first.pk])
+		self.assertIs(index.shelves[self.second.pk], shelves[self.second.pk])
+		self.assertEqual(self.rank(catalogue), self.rank(recommendations.FeedIndex().refresh()))
+		self.assertNotEqual(self.rank(catalogue)[0], item.pk)
+
+
+class FeedViewTestCase(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.followed = create_place('feed-followed', 3)
+		cls.other = create_place('feed-other', 3)
+		# likes the tag of the followed restaurant's items, ordered them all
+		cls.customer = cls.followed.customers.get()
+		# liked, but not followed
+		cls.liked = cls.other.menu.order_by('pk').last()
+		cls.liked.tags.add(Tag.objects.get(tag='feed-followed-spicy'))
+
+	def setUp(self):
+		menus.loaded.clear()
+		patch = mock.patch.object(recommendations, 'index', recommendations.FeedIndex())
+		patch.start()
+		self.addCleanup(patch.stop)
+
+	def get_feed(self, url='/api/places/feed/', **params):
+		response = self.client.get(url, params)
+		self.assertEqual(response.status_code, 200)
+		return response.json()
+
+	def items_of(self, place):
+		return list(place.menu.order_by('pk').values_list('pk', flat=True))
+
+	def test_ranking(self):
+		self.client.force_login(self.customer.user)
+		page = self.get_feed()
+		# liked and followed first, ties by item pk, items with nothing to go on are left out
+		expected = self.items_of(self.followed) + [self.liked.pk]
+		self.assertEqual([item['id'] for item in page['data']['products']], expected)
+		self.assertEqual(page['count'], 4)
+
+	def test_pagination(self):
+		self.client.force_login(self.customer.user)
+		pages, page = [], self.get_feed(page_size=3)
+		while True:
+			pages.append([item['id'] for item in page['data']['products']])
+			if not page['next_url']:
+				break
+			page = self.get_feed(page['next_url'])
+		self.assertEqual(pages, [self.items_of(self.followed), [self.liked.pk]])
+		previous = self.get_feed(page['previous_url'])
+		self.assertEqual([item['id'] for item in previous['data']['products']], pages[0])
+
+	def test_anonymous(self):
+		page = self.get_feed()
+		self.assertEqual(
+			[item['id'] for item in page['data']['products']],
+			sorted(self.items_of(self.followed) + self.items_of(self.other)),
+		)
+
+
+class SearchTestCase(TestCase):
+	""" The FTS5 index, created like migration 0006 does since test databases are not migrated """
+
+	factory = RequestFactory()
+
+	@classmethod
+	def setUpClass(cls):
+		# the SQLite schema editor cannot run inside the test case's transaction
+		with connection.schema_editor() as editor:
+			search_migration.create_search_table(apps, editor)
+		cls.addClassCleanup(cls.drop_search_table)
+		super().setUpClass()
+
+	@classmethod
+	def drop_search_table(cls):
+		with connection.schema_editor() as editor:
+			search_migration.drop_search_table(apps, editor)
+		search._available = False
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.place = create_place('search', 0)
+		cls.other = create_place('search-other', 0)
+		cls.grills = Category.objects.create(name='Grills')
+		cls.vegan = Tag.objects.create(tag='vegan')
+		cls.wrap = cls.add_item(cls.place, 'Suya wrap', 'Beef strips in flatbread')
+		cls.salad = cls.add_item(cls.place, 'Garden salad', 'Greens with a suya spice dressing', cls.vegan)
+		cls.burger = cls.add_item(cls.place, 'Cheeseburger', 'Grilled beef patty')
+		cls.elsewhere = cls.add_item(cls.other, 'Suya platter', 'Skewers')
+
+	@classmethod
+	def add_item(cls, place, name, about, *tags):
+		item = FoodItem.objects.create(name=name, about=about, price=Decimal('5'), category=cls.grills, place=place)
+		item.tags.add(*tags)
+		place.menu.add(item)
+		return item
+
+	def found(self, text):
+		return set(search.ranked(text))
+
+	def test_index_is_used(self):
+		self.assertTrue(search.available())
+
+	def test_item_changes(self):
+		self.burger.name = 'Smash burger'
+		self.burger.save()
+		self.assertEqual(self.found('smash'), {self.burger.pk})
+		self.assertEqual(self.found('cheeseburger'), set())
+		self.burger.delete()
+		self.assertEqual(self.found('smash'), set())
+
+	def test_tag_changes(self):
+		self.wrap.tags.add(self.vegan)
+		self.assertEqual(self.found('vegan'), {self.salad.pk, self.wrap.pk})
+		self.vegan.tag = 'plantbased'
+		self.vegan.save()
+		self.assertEqual(self.found('vegan'), set())
+		self.assertEqual(self.found('plantbased'), {self.salad.pk, self.wrap.pk})
+		self.salad.tags.remove(self.vegan)
+		self.assertEqual(self.found('plantbased'), {self.wrap.pk})
+		with self.captureOnCommitCallbacks(execute=True):
+			self.vegan.delete()
+		self.assertEqual(self.found('plantbased'), set())
+
+	def test_category_rename(self):
+		self.grills.name = 'Street food'
+		self.grills.save()
+		self.assertEqual(self.found('street'), {self.wrap.pk, self.salad.pk, self.burger.pk, self.elsewhere.pk})
+		self.assertEqual(self.found('grills'), set())
+
+	def test_prefix_matching(self):
+		self.assertEqual(self.found('chee'), {self.burger.pk})
+		self.assertEqual(self.found('sal'), {self.salad.pk})
+		# only the word being typed is a prefix
+		self.assertEqual(self.found('gard sal'), set())
+		self.assertEqual(self.found('garden sal'), {self.salad.pk})
+
+	def search_view(self, place, **params):
+		request = self.factory.get('/', params)
+		request.place = place
+		request.branch = None
+		with mock.patch('places.api.views.search_metrics.record'):
+			response = search_view(request)
+		self.assertEqual(response.status_code, 200)
+		return [item['id'] for item in response.data['results']]
+
+	def test_search_view_ranks_with_bm25(self):
+		# a match in the name counts more than one in the description
+		self.assertEqual(self.search_view(self.place, query='suya'), [self.wrap.pk, self.salad.pk])
+
+	def test_search_view_is_scoped_to_the_restaurant(self):
+		self.assertEqual(self.search_view(self.other, query='suya'), [self.elsewhere.pk])
+		self.assertEqual(
+			self.search_view(None, query='suya'),
+			search.ranked('suya'),
+		)
+		self.assertEqual(len(self.search_view(None, query='suya')), 3)
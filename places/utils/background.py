@@ -0,0 +1,48 @@
+"""
+	Work deferred until the response has been sent.
+
+	`defer()` queues a job on the thread serving the current request, the
+	jobs run when `request_finished` is sent, i.e. once the server is done
+	writing the response. Outside of a request the job runs right away.
+
+	The jobs run on the request's own thread on purpose: a second thread
+	writing to SQLite makes transactions of the request threads fail with
+	"database is locked".
+"""
+import logging
+import threading
+from django.core.signals import request_started, request_finished
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+
+logger = logging.getLogger(__name__)
+_state = threading.local()
+
+
+def defer(key, func, *args):
+	""" Run `func(*args)` after the response, once per `key` and request """
+	jobs = getattr(_state, 'jobs', None)
+	if jobs is None:
+		func(*args)
+	elif key not in jobs:
+		jobs[key] = (func, args)
+
+
+@receiver(request_started)
+def start_collecting(**kwargs):
+	_state.jobs = {}
+
+
+@receiver(request_finished)
+def run_deferred(**kwargs):
+	jobs = getattr(_state, 'jobs', None)
+	_state.jobs = None
+	if not jobs:
+		return
+	for key, (func, args) in jobs.items():
+		try:
+			func(*args)
+		except Exception:
+			logger.exception('Deferred job %s failed', key)
+	close_old_connections()
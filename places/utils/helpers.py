@@ -44,8 +44,13 @@ def get_average_rating(reviews):
 		_2_stars +
 		_1_stars
 		)
-	if not res == 0:
-		ans = round(float(score / res), 1)
+	return format_rating(score, res)
+
+
+def format_rating(rating_sum, rating_count):
+	# average of 1-5 star ratings, as served by the API
+	if not rating_count == 0:
+		ans = round(float(rating_sum / rating_count), 1)
 		return str(ans)
 	return "0.0"
 